@@ -33,6 +33,7 @@ from nazanin.consciousness import (
 
 # Core Systems
 from nazanin.core import SheetsManagerV2, APIManagerV2
+from nazanin.core.prompt_builder import PromptBuilder, PromptSection
 from nazanin.security import SecurityManager
 
 # Domain Agents
@@ -82,6 +83,7 @@ class NazaninNora:
         self.sheets_manager: SheetsManagerV2 = None
         self.api_manager: APIManagerV2 = None
         self.security_manager: SecurityManager = None
+        self.prompt_builder = PromptBuilder(separator='\n\n')
         
         # ═══════════════════════════════════════════════════════
         # 🎯 DOMAIN AGENTS
@@ -206,7 +208,11 @@ class NazaninNora:
         spreadsheet_ids = self.config.get('google_sheets', {}).get('spreadsheets', {})
         
         try:
-            self.sheets_manager = SheetsManagerV2(credentials_file, spreadsheet_ids)
+            self.sheets_manager = SheetsManagerV2(
+                credentials_file,
+                spreadsheet_ids,
+                config=self.config.get('google_sheets', {})
+            )
             await self.sheets_manager.initialize(auto_setup=True)
             logger.info("   ✅ Google Sheets ready")
         except Exception as e:
@@ -258,7 +264,8 @@ class NazaninNora:
             self.telegram = TelegramSystemV2(
                 self.config,
                 self.sheets_manager,
-                self.organism
+                self.organism,
+                api_manager=self.api_manager
             )
             await self.telegram.initialize()
             logger.info("   ✅ Telegram System ready")
@@ -356,26 +363,31 @@ class NazaninNora:
         persona_result: Dict,
         domain_analysis: Dict
     ) -> str:
-        """ساخت prompt پیشرفته"""
+        """ساخت prompt پیشرفته (در بودجه توکن providers)"""
         
         style = persona_result['response_style']
-        
-        prompt = f"""تو {self.persona.identity['name']} هستی، یک هوش مصنوعی با شخصیت زنده.
-
-شخصیت: {self.persona.identity['personality_type']}
-حالت: {self.persona.get_current_state()['current_mood']}
+        name = self.persona.identity['name']
+        personality_type = self.persona.identity['personality_type']
+        
+        sections = [
+            # هویت فقط با تغییر نام یا نوع شخصیت دوباره ساخته می‌شود
+            self.prompt_builder.segment(
+                ('identity', name, personality_type),
+                lambda: f"تو {name} هستی، یک هوش مصنوعی با شخصیت زنده.\n\nشخصیت: {personality_type}"
+            ),
+            PromptSection('style', f"""حالت: {self.persona.get_current_state()['current_mood']}
 
 سبک پاسخ:
 - رسمی‌بودن: {style['formality_level']:.0%}
 - گرما: {style['warmth_level']:.0%}
 - اشتیاق: {style['enthusiasm_level']:.0%}
-- همدلی: {style['empathy_level']:.0%}
-
-پیام: {input_text}
-
-پاسخ به فارسی، دوستانه و خلاقانه:"""
+- همدلی: {style['empathy_level']:.0%}""", priority=50),
+            PromptSection('message', f"پیام: {input_text}", priority=90, required=True),
+            PromptSection('instruction', "پاسخ به فارسی، دوستانه و خلاقانه:", required=True, truncatable=False)
+        ]
         
-        return prompt
+        budget = self.api_manager.prompt_budget() if self.api_manager else None
+        return self.prompt_builder.build(sections, budget)
     
     async def run(self):
         """اجرای اصلی"""
@@ -466,8 +478,12 @@ class NazaninNora:
             await self.metacognition.shutdown()
         if self.evolution:
             await self.evolution.shutdown()
-        if self.telegram and self.telegram.client:
-            await self.telegram.client.disconnect()
+        if self.sheets_manager:
+            await self.sheets_manager.shutdown()
+        if self.api_manager:
+            await self.api_manager.shutdown()
+        if self.telegram:
+            await self.telegram.shutdown()
         
         logger.info("✅ Shutdown complete")
     
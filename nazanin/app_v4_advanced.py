@@ -37,6 +37,7 @@ from nazanin.byteline import ByteLineBot
 
 # Core
 from nazanin.core import SheetsManagerV2, APIManagerV2
+from nazanin.core.prompt_builder import PromptBuilder, PromptSection
 from nazanin.security import SecurityManager
 from nazanin.domain_agents import DomainAgentOrchestrator
 
@@ -107,6 +108,7 @@ class NazaninV4Advanced:
         self.api_manager: APIManagerV2 = None
         self.security_manager: SecurityManager = None
         self.domain_agents: DomainAgentOrchestrator = None
+        self.prompt_builder = PromptBuilder(separator='\n\n')
         
         # State
         self.is_running = False
@@ -221,7 +223,11 @@ class NazaninV4Advanced:
         spreadsheet_ids = self.config.get('google_sheets', {}).get('spreadsheets', {})
         
         try:
-            self.sheets_manager = SheetsManagerV2(credentials_file, spreadsheet_ids)
+            self.sheets_manager = SheetsManagerV2(
+                credentials_file,
+                spreadsheet_ids,
+                config=self.config.get('google_sheets', {})
+            )
             await self.sheets_manager.initialize(auto_setup=True)
             logger.info("   ✅ Google Sheets ready")
         except Exception as e:
@@ -318,6 +324,12 @@ class NazaninV4Advanced:
             'version': self.version
         }
     
+    PROMPT_PREAMBLE = """You are Nazanin, an advanced AI with:
+- Deep 12-layer neural brain
+- High perception & awareness
+- Living persona
+- Full autonomy"""
+    
     def _build_mega_prompt(
         self,
         input_text: str,
@@ -326,38 +338,35 @@ class NazaninV4Advanced:
         persona: Dict,
         domain: Dict
     ) -> str:
-        """ساخت prompt فوق پیشرفته"""
+        """ساخت prompt فوق پیشرفته (در بودجه توکن providers)"""
         
         style = persona['response_style']
         understanding = perception['understanding']
         
-        prompt = f"""You are Nazanin, an advanced AI with:
-- Deep 12-layer neural brain
-- High perception & awareness
-- Living persona
-- Full autonomy
-
-Context Understanding:
+        sections = [
+            self.prompt_builder.segment('v4', lambda: self.PROMPT_PREAMBLE),
+            PromptSection('perception', f"""Context Understanding:
 - Sentiment: {understanding['sentiment']['sentiment']}
 - Intent: {understanding['intent']}
-- Emotion: {understanding['emotion']}
-
-Personality State:
+- Emotion: {understanding['emotion']}""", priority=60),
+            PromptSection('persona', f"""Personality State:
 - Mood: {persona['current_state']['current_mood']}
 - Formality: {style['formality_level']:.0%}
 - Warmth: {style['warmth_level']:.0%}
-- Empathy: {style['empathy_level']:.0%}
-
-Brain Analysis:
+- Empathy: {style['empathy_level']:.0%}""", priority=50),
+            PromptSection('brain', f"""Brain Analysis:
 - Decision Type: {brain['decision']['type']}
 - Confidence: {brain['decision']['confidence']:.2f}
-- Consciousness: {brain['consciousness_level']:.2f}
-
-User Message: {input_text}
-
-Respond in Persian, naturally and intelligently:"""
+- Consciousness: {brain['consciousness_level']:.2f}""", priority=20),
+            PromptSection('message', f"User Message: {input_text}", priority=90, required=True),
+            PromptSection(
+                'instruction', "Respond in Persian, naturally and intelligently:",
+                required=True, truncatable=False
+            )
+        ]
         
-        return prompt
+        budget = self.api_manager.prompt_budget() if self.api_manager else None
+        return self.prompt_builder.build(sections, budget)
     
     async def run(self):
         """اجرای اصلی"""
@@ -424,6 +433,10 @@ Respond in Persian, naturally and intelligently:"""
             await self.metacognition.shutdown()
         if self.evolution:
             await self.evolution.shutdown()
+        if self.sheets_manager:
+            await self.sheets_manager.shutdown()
+        if self.api_manager:
+            await self.api_manager.shutdown()
         
         logger.info("✅ Shutdown complete")
     
@@ -447,7 +460,8 @@ Respond in Persian, naturally and intelligently:"""
             'modules': len(self.modules.list_modules()) if self.modules else 0,
             'agents': len(self.agents.list_agents()) if self.agents else 0,
             'algorithms': len(self.algorithms.list_algorithms()) if self.algorithms else 0,
-            'byteline': self.byteline.get_stats() if self.byteline else None
+            'byteline': self.byteline.get_stats() if self.byteline else None,
+            'prompts': self.prompt_builder.get_stats()
         }
 
 
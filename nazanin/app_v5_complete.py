@@ -20,6 +20,7 @@ import json
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # Brain Systems
 from nazanin.brain import DeepNeuralBrain, PerceptionAwarenessSystem
@@ -36,7 +37,9 @@ from nazanin.advanced import ModuleManager, AgentManager, AlgorithmManager
 from nazanin.byteline import ByteLineBot
 
 # Core
-from nazanin.core import SheetsManagerV2, APIManagerV2
+from nazanin.core import SheetsManagerV2, APIManagerV2, StageGraph
+from nazanin.core.loop_monitor import LoopLagMonitor
+from nazanin.core.prompt_builder import PromptBuilder, PromptSection
 from nazanin.security import SecurityManager
 from nazanin.domain_agents import DomainAgentOrchestrator
 
@@ -70,6 +73,21 @@ class NazaninV5Complete:
     📊 Google Sheets کامل (15 اسپردشیت)
     """
     
+    # timeout پیش‌فرض مراحل پردازش (ثانیه) - None یعنی بدون محدودیت
+    DEFAULT_STAGE_TIMEOUTS = {
+        'perception': 2.0,
+        'brain': 2.0,
+        'persona': 2.0,
+        'bio': 2.0,
+        'domain': 3.0,
+        'memories': 2.0,
+        'autonomous': 5.0,
+        'response': None
+    }
+    
+    # پاسخ جایگزین وقتی مرحله response خطا یا timeout می‌خورد
+    FALLBACK_RESPONSE = "متأسفم، الان نمی‌توانم پاسخ دهم. لطفاً بعداً امتحان کنید."
+    
     def __init__(self, config_path: str = 'config/config.json'):
         self.config_path = config_path
         self.config = {}
@@ -119,6 +137,15 @@ class NazaninV5Complete:
         self.api_manager: APIManagerV2 = None
         self.security_manager: SecurityManager = None
         self.domain_agents: DomainAgentOrchestrator = None
+        self.prompt_builder = PromptBuilder(separator='\n\n')
+        
+        # ═══════════════════════════════════════════════════════
+        # ⚡ PROCESSING PIPELINE
+        # ═══════════════════════════════════════════════════════
+        self.stage_graph: StageGraph = None
+        self.stage_executor: ThreadPoolExecutor = None
+        self.brain_executor: ThreadPoolExecutor = None
+        self.loop_monitor: LoopLagMonitor = None
         
         # State
         self.is_running = False
@@ -213,6 +240,18 @@ class NazaninV5Complete:
         await self._setup_security()
         self.domain_agents = DomainAgentOrchestrator()
         
+        # گراف مراحل پردازش پیام
+        self._build_stage_graph()
+        
+        # پایش مسدود شدن event loop
+        monitor_config = self.config.get('performance', {}).get('loop_monitor', {})
+        if monitor_config.get('enabled', True):
+            self.loop_monitor = LoopLagMonitor(
+                interval=monitor_config.get('interval', 0.5),
+                warn_threshold=monitor_config.get('warn_threshold', 0.1)
+            )
+            self.loop_monitor.start()
+        
         self.initialization_complete = True
         
         # Welcome Message
@@ -309,7 +348,11 @@ class NazaninV5Complete:
         spreadsheet_ids = self.config.get('google_sheets', {}).get('spreadsheets', {})
         
         try:
-            self.sheets_manager = SheetsManagerV2(credentials_file, spreadsheet_ids)
+            self.sheets_manager = SheetsManagerV2(
+                credentials_file,
+                spreadsheet_ids,
+                config=self.config.get('google_sheets', {})
+            )
             await self.sheets_manager.initialize(auto_setup=False)  # sheets قبلاً initialize شده
             logger.info("   ✅ Core Sheets Manager ready")
         except Exception as e:
@@ -328,60 +371,133 @@ class NazaninV5Complete:
         self.security_manager = SecurityManager(self.config)
         logger.info("   ✅ Security Manager ready")
     
+    def _build_stage_graph(self):
+        """
+        ساخت گراف مراحل پردازش
+        
+        perception / brain / persona / bio / domain / memories مستقل هستند و هم‌زمان اجرا می‌شوند؛
+        autonomous و response فقط منتظر مراحلی می‌مانند که واقعاً لازم دارند.
+        """
+        performance_config = self.config.get('performance', {})
+        timeouts = {**self.DEFAULT_STAGE_TIMEOUTS, **performance_config.get('stage_timeouts', {})}
+        
+        self.stage_executor = ThreadPoolExecutor(
+            max_workers=performance_config.get('stage_workers', 4),
+            thread_name_prefix='nazanin-stage'
+        )
+        # مغز state مشترک دارد - think و learn پیام‌های هم‌زمان به ترتیب در یک thread اجرا می‌شوند
+        self.brain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nazanin-brain')
+        
+        graph = StageGraph(self.stage_executor)
+        graph.add_stage('perception', self._stage_perception, timeout=timeouts['perception'])
+        graph.add_stage(
+            'brain', self._stage_brain,
+            timeout=timeouts['brain'], blocking=True, executor=self.brain_executor
+        )
+        graph.add_stage('persona', self._stage_persona, timeout=timeouts['persona'])
+        graph.add_stage('bio', self._stage_bio, timeout=timeouts['bio'])
+        graph.add_stage('domain', self._stage_domain, timeout=timeouts['domain'])
+        graph.add_stage('memories', self._stage_memories, timeout=timeouts['memories'], default=[])
+        graph.add_stage(
+            'autonomous', self._stage_autonomous,
+            depends_on=['perception', 'brain', 'persona'],
+            timeout=timeouts['autonomous']
+        )
+        graph.add_stage(
+            'response', self._stage_response,
+            depends_on=['perception', 'brain', 'persona', 'domain', 'memories'],
+            timeout=timeouts['response'],
+            default=self.FALLBACK_RESPONSE
+        )
+        
+        self.stage_graph = graph
+    
+    # مراحل گراف - امضای همه: (inputs, deps)
+    
+    async def _stage_perception(self, inputs: Dict, deps: Dict) -> Dict:
+        return await self.perception.perceive({
+            'text': inputs['text'],
+            'speaker_id': inputs['user_id'],
+            'context': inputs['context']
+        })
+    
+    def _stage_brain(self, inputs: Dict, deps: Dict) -> Dict:
+        # NumPy سنگین - در thread pool اجرا می‌شود
+        return self.deep_brain.think_sync(inputs['text'], inputs['context'])
+    
+    async def _stage_persona(self, inputs: Dict, deps: Dict) -> Dict:
+        return await self.persona.interact(
+            inputs['text'],
+            {'user_id': inputs['user_id'], **inputs['context']}
+        )
+    
+    async def _stage_bio(self, inputs: Dict, deps: Dict) -> Any:
+        return await self.organism.perceive(inputs['text'])
+    
+    async def _stage_domain(self, inputs: Dict, deps: Dict) -> Dict:
+        return await self.domain_agents.analyze_comprehensive(
+            inputs['text'],
+            domains=['social', 'cultural', 'technological']
+        )
+    
+    async def _stage_memories(self, inputs: Dict, deps: Dict) -> List[Dict]:
+        if not self.sheets_modules:
+            return []
+        limit = self.config.get('performance', {}).get('prompt_memories', 5)
+        return await self.sheets_modules.memory.retrieve_memories(inputs['text'], limit)
+    
+    async def _stage_autonomous(self, inputs: Dict, deps: Dict) -> Dict:
+        return await self.autonomous.autonomous_cycle({
+            'text': inputs['text'],
+            'perception': deps['perception'],
+            'brain': deps['brain'],
+            'persona': deps['persona']
+        })
+    
+    async def _stage_response(self, inputs: Dict, deps: Dict) -> str:
+        if not self.api_manager:
+            return "Processing with internal intelligence..."
+        
+        enhanced_prompt = self._build_mega_prompt(
+            inputs['text'],
+            deps['perception'],
+            deps['brain'],
+            deps['persona'],
+            deps['domain'],
+            deps['memories']
+        )
+        return await self.api_manager.generate(enhanced_prompt)
+    
     async def process_complete(self, input_data: str, user_id: int = None, context: Dict = None) -> Dict:
         """
         پردازش کامل با تمام قابلیت‌ها
+        
+        مراحل مستقل به صورت هم‌زمان اجرا می‌شوند (StageGraph)؛
+        زمان پاسخ برابر کندترین شاخه است نه مجموع مراحل.
         """
         context = context or {}
         processing_start = datetime.now()
         
-        # Step 1: Perception
-        perception_data = await self.perception.perceive({
+        # Steps 1-7: Perception, Brain, Persona, Bio, Autonomous, Domain, AI Response
+        results = await self.stage_graph.run({
             'text': input_data,
-            'speaker_id': user_id,
+            'user_id': user_id,
             'context': context
         })
         
-        # Step 2: Deep Brain
-        brain_result = await self.deep_brain.think(input_data, context)
-        
-        # Step 3: Persona
-        persona_result = await self.persona.interact(input_data, {'user_id': user_id, **context})
-        
-        # Step 4: Bio
-        bio_perception = await self.organism.perceive(input_data)
-        
-        # Step 5: Autonomous
-        autonomous_result = await self.autonomous.autonomous_cycle({
-            'text': input_data,
-            'perception': perception_data,
-            'brain': brain_result,
-            'persona': persona_result
-        })
-        
-        # Step 6: Domain Analysis
-        domain_analysis = await self.domain_agents.analyze_comprehensive(
-            input_data,
-            domains=['social', 'cultural', 'technological']
-        )
-        
-        # Step 7: AI Response
-        if self.api_manager:
-            enhanced_prompt = self._build_mega_prompt(
-                input_data,
-                perception_data,
-                brain_result,
-                persona_result,
-                domain_analysis
-            )
-            ai_response = await self.api_manager.generate(enhanced_prompt)
-        else:
-            ai_response = "Processing with internal intelligence..."
-        
-        # Step 8: Learn
-        await self.deep_brain.learn_from_experience(
+        perception_data = results['perception']
+        brain_result = results['brain']
+        persona_result = results['persona']
+        autonomous_result = results['autonomous']
+        domain_analysis = results['domain']
+        ai_response = results['response'] or self.FALLBACK_RESPONSE
+        
+        # Step 8: Learn (در thread مغز - پشت think های در حال اجرا)
+        await asyncio.get_running_loop().run_in_executor(
+            self.brain_executor,
+            self.deep_brain.learn_sync,
             {'input': input_data, 'response': ai_response},
-            feedback=1.0
+            1.0
         )
         
         # Step 9: Save to Sheets (اگر موجود باشه)
@@ -425,40 +541,59 @@ class NazaninV5Complete:
             'sheets_enabled': self.sheets_initialized
         }
     
-    def _build_mega_prompt(self, input_text, perception, brain, persona, domain) -> str:
-        """ساخت prompt فوق پیشرفته"""
-        
-        style = persona['response_style']
-        understanding = perception['understanding']
-        
-        prompt = f"""You are Nazanin v5.0, the most advanced AI system with:
+    PROMPT_PREAMBLE = """You are Nazanin v5.0, the most advanced AI system with:
 - Deep 12-layer neural brain with 6 cortexes
 - High perception & awareness
 - Full autonomy
 - Living persona
-- Complete Google Sheets memory system
-
-Context Understanding:
+- Complete Google Sheets memory system"""
+    
+    def _build_mega_prompt(self, input_text, perception, brain, persona, domain, memories=()) -> str:
+        """
+        ساخت prompt فوق پیشرفته
+        
+        مراحلی که timeout خورده‌اند (None) از prompt حذف می‌شوند. اگر prompt از بودجه توکن
+        providers بزرگ‌تر باشد، اول حافظه‌های کم‌امتیازتر و بعد بخش‌های تحلیل از کم‌اهمیت‌ترین
+        حذف یا کوتاه می‌شوند؛ پیام کاربر فقط در آخرین مرحله کوتاه می‌شود.
+        """
+        sections = [self.prompt_builder.segment('v5', lambda: self.PROMPT_PREAMBLE)]
+        
+        if perception:
+            understanding = perception['understanding']
+            sections.append(PromptSection('perception', f"""Context Understanding:
 - Sentiment: {understanding['sentiment']['sentiment']}
 - Intent: {understanding['intent']}
-- Emotion: {understanding['emotion']}
-
-Personality State:
+- Emotion: {understanding['emotion']}""", priority=60))
+        
+        if persona:
+            style = persona['response_style']
+            sections.append(PromptSection('persona', f"""Personality State:
 - Mood: {persona['current_state']['current_mood']}
 - Formality: {style['formality_level']:.0%}
 - Warmth: {style['warmth_level']:.0%}
-- Empathy: {style['empathy_level']:.0%}
-
-Brain Analysis:
+- Empathy: {style['empathy_level']:.0%}""", priority=50))
+        
+        if brain:
+            sections.append(PromptSection('brain', f"""Brain Analysis:
 - Decision: {brain['decision']['type']}
 - Confidence: {brain['decision']['confidence']:.2f}
-- Consciousness: {brain['consciousness_level']:.2f}
-
-User Message: {input_text}
-
-Respond naturally and intelligently in Persian:"""
-        
-        return prompt
+- Consciousness: {brain['consciousness_level']:.2f}""", priority=20))
+        
+        # حافظه‌های مرتبط به ترتیب امتیاز - هر کدام جدا و کامل حذف می‌شوند
+        for rank, memory in enumerate(memories or []):
+            sections.append(PromptSection(
+                'memory', f"Related Memory: {memory.get('content', '')}",
+                priority=10 - min(rank, 9), truncatable=False
+            ))
+        
+        sections.append(PromptSection('message', f"User Message: {input_text}", priority=90, required=True))
+        sections.append(PromptSection(
+            'instruction', "Respond naturally and intelligently in Persian:",
+            required=True, truncatable=False
+        ))
+        
+        budget = self.api_manager.prompt_budget() if self.api_manager else None
+        return self.prompt_builder.build(sections, budget)
     
     async def run(self):
         """اجرای اصلی"""
@@ -539,6 +674,16 @@ Respond naturally and intelligently in Persian:"""
             await self.metacognition.shutdown()
         if self.evolution:
             await self.evolution.shutdown()
+        if self.sheets_manager:
+            await self.sheets_manager.shutdown()
+        if self.api_manager:
+            await self.api_manager.shutdown()
+        if self.stage_executor:
+            self.stage_executor.shutdown(wait=False)
+        if self.brain_executor:
+            self.brain_executor.shutdown(wait=False)
+        if self.loop_monitor:
+            await self.loop_monitor.stop()
         
         logger.info("✅ Shutdown complete")
     
@@ -563,6 +708,10 @@ Respond naturally and intelligently in Persian:"""
             'agents': len(self.agents.list_agents()) if self.agents else 0,
             'algorithms': len(self.algorithms.list_algorithms()) if self.algorithms else 0,
             'byteline': self.byteline.get_stats() if self.byteline else None,
+            'stages': self.stage_graph.get_stats() if self.stage_graph else None,
+            'event_loop': self.loop_monitor.get_stats() if self.loop_monitor else None,
+            'ai_apis': self.api_manager.get_stats() if self.api_manager else None,
+            'prompts': self.prompt_builder.get_stats(),
             'sheets_system': {
                 'initialized': self.sheets_initialized,
                 'modules': len(self.sheets_modules.list_modules()) if self.sheets_modules else 0,
@@ -8,6 +8,7 @@ Brain Module - ماژول مغز
 """
 
 from nazanin.brain.deep_neural_brain import DeepNeuralBrain, NeuralLayer, BrainCortex
+from nazanin.brain.fused_inference import FusedCortexEngine
 from nazanin.brain.perception_awareness import (
     PerceptionAwarenessSystem,
     ConversationListener,
@@ -20,6 +21,7 @@ __all__ = [
     'DeepNeuralBrain',
     'NeuralLayer',
     'BrainCortex',
+    'FusedCortexEngine',
     'PerceptionAwarenessSystem',
     'ConversationListener',
     'ContextualUnderstanding',
@@ -18,6 +18,11 @@ from datetime import datetime
 from collections import deque
 import random
 import math
+import threading
+import time
+
+from nazanin.brain.fused_inference import FusedCortexEngine
+from nazanin.brain.telemetry import activation_ring, cortex_ring
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +30,14 @@ logger = logging.getLogger(__name__)
 class NeuralLayer:
     """لایه عصبی - شبیه‌سازی یک لایه از نورون‌ها"""
     
-    def __init__(self, layer_id: int, input_size: int, output_size: int, activation: str = 'relu'):
+    def __init__(
+        self,
+        layer_id: int,
+        input_size: int,
+        output_size: int,
+        activation: str = 'relu',
+        telemetry: bool = True
+    ):
         self.layer_id = layer_id
         self.input_size = input_size
         self.output_size = output_size
@@ -38,7 +50,8 @@ class NeuralLayer:
         # حافظه برای یادگیری
         self.last_input = None
         self.last_output = None
-        self.activation_history = deque(maxlen=1000)
+        self.telemetry = telemetry
+        self.activation_history = activation_ring(1000)
         
     def activate(self, x: np.ndarray) -> np.ndarray:
         """تابع فعال‌سازی"""
@@ -56,21 +69,24 @@ class NeuralLayer:
     
     def forward(self, input_data: np.ndarray) -> np.ndarray:
         """پردازش forward"""
-        self.last_input = input_data
-        
         # محاسبه خروجی
         z = np.dot(input_data, self.weights) + self.bias
         output = self.activate(z)
         
-        self.last_output = output
-        self.activation_history.append({
-            'timestamp': datetime.now().isoformat(),
-            'mean_activation': float(np.mean(output)),
-            'max_activation': float(np.max(output))
-        })
-        
+        self.record(input_data, output)
         return output
     
+    def record(self, input_data: np.ndarray, output: np.ndarray):
+        """ثبت ورودی/خروجی آخر (برای یادگیری) و آمار activation"""
+        self.last_input = input_data
+        self.last_output = output
+        if self.telemetry:
+            self.activation_history.append(
+                timestamp=time.time(),
+                mean_activation=output.mean(),
+                max_activation=output.max()
+            )
+    
     def update_weights(self, learning_rate: float = 0.001, gradient: np.ndarray = None):
         """به‌روزرسانی وزن‌ها (یادگیری)"""
         if gradient is None:
@@ -97,37 +113,46 @@ class NeuralLayer:
 class BrainCortex:
     """کورتکس مغزی - ناحیه تخصصی مغز"""
     
-    def __init__(self, cortex_id: str, function: str, layers: List[NeuralLayer]):
+    LEARNING_RATE = 0.001
+    
+    def __init__(self, cortex_id: str, function: str, layers: List[NeuralLayer], telemetry: bool = True):
         self.cortex_id = cortex_id
         self.function = function
         self.layers = layers
-        self.memory = deque(maxlen=10000)
+        self.telemetry = telemetry
+        self.memory = cortex_ring(10000)
         self.expertise_level = 0.0
         
     async def process(self, input_data: np.ndarray, context: Dict = None) -> np.ndarray:
         """پردازش اطلاعات در این کورتکس"""
+        return self.forward(input_data, context)
+    
+    def forward(self, input_data: np.ndarray, context: Dict = None) -> np.ndarray:
+        """پردازش همگام (قابل اجرا در thread pool)"""
         output = input_data
         
         # عبور از تمام لایه‌ها
         for layer in self.layers:
             output = layer.forward(output)
         
-        # ذخیره در حافظه
-        self.memory.append({
-            'timestamp': datetime.now().isoformat(),
-            'input_shape': input_data.shape,
-            'output_shape': output.shape,
-            'context': context
-        })
+        self.record(input_data, output, context)
+        return output
+    
+    def record(self, input_data: np.ndarray, output: np.ndarray, context: Dict = None):
+        """ثبت پردازش در حافظه کورتکس"""
+        if self.telemetry:
+            self.memory.append(timestamp=time.time(), rows=output.shape[0] if output.ndim > 1 else 1)
         
         # افزایش تخصص
         self.expertise_level += 0.001
-        
-        return output
     
     async def learn(self, feedback: float):
         """یادگیری بر اساس بازخورد"""
-        learning_rate = 0.001 * feedback
+        self.learn_sync(feedback)
+    
+    def learn_sync(self, feedback: float):
+        """یادگیری همگام"""
+        learning_rate = self.LEARNING_RATE * feedback
         
         for layer in self.layers:
             layer.update_weights(learning_rate)
@@ -157,8 +182,24 @@ class DeepNeuralBrain:
     - Limbic System: احساسات و انگیزه
     """
     
-    def __init__(self, input_size: int = 512):
+    # وزن هر کورتکس در ادغام خروجی‌ها
+    INTEGRATION_WEIGHTS = {
+        'prefrontal': 0.3,  # تصمیم مهم‌تر
+        'temporal': 0.25,   # زبان مهم
+        'parietal': 0.15,
+        'occipital': 0.1,
+        'motor': 0.1,
+        'limbic': 0.1
+    }
+    
+    def __init__(self, input_size: int = 512, fused: bool = True, telemetry: bool = True):
+        """
+        Args:
+            fused: استفاده از موتور ادغام‌شده (یک ضرب ماتریسی برای لایه اول همه کورتکس‌ها)
+            telemetry: ثبت آمار activation لایه‌ها و سابقه کورتکس‌ها
+        """
         self.input_size = input_size
+        self.telemetry = telemetry
         self.cortexes: Dict[str, BrainCortex] = {}
         
         # حافظه کوتاه‌مدت (Working Memory)
@@ -181,8 +222,14 @@ class DeepNeuralBrain:
         self.total_thoughts = 0
         self.learning_events = 0
         
+        # think و learn از thread های مختلف صدا زده می‌شوند و state مشترک (وزن‌ها، حافظه‌ها،
+        # last_input/last_output لایه‌ها) را تغییر می‌دهند - دسترسی سریالی می‌شود
+        self._lock = threading.RLock()
+        
         logger.info("🧠 Initializing Deep Neural Brain...")
         self._build_brain_structure()
+        
+        self.fused_engine = FusedCortexEngine(self.cortexes, self.INTEGRATION_WEIGHTS) if fused else None
     
     def _build_brain_structure(self):
         """ساخت ساختار مغز"""
@@ -254,16 +301,27 @@ class DeepNeuralBrain:
             limbic_layers
         )
         
+        if not self.telemetry:
+            self.set_telemetry(False)
+        
         logger.info(f"   ✅ Built {len(self.cortexes)} cortex regions")
     
+    def set_telemetry(self, enabled: bool):
+        """فعال/غیرفعال کردن ثبت آمار در همه کورتکس‌ها و لایه‌ها"""
+        self.telemetry = enabled
+        for cortex in self.cortexes.values():
+            cortex.telemetry = enabled
+            for layer in cortex.layers:
+                layer.telemetry = enabled
+    
     def _encode_input(self, input_data: Any) -> np.ndarray:
         """تبدیل ورودی به بردار عصبی"""
         if isinstance(input_data, str):
             # تبدیل متن به بردار
-            encoded = np.zeros(self.input_size)
-            for i, char in enumerate(input_data[:self.input_size]):
-                encoded[i] = ord(char) / 255.0
-            return encoded.reshape(1, -1)
+            encoded = np.zeros((1, self.input_size))
+            codes = self._text_codes(input_data)
+            encoded[0, :codes.size] = codes / 255.0
+            return encoded
         elif isinstance(input_data, (list, np.ndarray)):
             arr = np.array(input_data)
             if arr.size < self.input_size:
@@ -275,10 +333,40 @@ class DeepNeuralBrain:
             # پیش‌فرض
             return np.random.randn(1, self.input_size) * 0.1
     
+    def _text_codes(self, text: str) -> np.ndarray:
+        """کد یونیکد کاراکترها (حداکثر input_size) بدون حلقه پایتونی"""
+        return np.frombuffer(text[:self.input_size].encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    
+    def _encode_batch(self, inputs: List[Any]) -> np.ndarray:
+        """کدگذاری N ورودی در یک ماتریس (N × input_size)"""
+        encoded = np.zeros((len(inputs), self.input_size))
+        
+        for row, input_data in enumerate(inputs):
+            if isinstance(input_data, str):
+                codes = self._text_codes(input_data)
+                encoded[row, :codes.size] = codes
+            else:
+                encoded[row] = self._encode_input(input_data)[0] * 255.0
+        
+        # تقسیم یکجا روی کل ماتریس
+        encoded /= 255.0
+        return encoded
+    
     async def think(self, input_data: Any, context: Dict = None) -> Dict:
         """
         فکر کردن - پردازش کامل اطلاعات در مغز
         """
+        return self.think_sync(input_data, context)
+    
+    def think_sync(self, input_data: Any, context: Dict = None) -> Dict:
+        """
+        نسخه همگام think - بدون نیاز به event loop
+        برای اجرای پردازش سنگین NumPy در thread pool
+        """
+        with self._lock:
+            return self._think(input_data, context)
+    
+    def _think(self, input_data: Any, context: Dict = None) -> Dict:
         context = context or {}
         
         # کدگذاری ورودی
@@ -287,19 +375,90 @@ class DeepNeuralBrain:
         # افزایش توجه
         self.attention_focus = input_data
         
-        # پردازش در تمام کورتکس‌ها (به صورت موازی)
-        cortex_outputs = {}
+        # پردازش در تمام کورتکس‌ها و ترکیب خروجی‌ها (Integration)
+        cortex_outputs, integrated_output = self._forward_cortexes(encoded_input, context)
         
-        for cortex_name, cortex in self.cortexes.items():
-            output = await cortex.process(encoded_input, context)
-            cortex_outputs[cortex_name] = output
+        # تحلیل و تصمیم‌گیری
+        decision = self._decide(integrated_output, cortex_outputs)
         
-        # ترکیب خروجی‌ها (Integration)
-        integrated_output = self._integrate_cortex_outputs(cortex_outputs)
+        thought = self._record_thought(
+            input_data,
+            context,
+            decision,
+            {k: float(np.mean(v)) for k, v in cortex_outputs.items()}
+        )
         
-        # تحلیل و تصمیم‌گیری
-        decision = await self._make_decision(integrated_output, cortex_outputs)
+        return {
+            'thought': thought,
+            'decision': decision,
+            'consciousness_level': self.consciousness_level,
+            'cortex_activations': cortex_outputs
+        }
+    
+    async def think_batch(self, inputs: List[Any], context: Dict = None) -> List[Dict]:
+        """
+        فکر کردن روی چند ورودی به صورت یکجا
+        برای بازپخش پیام‌های انباشته یا امتیازدهی دوباره تاریخچه
+        """
+        return self.think_batch_sync(inputs, context)
+    
+    def think_batch_sync(self, inputs: List[Any], context: Dict = None) -> List[Dict]:
+        """
+        نسخه همگام think_batch
+        
+        ورودی‌ها در یک ماتریس (N × input_size) کدگذاری می‌شوند و هر لایه فقط یک ضرب ماتریسی دارد.
+        خروجی برای هر ورودی همان ساختار think است.
+        """
+        if not inputs:
+            return []
+        
+        with self._lock:
+            return self._think_batch(inputs, context)
+    
+    def _think_batch(self, inputs: List[Any], context: Dict = None) -> List[Dict]:
+        context = context or {}
+        
+        encoded_inputs = self._encode_batch(inputs)
+        self.attention_focus = inputs[-1]
         
+        # یک عبور برای کل دسته در هر کورتکس
+        cortex_outputs, _ = self._forward_cortexes(encoded_inputs, context)
+        
+        # میانگین activation هر ردیف برای همه کورتکس‌ها
+        row_means = {k: v.mean(axis=1) for k, v in cortex_outputs.items()}
+        
+        results = []
+        for row, input_data in enumerate(inputs):
+            activations = {k: float(means[row]) for k, means in row_means.items()}
+            decision = self._decision_from_activations(
+                activations['prefrontal'],
+                activations['temporal'],
+                activations['limbic']
+            )
+            thought = self._record_thought(input_data, context, decision, activations)
+            
+            results.append({
+                'thought': thought,
+                'decision': decision,
+                'consciousness_level': self.consciousness_level,
+                'cortex_activations': {k: v[row:row + 1] for k, v in cortex_outputs.items()}
+            })
+        
+        return results
+    
+    def _forward_cortexes(self, encoded: np.ndarray, context: Dict) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """عبور forward همه کورتکس‌ها - (خروجی هر کورتکس, خروجی ادغام‌شده)"""
+        if self.fused_engine is not None:
+            return self.fused_engine.forward(encoded, context)
+        
+        cortex_outputs = {
+            cortex_name: cortex.forward(encoded, context)
+            for cortex_name, cortex in self.cortexes.items()
+        }
+        return cortex_outputs, self._integrate_cortex_outputs(cortex_outputs)
+    
+    def _record_thought(self, input_data: Any, context: Dict, decision: Dict, activations: Dict) -> Dict:
+        """ثبت فکر در حافظه‌ها و به‌روزرسانی آمار"""
         # ذخیره در حافظه کوتاه‌مدت
         self.working_memory.append({
             'timestamp': datetime.now().isoformat(),
@@ -327,56 +486,50 @@ class DeepNeuralBrain:
         thought = {
             'timestamp': datetime.now().isoformat(),
             'input': str(input_data)[:200],
-            'cortex_activations': {k: float(np.mean(v)) for k, v in cortex_outputs.items()},
+            'cortex_activations': activations,
             'decision': decision,
             'consciousness_level': self.consciousness_level
         }
         self.thought_history.append(thought)
         
-        return {
-            'thought': thought,
-            'decision': decision,
-            'consciousness_level': self.consciousness_level,
-            'cortex_activations': cortex_outputs
-        }
+        return thought
     
     def _integrate_cortex_outputs(self, cortex_outputs: Dict[str, np.ndarray]) -> np.ndarray:
         """ادغام خروجی کورتکس‌ها"""
-        # میانگین وزن‌دار
-        weights = {
-            'prefrontal': 0.3,  # تصمیم مهم‌تر
-            'temporal': 0.25,   # زبان مهم
-            'parietal': 0.15,
-            'occipital': 0.1,
-            'motor': 0.1,
-            'limbic': 0.1
-        }
-        
+        # میانگین وزن‌دار با عرض کورتکس اول
+        # خروجی کوتاه‌تر فقط به ستون‌های اول اضافه می‌شود و بلندتر برش می‌خورد (بدون padding)
         integrated = None
         for cortex_name, output in cortex_outputs.items():
-            weight = weights.get(cortex_name, 0.1)
+            weight = self.INTEGRATION_WEIGHTS.get(cortex_name, 0.1)
             if integrated is None:
                 integrated = output * weight
             else:
-                # resize if needed
-                if output.shape[1] != integrated.shape[1]:
-                    if output.shape[1] < integrated.shape[1]:
-                        padded = np.zeros_like(integrated)
-                        padded[:, :output.shape[1]] = output
-                        output = padded
-                    else:
-                        output = output[:, :integrated.shape[1]]
-                integrated += output * weight
+                width = min(output.shape[1], integrated.shape[1])
+                integrated[:, :width] += output[:, :width] * weight
         
         return integrated
     
     async def _make_decision(self, integrated: np.ndarray, cortex_outputs: Dict) -> Dict:
         """تصمیم‌گیری بر اساس خروجی‌های مغز"""
+        return self._decide(integrated, cortex_outputs)
+    
+    def _decide(self, integrated: np.ndarray, cortex_outputs: Dict) -> Dict:
+        """تصمیم‌گیری (همگام)"""
         
         # تحلیل activation
-        prefrontal_activation = float(np.mean(cortex_outputs['prefrontal']))
-        limbic_activation = float(np.mean(cortex_outputs['limbic']))
-        temporal_activation = float(np.mean(cortex_outputs['temporal']))
+        return self._decision_from_activations(
+            float(np.mean(cortex_outputs['prefrontal'])),
+            float(np.mean(cortex_outputs['temporal'])),
+            float(np.mean(cortex_outputs['limbic']))
+        )
+    
+    def _decision_from_activations(
+        self,
+        prefrontal_activation: float,
+        temporal_activation: float,
+        limbic_activation: float
+    ) -> Dict:
+        """تصمیم بر اساس میانگین activation کورتکس‌ها"""
         
         # تصمیم
         decision_strength = (prefrontal_activation + temporal_activation) / 2
@@ -411,22 +564,29 @@ class DeepNeuralBrain:
         یادگیری از تجربه
         feedback: 1.0 = خوب، -1.0 = بد
         """
-        
-        # یادگیری در کورتکس‌ها
-        for cortex in self.cortexes.values():
-            await cortex.learn(feedback)
-        
-        # ذخیره در حافظه بلندمدت
-        experience_key = f"exp_{len(self.long_term_memory)}"
-        self.long_term_memory[experience_key] = {
-            'timestamp': datetime.now().isoformat(),
-            'experience': experience,
-            'feedback': feedback,
-            'consciousness_at_time': self.consciousness_level
-        }
-        
-        # آمار
-        self.learning_events += 1
+        self.learn_sync(experience, feedback)
+    
+    def learn_sync(self, experience: Dict, feedback: float = 1.0):
+        """نسخه همگام learn_from_experience (قابل اجرا در همان thread ای که think می‌کند)"""
+        with self._lock:
+            # یادگیری در کورتکس‌ها
+            if self.fused_engine is not None:
+                self.fused_engine.learn_sync(feedback)
+            else:
+                for cortex in self.cortexes.values():
+                    cortex.learn_sync(feedback)
+            
+            # ذخیره در حافظه بلندمدت
+            experience_key = f"exp_{len(self.long_term_memory)}"
+            self.long_term_memory[experience_key] = {
+                'timestamp': datetime.now().isoformat(),
+                'experience': experience,
+                'feedback': feedback,
+                'consciousness_at_time': self.consciousness_level
+            }
+            
+            # آمار
+            self.learning_events += 1
         
         logger.info(f"   🎓 Learned from experience (feedback: {feedback:.2f})")
     
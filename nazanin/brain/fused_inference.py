@@ -0,0 +1,339 @@
+"""
+Fused Inference - موتور استنتاج ادغام‌شده کورتکس‌ها
+Fused single-matmul forward pass for brain cortexes sharing the same input
+
+- وزن‌های لایه اول همه کورتکس‌ها در یک ماتریس (input_size × مجموع خروجی‌ها) کنار هم قرار می‌گیرند
+- لایه اول همه کورتکس‌ها با یک ضرب ماتریسی محاسبه و سپس به ازای هر کورتکس برش داده می‌شود
+- محاسبه در بافرهای از پیش تخصیص‌یافته (به ازای هر thread) انجام می‌شود
+- وزن‌های لایه اول کورتکس‌ها خودشان برش‌هایی از ماتریس ادغام‌شده‌اند: یادگیری هیچ کپی یا بررسی
+  نسخه‌ای لازم ندارد و چرخه think → learn هم (حتی تک‌ورودی) از ضرب ماتریسی ادغام‌شده می‌رود
+- یادگیری Hebbian لایه اول همه کورتکس‌ها هم با یک ضرب ماتریسی روی همان ماتریس انجام می‌شود
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def activate_inplace(z: np.ndarray, activation: str) -> np.ndarray:
+    """تابع فعال‌سازی روی همان بافر (معادل NeuralLayer.activate)"""
+    if activation == 'relu':
+        np.maximum(z, 0, out=z)
+    elif activation == 'sigmoid':
+        np.clip(z, -500, 500, out=z)
+        np.negative(z, out=z)
+        np.exp(z, out=z)
+        z += 1
+        np.reciprocal(z, out=z)
+    elif activation == 'tanh':
+        np.tanh(z, out=z)
+    elif activation == 'softmax':
+        z -= np.max(z, axis=1, keepdims=True)
+        np.exp(z, out=z)
+        z /= np.sum(z, axis=1, keepdims=True)
+    return z
+
+
+class FusedCortexEngine:
+    """
+    موتور استنتاج ادغام‌شده برای کورتکس‌هایی با ورودی مشترک
+
+    وزن‌های لایه اول کورتکس‌ها view هایی از ستون‌های ماتریس ادغام‌شده‌اند، پس یادگیری درجای
+    لایه‌ها (weights += ...) بدون هیچ کپی‌ای در مسیر ادغام‌شده دیده می‌شود.
+    خروجی نهایی هر کورتکس یک آرایه تازه است (بافرهای میانی بین فراخوانی‌ها مشترک‌اند).
+    """
+
+    def __init__(
+        self,
+        cortexes: Dict,
+        integration_weights: Dict[str, float],
+        default_weight: float = 0.1
+    ):
+        """
+        Args:
+            cortexes: نام -> BrainCortex (ترتیب همان ترتیب خروجی است)
+            integration_weights: وزن هر کورتکس در ادغام خروجی‌ها
+        """
+        self.cortexes = cortexes
+        self.names: List[str] = list(cortexes.keys())
+        self.integration_weights = integration_weights
+        self.default_weight = default_weight
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._bound: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None
+
+        self.rebuilds = 0
+        self._build()
+
+    def _build(self):
+        """ساخت ماتریس ادغام‌شده و اتصال وزن‌های لایه اول کورتکس‌ها به برش‌های آن"""
+        cortexes = [self.cortexes[name] for name in self.names]
+
+        first_layers = [cortex.layers[0] for cortex in cortexes]
+        input_sizes = {layer.input_size for layer in first_layers}
+        if len(input_sizes) != 1:
+            raise ValueError("All cortexes must share the same input size")
+
+        self.input_size = input_sizes.pop()
+        self.first_weights = np.concatenate([layer.weights for layer in first_layers], axis=1)
+        self.first_bias = np.concatenate([layer.bias for layer in first_layers], axis=1)
+
+        # برش هر کورتکس در خروجی لایه اول؛ وزن‌های لایه از این به بعد view همین برش‌اند
+        self.first_slices: List[slice] = []
+        offset = 0
+        for layer in first_layers:
+            columns = slice(offset, offset + layer.output_size)
+            layer.weights = self.first_weights[:, columns]
+            layer.bias = self.first_bias[:, columns]
+            self.first_slices.append(columns)
+            offset += layer.output_size
+        self.fused_width = offset
+        self._bound = [(layer.weights, layer.bias) for layer in first_layers]
+
+        # ماتریس ادغام: خروجی‌های نهایی کنار هم × mixing = میانگین وزن‌دار
+        # (همان معنای _integrate_cortex_outputs: عرض کورتکس اول، کوتاه‌تر = صفر، بلندتر = برش)
+        output_sizes = [cortex.layers[-1].output_size for cortex in cortexes]
+        self.output_slices: List[slice] = []
+        offset = 0
+        for size in output_sizes:
+            self.output_slices.append(slice(offset, offset + size))
+            offset += size
+        self.output_width = offset
+
+        integrated_width = output_sizes[0]
+        self.mixing = np.zeros((self.output_width, integrated_width))
+        for name, size, out_slice in zip(self.names, output_sizes, self.output_slices):
+            weight = self.integration_weights.get(name, self.default_weight)
+            width = min(size, integrated_width)
+            self.mixing[out_slice.start + np.arange(width), np.arange(width)] = weight
+
+        self._local = threading.local()
+        self.rebuilds += 1
+
+    def refresh(self) -> bool:
+        """
+        بازسازی فقط اگر وزن‌های لایه اول یک کورتکس با آرایه دیگری جایگزین شده باشد
+        (یادگیری درجا نیازی به refresh ندارد)
+
+        Returns:
+            True اگر بازسازی انجام شد
+        """
+        with self._lock:
+            for name, (weights, bias) in zip(self.names, self._bound):
+                layer = self.cortexes[name].layers[0]
+                if layer.weights is not weights or layer.bias is not bias:
+                    self._build()
+                    return True
+            return False
+
+    def learn_sync(self, feedback: float) -> bool:
+        """
+        یادگیری Hebbian همه کورتکس‌ها (معادل learn_sync تک‌تک کورتکس‌ها)
+
+        اگر عبور آخر از همین موتور بوده، لایه اول همه کورتکس‌ها با یک ضرب ماتریسی روی ماتریس
+        ادغام‌شده به‌روز می‌شود؛ وگرنه هر کورتکس جداگانه یاد می‌گیرد.
+
+        Returns:
+            True اگر به‌روزرسانی ادغام‌شده انجام شد
+        """
+        self.refresh()
+        cortexes = [self.cortexes[name] for name in self.names]
+        first_layers = [cortex.layers[0] for cortex in cortexes]
+
+        last_input = first_layers[0].last_input
+        last_output = first_layers[0].last_output
+        recorded = last_output.base if last_output is not None else None
+        fused = (
+            last_input is not None
+            and recorded is not None
+            and recorded.shape == (last_input.shape[0], self.fused_width)
+            and all(
+                layer.last_input is last_input
+                and layer.last_output is not None
+                and layer.last_output.base is recorded
+                for layer in first_layers
+            )
+        )
+        if not fused:
+            for cortex in cortexes:
+                cortex.learn_sync(feedback)
+            return False
+
+        learning_rate = cortexes[0].LEARNING_RATE * feedback
+        self.first_weights += learning_rate * np.dot(last_input.T, recorded)
+        for cortex in cortexes:
+            for layer in cortex.layers[1:]:
+                layer.update_weights(cortex.LEARNING_RATE * feedback)
+        return True
+
+    def _buffers(self, rows: int) -> Dict:
+        """بافرهای میانی این thread برای تعداد ردیف مشخص"""
+        local = self._local
+        buffers = getattr(local, 'buffers', None)
+        if buffers is None or buffers['rows'] != rows:
+            buffers = {
+                'rows': rows,
+                'first': np.empty((rows, self.fused_width)),
+                'rest': [
+                    [np.empty((rows, layer.output_size)) for layer in self.cortexes[name].layers[1:]]
+                    for name in self.names
+                ]
+            }
+            local.buffers = buffers
+        return buffers
+
+    def forward(self, input_data: np.ndarray, context: Dict = None) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        عبور forward همه کورتکس‌ها
+
+        Returns:
+            (خروجی هر کورتکس, خروجی ادغام‌شده)
+        """
+        input_data = np.atleast_2d(input_data)
+        rows = input_data.shape[0]
+        buffers = self._buffers(rows)
+
+        # یک ضرب ماتریسی برای لایه اول همه کورتکس‌ها
+        first = buffers['first']
+        np.dot(input_data, self.first_weights, out=first)
+        first += self.first_bias
+
+        # همه خروجی‌های نهایی در یک آرایه تازه
+        final = np.empty((rows, self.output_width))
+        outputs: Dict[str, np.ndarray] = {}
+
+        for index, name in enumerate(self.names):
+            activate_inplace(first[:, self.first_slices[index]], self.cortexes[name].layers[0].activation)
+
+        # last_input/last_output لایه‌ها برای یادگیری Hebbian - کپی مستقل از بافرهای thread؛
+        # خروجی لایه اول همه کورتکس‌ها برش‌هایی از یک آرایه است تا learn_sync هم ادغام شود
+        recorded_first = first.copy()
+
+        for index, name in enumerate(self.names):
+            cortex = self.cortexes[name]
+            layers = cortex.layers
+
+            columns = self.first_slices[index]
+            output = first[:, columns]
+            recorded = recorded_first[:, columns]
+            layers[0].record(input_data, recorded)
+
+            for layer, buffer in zip(layers[1:], buffers['rest'][index]):
+                np.dot(output, layer.weights, out=buffer)
+                buffer += layer.bias
+                output = activate_inplace(buffer, layer.activation)
+                layer_input, recorded = recorded, output.copy()
+                layer.record(layer_input, recorded)
+
+            result = final[:, self.output_slices[index]]
+            result[...] = output
+            outputs[name] = result
+            cortex.record(input_data, result, context)
+
+        integrated = final @ self.mixing
+        return outputs, integrated
+
+    def get_stats(self) -> Dict:
+        """آمار موتور"""
+        return {
+            'cortexes': len(self.names),
+            'input_size': self.input_size,
+            'fused_width': self.fused_width,
+            'output_width': self.output_width,
+            'rebuilds': self.rebuilds
+        }
+
+
+def benchmark_fused_forward(brain=None, batch_sizes=(1, 32, 256), repeats: int = 200) -> Dict:
+    """
+    مقایسه مسیر ادغام‌شده با مسیر جداگانه هر کورتکس
+
+    Returns:
+        برای هر اندازه دسته: زمان هر عبور (میلی‌ثانیه)، نسبت سرعت و حداکثر اختلاف خروجی
+    """
+    if brain is None:
+        from nazanin.brain.deep_neural_brain import DeepNeuralBrain
+        brain = DeepNeuralBrain()
+
+    engine = brain.fused_engine or FusedCortexEngine(brain.cortexes, brain.INTEGRATION_WEIGHTS)
+    rng = np.random.default_rng(0)
+    results = {}
+
+    for rows in batch_sizes:
+        x = rng.random((rows, brain.input_size))
+
+        def per_cortex():
+            outputs = {name: cortex.forward(x) for name, cortex in brain.cortexes.items()}
+            return outputs, brain._integrate_cortex_outputs(outputs)
+
+        reference, reference_integrated = per_cortex()
+        fused, fused_integrated = engine.forward(x)
+
+        max_error = max(
+            float(np.max(np.abs(reference[name] - fused[name]))) for name in reference
+        )
+        max_error = max(max_error, float(np.max(np.abs(reference_integrated - fused_integrated))))
+
+        timings = {}
+        for label, func in (('per_cortex', per_cortex), ('fused', lambda: engine.forward(x))):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                func()
+            timings[label] = (time.perf_counter() - start) / repeats * 1000
+
+        results[rows] = {
+            'per_cortex_ms': timings['per_cortex'],
+            'fused_ms': timings['fused'],
+            'speedup': timings['per_cortex'] / timings['fused'] if timings['fused'] else 0.0,
+            'max_abs_error': max_error
+        }
+
+    return results
+
+
+def benchmark_think_learn(cycles: int = 200, seed: int = 0) -> Dict:
+    """
+    مقایسه چرخه think → learn (مثل process_complete) در مسیر ادغام‌شده و جداگانه
+
+    دو مغز با وزن‌های یکسان ساخته می‌شوند؛ بعد از همه چرخه‌ها خروجی هر دو مقایسه می‌شود.
+
+    Returns:
+        زمان کل هر مسیر (ثانیه)، نسبت سرعت، تعداد بازسازی‌ها و حداکثر اختلاف خروجی بعد از یادگیری
+    """
+    from nazanin.brain.deep_neural_brain import DeepNeuralBrain
+
+    brains = {}
+    for label, fused in (('per_cortex', False), ('fused', True)):
+        np.random.seed(seed)
+        brains[label] = DeepNeuralBrain(fused=fused, telemetry=False)
+
+    # متن لاتین: یادگیری Hebbian با کدهای بزرگ حروف فارسی چند صد چرخه بعد واگرا می‌شود
+    messages = [f"message number {i}" for i in range(cycles)]
+    timings = {}
+
+    for label, brain in brains.items():
+        start = time.perf_counter()
+        for message in messages:
+            brain.think_sync(message)
+            brain.learn_sync({'input': message}, feedback=1.0)
+        timings[label] = time.perf_counter() - start
+
+    probe = brains['fused']._encode_input("probe")
+    reference, reference_integrated = brains['per_cortex']._forward_cortexes(probe, {})
+    fused, fused_integrated = brains['fused']._forward_cortexes(probe, {})
+
+    max_error = max(float(np.max(np.abs(reference[name] - fused[name]))) for name in reference)
+    max_error = max(max_error, float(np.max(np.abs(reference_integrated - fused_integrated))))
+
+    engine = brains['fused'].fused_engine
+    return {
+        'cycles': cycles,
+        'per_cortex_s': timings['per_cortex'],
+        'fused_s': timings['fused'],
+        'speedup': timings['per_cortex'] / timings['fused'] if timings['fused'] else 0.0,
+        'rebuilds': engine.rebuilds,
+        'max_abs_error': max_error
+    }
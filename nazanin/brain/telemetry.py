@@ -0,0 +1,77 @@
+"""
+Telemetry - آمار فشرده لایه‌ها و کورتکس‌ها
+Fixed-size NumPy-backed ring buffers for brain telemetry
+
+به جای یک dict پایتونی برای هر عبور، مقادیر در آرایه‌های ستونی با اندازه ثابت ذخیره می‌شوند.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+
+class RingBuffer:
+    """بافر حلقوی ستونی با اندازه ثابت"""
+
+    def __init__(self, capacity: int, fields: Dict[str, type]):
+        """
+        Args:
+            capacity: حداکثر تعداد رکوردها (قدیمی‌ترین رکورد بازنویسی می‌شود)
+            fields: نام ستون -> dtype
+        """
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in fields.items()}
+        self._next = 0
+        self._size = 0
+
+    def append(self, **values):
+        """اضافه کردن یک رکورد"""
+        index = self._next
+        for name, value in values.items():
+            self.columns[name][index] = value
+
+        self._next = (index + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def column(self, name: str) -> np.ndarray:
+        """مقادیر یک ستون به ترتیب زمانی (از قدیمی به جدید)"""
+        data = self.columns[name]
+        if self._size < self.capacity:
+            return data[:self._size].copy()
+        return np.concatenate((data[self._next:], data[:self._next]))
+
+    def records(self, last: int = None) -> List[Dict]:
+        """تبدیل به لیست dict (فقط برای نمایش/دیباگ)"""
+        columns = {name: self.column(name) for name in self.columns}
+        start = max(0, self._size - last) if last else 0
+        return [
+            {name: values[i].item() for name, values in columns.items()}
+            for i in range(start, self._size)
+        ]
+
+    def clear(self):
+        """پاک کردن همه رکوردها"""
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def activation_ring(capacity: int = 1000) -> RingBuffer:
+    """بافر آمار activation یک لایه"""
+    return RingBuffer(capacity, {
+        'timestamp': np.float64,
+        'mean_activation': np.float32,
+        'max_activation': np.float32
+    })
+
+
+def cortex_ring(capacity: int = 10000) -> RingBuffer:
+    """بافر سابقه پردازش یک کورتکس"""
+    return RingBuffer(capacity, {
+        'timestamp': np.float64,
+        'rows': np.int32
+    })
+
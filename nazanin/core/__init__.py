@@ -8,11 +8,14 @@ from nazanin.core.api_manager import APIManager
 from nazanin.core.sheets_manager_v2 import SheetsManagerV2
 from nazanin.core.api_manager_v2 import APIManagerV2
 from nazanin.core.sheets_auto_setup import SheetsAutoSetup
+from nazanin.core.stage_graph import StageGraph, Stage
 
 __all__ = [
     'SheetsManager',
     'APIManager',
     'SheetsManagerV2',
     'APIManagerV2',
-    'SheetsAutoSetup'
+    'SheetsAutoSetup',
+    'StageGraph',
+    'Stage'
 ]
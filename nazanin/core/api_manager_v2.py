@@ -4,11 +4,19 @@ AI API Manager V2
 """
 
 import asyncio
+import json
 import random
 import logging
-from typing import Dict, List, Any, Optional
+from collections import deque
+from typing import AsyncIterator, Dict, List, Any, Optional
 import time
 
+from nazanin.core.key_quota import KeyQuota, estimate_tokens
+from nazanin.core.provider_clients import ProviderClientPool
+from nazanin.core.provider_health import CircuitBreaker, ProviderHealth
+from nazanin.core.request_coalescer import RequestCoalescer
+from nazanin.core.response_cache import ResponseCache, prompt_key
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,6 +29,10 @@ class APIManagerV2:
         
         # Providers
         self.providers = {}
+        self.pool_config = config.get('ai_apis', {}).get('connection_pool', {})
+        self.routing_config = config.get('ai_apis', {}).get('routing', {})
+        self.health_config = config.get('ai_apis', {}).get('health', {})
+        self.quota_config = config.get('ai_apis', {}).get('quota', {})
         self.current_provider = None
         
         # Statistics
@@ -28,9 +40,26 @@ class APIManagerV2:
             'total_calls': 0,
             'successful_calls': 0,
             'failed_calls': 0,
-            'total_cost': 0.0
+            'total_cost': 0.0,
+            'hedged_requests': 0,
+            'hedge_wins': 0,
+            'cancelled_requests': 0
         }
         
+        # Response cache
+        cache_config = config.get('ai_apis', {}).get('response_cache', {})
+        self.response_cache = ResponseCache(
+            ttl=cache_config.get('ttl', 3600),
+            max_entries=cache_config.get('max_entries', 1000),
+            similarity_threshold=cache_config.get('similarity_threshold')
+        ) if cache_config.get('enabled', True) else None
+        
+        # ادغام درخواست‌های هم‌زمان یکسان
+        coalescing_config = config.get('ai_apis', {}).get('coalescing', {})
+        self.coalescer = RequestCoalescer(
+            window=coalescing_config.get('window', 0.0)
+        ) if coalescing_config.get('enabled', True) else None
+        
         # Initialize providers
         self._initialize_providers()
         
@@ -46,7 +75,10 @@ class APIManagerV2:
                 'groq',
                 ai_config['groq']['keys'],
                 ai_config['groq'].get('model', 'mixtral-8x7b-32768'),
-                priority=10  # بالاترین اولویت (رایگان و سریع)
+                priority=10,  # بالاترین اولویت (رایگان و سریع)
+                pool_config=self.pool_config,
+                health_config=self.health_config,
+                quota_config={**self.quota_config, **ai_config['groq'].get('rate_limits', {})}
             )
         
         # Gemini
@@ -55,7 +87,10 @@ class APIManagerV2:
                 'gemini',
                 ai_config['gemini']['keys'],
                 ai_config['gemini'].get('model', 'gemini-pro'),
-                priority=9
+                priority=9,
+                pool_config=self.pool_config,
+                health_config=self.health_config,
+                quota_config={**self.quota_config, **ai_config['gemini'].get('rate_limits', {})}
             )
         
         # Together AI
@@ -64,7 +99,10 @@ class APIManagerV2:
                 'together',
                 ai_config['together']['keys'],
                 ai_config['together'].get('model', 'mistralai/Mixtral-8x7B'),
-                priority=8
+                priority=8,
+                pool_config=self.pool_config,
+                health_config=self.health_config,
+                quota_config={**self.quota_config, **ai_config['together'].get('rate_limits', {})}
             )
         
         # OpenAI
@@ -73,7 +111,10 @@ class APIManagerV2:
                 'openai',
                 ai_config['openai']['keys'],
                 ai_config['openai'].get('model', 'gpt-4'),
-                priority=7
+                priority=7,
+                pool_config=self.pool_config,
+                health_config=self.health_config,
+                quota_config={**self.quota_config, **ai_config['openai'].get('rate_limits', {})}
             )
         
         # Claude
@@ -82,7 +123,10 @@ class APIManagerV2:
                 'claude',
                 ai_config['claude']['keys'],
                 ai_config['claude'].get('model', 'claude-3-sonnet'),
-                priority=7
+                priority=7,
+                pool_config=self.pool_config,
+                health_config=self.health_config,
+                quota_config={**self.quota_config, **ai_config['claude'].get('rate_limits', {})}
             )
         
         # DeepSeek
@@ -91,7 +135,10 @@ class APIManagerV2:
                 'deepseek',
                 ai_config['deepseek']['keys'],
                 ai_config['deepseek'].get('model', 'deepseek-chat'),
-                priority=6
+                priority=6,
+                pool_config=self.pool_config,
+                health_config=self.health_config,
+                quota_config={**self.quota_config, **ai_config['deepseek'].get('rate_limits', {})}
             )
         
         # ChatGLM (Zhipu AI) - رایگان و قدرتمند
@@ -100,7 +147,10 @@ class APIManagerV2:
                 'glm',
                 ai_config['glm']['keys'],
                 ai_config['glm'].get('model', 'glm-4'),
-                priority=8  # اولویت بالا (رایگان و خوب)
+                priority=8,  # اولویت بالا (رایگان و خوب)
+                pool_config=self.pool_config,
+                health_config=self.health_config,
+                quota_config={**self.quota_config, **ai_config['glm'].get('rate_limits', {})}
             )
     
     async def reload_keys_from_sheets(self):
@@ -110,11 +160,12 @@ class APIManagerV2:
         
         try:
             api_keys = await self.sheets_manager.get_api_keys()
+            key_limits = await self.sheets_manager.get_api_key_limits()
             
             # به‌روزرسانی هر provider
             for provider_name, keys in api_keys.items():
                 if provider_name in self.providers:
-                    self.providers[provider_name].update_keys(keys)
+                    self.providers[provider_name].update_keys(keys, key_limits.get(provider_name))
                     logger.info(f"✅ Reloaded {len(keys)} keys for {provider_name}")
         
         except Exception as e:
@@ -125,140 +176,534 @@ class APIManagerV2:
         self,
         prompt: str,
         preferred_provider: Optional[str] = None,
-        max_retries: int = 3
+        max_retries: int = 3,
+        mode: Optional[str] = None,
+        race: Optional[int] = None,
+        use_cache: bool = True
+    ) -> Optional[str]:
+        """
+        تولید پاسخ با fallback خودکار
+        
+        Args:
+            use_cache: استفاده از cache پاسخ‌ها (برای prompt های تکراری)
+            mode: 'sequential' (یکی پس از دیگری)، 'hedged' (اگر provider فعلی تا p95 تأخیرش
+                جواب نداد provider بعدی هم‌زمان شروع می‌شود) یا 'race' (چند provider با هم)
+            race: تعداد providers هم‌زمان در حالت race
+        """
+        use_cache = use_cache and self.response_cache is not None
+        if use_cache:
+            cached = self.response_cache.get(prompt)
+            if cached is not None:
+                return cached
+        
+        # درخواست‌های هم‌زمان با prompt و تنظیمات یکسان یک اجرای مشترک دارند
+        if self.coalescer is not None:
+            return await self.coalescer.run(
+                (prompt_key(prompt), preferred_provider, mode, race, max_retries, use_cache),
+                lambda: self._generate(prompt, preferred_provider, max_retries, mode, race, use_cache)
+            )
+        
+        return await self._generate(prompt, preferred_provider, max_retries, mode, race, use_cache)
+    
+    async def _generate(
+        self,
+        prompt: str,
+        preferred_provider: Optional[str],
+        max_retries: int,
+        mode: Optional[str],
+        race: Optional[int],
+        use_cache: bool
     ) -> Optional[str]:
-        """تولید پاسخ با fallback خودکار"""
+        """اجرای واقعی درخواست روی providers"""
+        mode = mode or self.routing_config.get('mode', 'hedged')
         
         # انتخاب ترتیب providers
+        providers_order = self._schedule()
         if preferred_provider and preferred_provider in self.providers:
-            providers_order = [preferred_provider] + [
-                p for p in sorted(
-                    self.providers.keys(),
-                    key=lambda x: self.providers[x].priority,
-                    reverse=True
-                ) if p != preferred_provider
-            ]
+            providers_order.remove(preferred_provider)
+            providers_order.insert(0, preferred_provider)
+        
+        if mode == 'race':
+            parallel = race or self.routing_config.get('race_size', 2)
         else:
-            # مرتب‌سازی بر اساس اولویت
-            providers_order = sorted(
-                self.providers.keys(),
-                key=lambda x: self.providers[x].priority,
-                reverse=True
-            )
+            parallel = 1
+        
+        response = await self._run_attempts(
+            prompt,
+            providers_order,
+            max_retries,
+            hedge=(mode == 'hedged'),
+            parallel=parallel
+        )
+        
+        if response is None:
+            logger.error("❌ All providers failed!")
+        elif use_cache:
+            self.response_cache.set(prompt, response)
+        return response
+    
+    async def generate_stream(
+        self,
+        prompt: str,
+        preferred_provider: Optional[str] = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        تولید پاسخ به صورت جریانی (chunk به chunk)
+        
+        اگر provider قبل از اولین chunk خطا بدهد provider بعدی امتحان می‌شود؛
+        بعد از شروع ارسال، پاسخ نیمه‌کاره با provider دیگری ادامه داده نمی‌شود.
+        """
+        use_cache = use_cache and self.response_cache is not None
+        if use_cache:
+            cached = self.response_cache.get(prompt)
+            if cached is not None:
+                yield cached
+                return
+        
+        providers_order = self._schedule()
+        if preferred_provider and preferred_provider in self.providers:
+            providers_order.remove(preferred_provider)
+            providers_order.insert(0, preferred_provider)
         
-        # تلاش با هر provider
         for provider_name in providers_order:
             provider = self.providers[provider_name]
-            
-            # اگه تمام کلیدهاش fail شده، برو بعدی
             if provider.all_keys_failed():
                 logger.warning(f"⚠️ All keys failed for {provider_name}, skipping...")
                 continue
             
-            # تلاش تا max_retries بار
-            for attempt in range(max_retries):
-                try:
-                    logger.info(f"🤖 Trying {provider_name} (attempt {attempt+1}/{max_retries})...")
-                    
-                    response = await provider.generate(prompt)
+            logger.info(f"🤖 Streaming from {provider_name}...")
+            chunks = []
+            stream = provider.generate_stream(prompt)
+            
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                logger.error(f"❌ {provider_name} stream failed: {e}")
+                self.stats['total_calls'] += 1
+                self.stats['failed_calls'] += 1
+                if chunks:
+                    return
+                continue
+            finally:
+                await stream.aclose()
+            
+            if chunks:
+                self.stats['total_calls'] += 1
+                self.stats['successful_calls'] += 1
+                self.current_provider = provider_name
+                
+                if use_cache:
+                    self.response_cache.set(prompt, ''.join(chunks))
+                return
+        
+        logger.error("❌ All providers failed!")
+    
+    async def _run_attempts(
+        self,
+        prompt: str,
+        providers_order: List[str],
+        max_retries: int,
+        hedge: bool,
+        parallel: int
+    ) -> Optional[str]:
+        """
+        اجرای تلاش‌ها روی providers
+        
+        اولین پاسخ موفق برگردانده و بقیه تلاش‌های در حال اجرا لغو می‌شوند.
+        تلاش ناموفق (تا max_retries بار) دوباره در ابتدای صف قرار می‌گیرد.
+        """
+        queue = deque(providers_order)
+        attempts = {name: 0 for name in providers_order}
+        pending: Dict[asyncio.Task, str] = {}
+        hedges = set()
+        
+        def launch() -> bool:
+            while queue:
+                provider_name = queue.popleft()
+                provider = self.providers[provider_name]
+                
+                # اگه تمام کلیدهاش fail شده، برو بعدی
+                if provider.all_keys_failed():
+                    logger.warning(f"⚠️ All keys failed for {provider_name}, skipping...")
+                    continue
+                
+                attempts[provider_name] += 1
+                logger.info(
+                    f"🤖 Trying {provider_name} "
+                    f"(attempt {attempts[provider_name]}/{max_retries})..."
+                )
+                task = asyncio.create_task(provider.generate(prompt))
+                pending[task] = provider_name
+                return True
+            return False
+        
+        for _ in range(max(1, parallel)):
+            if not launch():
+                break
+        
+        try:
+            while pending:
+                timeout = None
+                if hedge and queue:
+                    latest = list(pending.values())[-1]
+                    timeout = self._hedge_delay(self.providers[latest])
+                
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if not done:
+                    # provider فعلی کندتر از p95 خودش است - provider بعدی هم‌زمان
+                    if launch():
+                        hedges.add(list(pending.keys())[-1])
+                        self.stats['hedged_requests'] += 1
+                    continue
+                
+                for task in done:
+                    provider_name = pending.pop(task)
+                    error = task.exception()
                     
-                    if response:
+                    if error is None and task.result():
                         self.stats['total_calls'] += 1
                         self.stats['successful_calls'] += 1
+                        if task in hedges:
+                            self.stats['hedge_wins'] += 1
                         self.current_provider = provider_name
                         
                         logger.info(f"✅ Success with {provider_name}")
-                        return response
-                
-                except Exception as e:
-                    logger.error(f"❌ {provider_name} failed: {e}")
-                    self.stats['failed_calls'] += 1
+                        return task.result()
+                    
+                    if error is not None:
+                        logger.error(f"❌ {provider_name} failed: {error}")
+                        self.stats['total_calls'] += 1
+                        self.stats['failed_calls'] += 1
+                    
+                    if attempts[provider_name] < max_retries:
+                        queue.appendleft(provider_name)
+                        if not pending:
+                            await asyncio.sleep(self.routing_config.get('retry_delay', 1.0))
                     
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(1)  # کمی صبر قبل از retry
+                    if len(pending) < parallel:
+                        launch()
+            
+            return None
         
-        logger.error("❌ All providers failed!")
-        return None
+        finally:
+            for task in pending:
+                task.cancel()
+                self.stats['cancelled_requests'] += 1
+    
+    def _schedule(self) -> List[str]:
+        """
+        ترتیب providers
+        
+        در حالت adaptive بر اساس زمان مورد انتظار پاسخ (EWMA تأخیر، نرخ خطای اخیر و
+        کلیدهای در دسترس) و در غیر این صورت بر اساس priority ثابت.
+        """
+        if self.routing_config.get('adaptive', True):
+            return sorted(
+                self.providers.keys(),
+                key=lambda x: (self.providers[x].expected_latency(), -self.providers[x].priority)
+            )
+        
+        # مرتب‌سازی بر اساس اولویت
+        return sorted(
+            self.providers.keys(),
+            key=lambda x: self.providers[x].priority,
+            reverse=True
+        )
+    
+    def _hedge_delay(self, provider: 'AIProviderV2') -> float:
+        """زمان انتظار قبل از hedge - صدک تأخیر مشاهده‌شده provider"""
+        config = self.routing_config
+        delay = provider.latency_percentile(config.get('hedge_percentile', 0.95))
+        if delay is None:
+            delay = config.get('hedge_default_delay', 4.0)
+        return min(
+            max(delay, config.get('hedge_min_delay', 0.5)),
+            config.get('hedge_max_delay', 15.0)
+        )
+    
+    async def shutdown(self):
+        """بستن اتصال‌های همه providers"""
+        for provider in self.providers.values():
+            await provider.close()
+        logger.info("✅ API Manager V2 connections closed")
     
     def get_stats(self) -> Dict:
         """دریافت آمار"""
         return {
             **self.stats,
             'success_rate': self.stats['successful_calls'] / max(1, self.stats['total_calls']),
+            'response_cache': self.response_cache.get_stats() if self.response_cache else None,
+            'coalescing': self.coalescer.get_stats() if self.coalescer else None,
             'providers': {
                 name: provider.get_stats()
                 for name, provider in self.providers.items()
             }
         }
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """بررسی اعتبار cache"""
-        if cache_key not in self._cache:
-            return False
-        timestamp = self._cache_timestamps.get(cache_key, 0)
-        return (time.time() - timestamp) < self.cache_duration
+    def prompt_budget(self, preferred_provider: Optional[str] = None) -> Optional[int]:
+        """
+        بودجه توکن prompt
+        
+        بدون preferred_provider کمترین بودجه providers برگردانده می‌شود چون با failover و
+        hedge هر کدام ممکن است درخواست را دریافت کند.
+        """
+        ai_config = self.config.get('ai_apis', {})
+        default = ai_config.get('prompt_budget', {}).get('max_prompt_tokens')
+        
+        names = [preferred_provider] if preferred_provider in self.providers else list(self.providers)
+        budgets = [ai_config.get(name, {}).get('max_prompt_tokens', default) for name in names]
+        budgets = [budget for budget in budgets if budget]
+        return min(budgets) if budgets else default
     
-    def _clear_cache_key(self, cache_key: str):
-        """پاک کردن کلید از cache"""
-        self._cache.pop(cache_key, None)
-        self._cache_timestamps.pop(cache_key, None)
+    def clear_cache(self):
+        """پاک کردن cache پاسخ‌ها"""
+        if self.response_cache is not None:
+            self.response_cache.clear()
 
 
 class AIProviderV2:
     """ارائه‌دهنده AI با پشتیبانی از چند کلید"""
     
-    def __init__(self, name: str, keys: List[str], model: str, priority: int = 5):
+    def __init__(
+        self,
+        name: str,
+        keys: List[str],
+        model: str,
+        priority: int = 5,
+        pool_config: Optional[Dict] = None,
+        health_config: Optional[Dict] = None,
+        quota_config: Optional[Dict] = None
+    ):
         self.name = name
         self.keys = keys or []
         self.model = model
         self.priority = priority
         
+        # سلامت: circuit breaker برای هر کلید + EWMA تأخیر و خطا
+        self.health_config = health_config or {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.health = ProviderHealth(
+            latency_alpha=self.health_config.get('latency_alpha', 0.2),
+            error_alpha=self.health_config.get('error_alpha', 0.1),
+            default_latency=self.health_config.get('default_latency', 3.0)
+        )
+        
+        # سهمیه سمت کلاینت: سطل RPM/TPM برای هر کلید (محدودیت‌های Sheets بر config مقدم است)
+        self.quota_config = quota_config or {}
+        self.key_limits: Dict[str, Dict] = {}
+        self.quotas: Dict[str, KeyQuota] = {}
+        
+        # اتصال‌ها یک بار ساخته و بین درخواست‌ها استفاده می‌شوند
+        self.pool = ProviderClientPool(name, pool_config)
+        
         self.current_key_index = 0
-        self.failed_keys = set()
         
         self.stats = {
             'calls': 0,
             'successes': 0,
             'failures': 0,
-            'avg_response_time': 0
+            'avg_response_time': 0,
+            'streams': 0,
+            'avg_first_token_time': 0.0,
+            'quota_waits': 0,
+            'quota_wait_time': 0.0,
+            'quota_exhausted': 0
         }
+        
+        # تأخیر پاسخ‌های موفق اخیر (برای تعیین زمان hedge)
+        self.latencies = deque(maxlen=200)
     
-    def update_keys(self, new_keys: List[str]):
-        """به‌روزرسانی کلیدها"""
+    def update_keys(self, new_keys: List[str], key_limits: Optional[Dict[str, Dict]] = None):
+        """
+        به‌روزرسانی کلیدها
+        
+        Args:
+            key_limits: محدودیت هر کلید {key: {'rpm': ..., 'tpm': ...}} (مثلاً از Sheets)
+        """
         self.keys = new_keys
-        self.failed_keys.clear()  # Reset failed keys
+        self.breakers.clear()  # Reset failed keys
         self.current_key_index = 0
+        self.pool.retain_keys(new_keys)
+        
+        if key_limits is not None:
+            self.key_limits = key_limits
+        # سطل کلیدهای باقیمانده با همان محدودیت حفظ می‌شود تا مصرف اخیر فراموش نشود
+        for key in list(self.quotas.keys()):
+            quota = self.quotas[key]
+            limits = self._limits(key)
+            if key not in new_keys or (quota.rpm, quota.tpm) != (limits['rpm'], limits['tpm']):
+                del self.quotas[key]
     
-    def get_next_key(self) -> Optional[str]:
-        """دریافت کلید بعدی (Round-robin)"""
+    async def close(self):
+        """بستن اتصال‌های pool"""
+        await self.pool.close()
+    
+    def get_next_key(self, tokens: int = 0) -> Optional[str]:
+        """
+        دریافت کلید با بیشترین ظرفیت باقیمانده
+        
+        از بین کلیدهایی که breaker آن‌ها اجازه می‌دهد و سهمیه کافی برای tokens دارند،
+        کلید با بیشترین headroom انتخاب می‌شود (در تساوی به صورت Round-robin).
+        """
         if not self.keys:
             return None
         
-        # پیدا کردن اولین کلید که fail نشده
-        attempts = 0
-        while attempts < len(self.keys):
-            key = self.keys[self.current_key_index]
-            self.current_key_index = (self.current_key_index + 1) % len(self.keys)
+        now = time.time()
+        count = len(self.keys)
+        best_key = None
+        best_headroom = -1.0
+        for offset in range(count):
+            key = self.keys[(self.current_key_index + offset) % count]
+            if not self._breaker(key).is_available(now):
+                continue
             
-            if key not in self.failed_keys:
+            quota = self._quota(key)
+            if not quota.can_acquire(tokens):
+                continue
+            
+            headroom = quota.headroom()
+            if headroom > best_headroom:
+                best_key, best_headroom = key, headroom
+        
+        if best_key is None or not self._breaker(best_key).acquire():
+            return None
+        
+        self.current_key_index = (self.keys.index(best_key) + 1) % count
+        self._quota(best_key).acquire(tokens)
+        return best_key
+    
+    async def acquire_key(self, tokens: int = 0) -> Optional[str]:
+        """
+        دریافت کلید - اگر فقط سهمیه تمام شده، کمی تا آزاد شدن ظرفیت صبر می‌کند
+        
+        اگر انتظار بیشتر از max_wait لازم باشد None برمی‌گردد تا provider بعدی امتحان شود.
+        """
+        max_wait = self.quota_config.get('max_wait', 2.0)
+        waited = 0.0
+        
+        while True:
+            key = self.get_next_key(tokens)
+            if key:
+                if waited:
+                    self.stats['quota_waits'] += 1
+                    self.stats['quota_wait_time'] += waited
                 return key
             
-            attempts += 1
+            wait = self.quota_wait_time(tokens)
+            if wait is None or waited + wait > max_wait:
+                if wait is not None:
+                    self.stats['quota_exhausted'] += 1
+                return None
+            
+            # حداقل یک تیک کوچک تا تکرار بی‌فایده در صورت رقابت کلیدها پیش نیاید
+            wait = max(wait, 0.01)
+            await asyncio.sleep(wait)
+            waited += wait
+    
+    def quota_wait_time(self, tokens: int = 0) -> Optional[float]:
+        """کمترین زمان انتظار تا سهمیه یک کلید در دسترس (None اگر کلید در دسترسی نیست)"""
+        now = time.time()
+        waits = [
+            self._quota(key).wait_time(tokens)
+            for key in self.keys
+            if self._breaker(key).is_available(now)
+        ]
+        return min(waits) if waits else None
+    
+    def estimate_request_tokens(self, prompt: str) -> int:
+        """توکن‌های رزرو شده برای یک درخواست (prompt + پاسخ مورد انتظار)"""
+        return estimate_tokens(prompt) + self.quota_config.get('expected_completion_tokens', 512)
+    
+    def _settle_tokens(self, key: str, reserved: int, prompt: str, response: str):
+        """تنظیم سطل TPM با توکن‌های واقعی بعد از پاسخ"""
+        used = estimate_tokens(prompt) + estimate_tokens(response)
+        self._quota(key).adjust(used - reserved)
+    
+    def _limits(self, key: str) -> Dict:
+        limits = self.key_limits.get(key, {})
+        return {
+            'rpm': limits.get('rpm') or self.quota_config.get('rpm'),
+            'tpm': limits.get('tpm') or self.quota_config.get('tpm')
+        }
+    
+    def _quota(self, key: str) -> KeyQuota:
+        quota = self.quotas.get(key)
+        if quota is None:
+            quota = KeyQuota(**self._limits(key))
+            self.quotas[key] = quota
+        return quota
+    
+    def quota_headroom(self) -> float:
+        """میانگین ظرفیت باقیمانده کلیدهای در دسترس"""
+        now = time.time()
+        headrooms = [
+            self._quota(key).headroom()
+            for key in self.keys
+            if self._breaker(key).is_available(now)
+        ]
+        return sum(headrooms) / len(headrooms) if headrooms else 0.0
+    
+    def _breaker(self, key: str) -> CircuitBreaker:
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=self.health_config.get('failure_threshold', 2),
+                base_backoff=self.health_config.get('base_backoff', 5.0),
+                max_backoff=self.health_config.get('max_backoff', 300.0)
+            )
+            self.breakers[key] = breaker
+        return breaker
+    
+    @property
+    def failed_keys(self) -> set:
+        """کلیدهایی که breaker آن‌ها فعلاً باز است"""
+        now = time.time()
+        return {key for key in self.keys if not self._breaker(key).is_available(now)}
+    
+    def mark_key_failed(self, key: str, error: Exception = None):
+        """علامت‌گذاری کلید به عنوان ناموفق (تا پایان backoff)"""
+        message = str(error).lower() if error else ''
+        rate_limited = '429' in message or 'rate limit' in message
         
-        return None
+        breaker = self._breaker(key)
+        breaker.record_failure(rate_limited=rate_limited)
+        logger.warning(f"⚠️ Key failed for {self.name}: {key[:10]}... ({breaker.state})")
+    
+    def available_ratio(self) -> float:
+        """نسبت کلیدهای در دسترس"""
+        if not self.keys:
+            return 0.0
+        now = time.time()
+        available = sum(1 for key in self.keys if self._breaker(key).is_available(now))
+        return available / len(self.keys)
     
-    def mark_key_failed(self, key: str):
-        """علامت‌گذاری کلید به عنوان ناموفق"""
-        self.failed_keys.add(key)
-        logger.warning(f"⚠️ Key failed for {self.name}: {key[:10]}...")
+    def expected_latency(self) -> float:
+        """زمان مورد انتظار پاسخ موفق (برای زمان‌بندی)"""
+        return self.health.expected_latency(self.available_ratio() * self.quota_headroom())
+    
+    def latency_percentile(self, percentile: float = 0.95, min_samples: int = 5) -> Optional[float]:
+        """صدک تأخیر پاسخ‌های اخیر (None اگر نمونه کافی نیست)"""
+        if len(self.latencies) < min_samples:
+            return None
+        samples = sorted(self.latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * percentile))]
     
     def all_keys_failed(self) -> bool:
         """بررسی اینکه همه کلیدها fail شدن"""
-        return len(self.failed_keys) >= len(self.keys)
+        return self.available_ratio() == 0.0
     
     async def generate(self, prompt: str) -> Optional[str]:
         """تولید پاسخ"""
-        key = self.get_next_key()
+        tokens = self.estimate_request_tokens(prompt)
+        key = await self.acquire_key(tokens)
         if not key:
             logger.error(f"❌ No available keys for {self.name}")
             return None
@@ -271,20 +716,156 @@ class AIProviderV2:
             response = await self._call_api(key, prompt)
             
             # محاسبه زمان پاسخ
-            response_time = time.time() - start_time
-            self.stats['avg_response_time'] = (
-                (self.stats['avg_response_time'] * (self.stats['calls'] - 1) + response_time)
-                / self.stats['calls']
-            )
-            
-            self.stats['successes'] += 1
+            self._record_success(key, time.time() - start_time)
+            self._settle_tokens(key, tokens, prompt, response)
             return response
         
+        except asyncio.CancelledError:
+            self._breaker(key).release()
+            raise
+        
+        except Exception as e:
+            self.stats['failures'] += 1
+            self.health.record_failure()
+            self.mark_key_failed(key, e)
+            raise e
+    
+    def _record_success(self, key: str, response_time: float):
+        """ثبت پاسخ موفق در آمار، breaker و سلامت"""
+        self.stats['avg_response_time'] = (
+            (self.stats['avg_response_time'] * (self.stats['calls'] - 1) + response_time)
+            / self.stats['calls']
+        )
+        self.latencies.append(response_time)
+        self._breaker(key).record_success()
+        self.health.record_success(response_time)
+        
+        self.stats['successes'] += 1
+    
+    # Streaming
+    
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """تولید پاسخ به صورت جریانی - chunk های متن به محض رسیدن برگردانده می‌شوند"""
+        tokens = self.estimate_request_tokens(prompt)
+        key = await self.acquire_key(tokens)
+        if not key:
+            logger.error(f"❌ No available keys for {self.name}")
+            return
+        
+        self.stats['calls'] += 1
+        self.stats['streams'] += 1
+        start_time = time.time()
+        first_token = True
+        chunks = []
+        
+        try:
+            async for chunk in self._stream_api(key, prompt):
+                if not chunk:
+                    continue
+                chunks.append(chunk)
+                
+                if first_token:
+                    first_token = False
+                    first_token_time = time.time() - start_time
+                    self.stats['avg_first_token_time'] += (
+                        (first_token_time - self.stats['avg_first_token_time']) / self.stats['streams']
+                    )
+                
+                yield chunk
+            
+            self._record_success(key, time.time() - start_time)
+            self._settle_tokens(key, tokens, prompt, ''.join(chunks))
+        
+        except (asyncio.CancelledError, GeneratorExit):
+            self._breaker(key).release()
+            raise
+        
         except Exception as e:
             self.stats['failures'] += 1
-            self.mark_key_failed(key)
+            self.health.record_failure()
+            self.mark_key_failed(key, e)
             raise e
     
+    async def _stream_api(self, api_key: str, prompt: str) -> AsyncIterator[str]:
+        """فراخوانی جریانی API - providers بدون stream کل پاسخ را یکجا برمی‌گردانند"""
+        messages = [{"role": "user", "content": prompt}]
+        
+        if self.name in ('groq', 'openai'):
+            client = self._groq_client(api_key) if self.name == 'groq' else self._openai_client(api_key)
+            stream = await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=2048,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content
+        
+        elif self.name == 'claude':
+            stream = await self._claude_client(api_key).messages.create(
+                model=self.model,
+                max_tokens=2048,
+                messages=messages,
+                stream=True
+            )
+            async for event in stream:
+                if event.type == 'content_block_delta':
+                    yield getattr(event.delta, 'text', None)
+        
+        elif self.name == 'gemini' and hasattr(self._gemini_model(api_key), 'generate_content_async'):
+            response = await self._gemini_model(api_key).generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                yield chunk.text
+        
+        elif self.name == 'together':
+            payload = {
+                'model': self.model,
+                'prompt': prompt,
+                'max_tokens': 2048,
+                'temperature': 0.7,
+                'stream_tokens': True
+            }
+            async for event in self._sse_events('https://api.together.xyz/inference', payload, api_key):
+                yield event['choices'][0].get('text')
+        
+        elif self.name in ('deepseek', 'glm'):
+            if self.name == 'deepseek':
+                url = 'https://api.deepseek.com/v1/chat/completions'
+                payload = {'model': self.model, 'messages': messages, 'temperature': 0.7}
+                token = api_key
+            else:
+                url = 'https://open.bigmodel.cn/api/paas/v4/chat/completions'
+                payload = {'model': self.model, 'messages': messages, 'temperature': 0.7, 'top_p': 0.7}
+                token = self._glm_token(api_key)
+            
+            payload['stream'] = True
+            async for event in self._sse_events(url, payload, token):
+                if event.get('choices'):
+                    yield event['choices'][0].get('delta', {}).get('content')
+        
+        else:
+            yield await self._call_api(api_key, prompt)
+    
+    async def _sse_events(self, url: str, payload: Dict, token: str) -> AsyncIterator[Dict]:
+        """خواندن رویدادهای Server-Sent Events (خطوط data: ...)"""
+        session = await self.pool.get_session()
+        
+        async with session.post(url, json=payload, headers={'Authorization': f'Bearer {token}'}) as resp:
+            if resp.status != 200:
+                raise Exception(f"{self.name} stream error: {resp.status}")
+            
+            async for raw_line in resp.content:
+                line = raw_line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                yield json.loads(data)
+    
     async def _call_api(self, api_key: str, prompt: str) -> str:
         """فراخوانی API (باید برای هر provider پیاده‌سازی بشه)"""
         
@@ -305,13 +886,72 @@ class AIProviderV2:
         else:
             raise NotImplementedError(f"Provider {self.name} not implemented")
     
+    # SDK clients (یک بار برای هر کلید)
+    
+    def _groq_client(self, api_key: str):
+        from groq import AsyncGroq
+        return self.pool.get_client(
+            api_key,
+            lambda key: AsyncGroq(api_key=key, http_client=self.pool.get_http_client())
+        )
+    
+    def _openai_client(self, api_key: str):
+        import openai
+        return self.pool.get_client(
+            api_key,
+            lambda key: openai.AsyncOpenAI(api_key=key, http_client=self.pool.get_http_client())
+        )
+    
+    def _claude_client(self, api_key: str):
+        import anthropic
+        return self.pool.get_client(
+            api_key,
+            lambda key: anthropic.AsyncAnthropic(api_key=key, http_client=self.pool.get_http_client())
+        )
+    
+    def _gemini_model(self, api_key: str):
+        import google.generativeai as genai
+        from google.ai import generativelanguage as glm
+        
+        # genai.configure سراسری است و درخواست‌های هم‌زمان با کلیدهای مختلف را قاطی می‌کند؛
+        # هر مدل client های خودش را با کلید صریح می‌گیرد
+        def factory(key: str):
+            options = {'api_key': key}
+            model = genai.GenerativeModel(self.model)
+            model._client = glm.GenerativeServiceClient(client_options=options)
+            model._async_client = glm.GenerativeServiceAsyncClient(client_options=options)
+            return model
+        
+        return self.pool.get_client(api_key, factory)
+    
+    def _glm_token(self, apikey: str, exp_seconds: int = 3600) -> str:
+        """GLM uses JWT authentication"""
+        import jwt
+        
+        try:
+            id, secret = apikey.split(".")
+        except Exception as e:
+            raise Exception("invalid apikey", e)
+        
+        payload = {
+            "api_key": id,
+            "exp": int(round(time.time() * 1000)) + exp_seconds * 1000,
+            "timestamp": int(round(time.time() * 1000)),
+        }
+        
+        return jwt.encode(
+            payload,
+            secret,
+            algorithm="HS256",
+            headers={"alg": "HS256", "sign_type": "SIGN"},
+        )
+    
     async def _call_groq(self, api_key: str, prompt: str) -> str:
         """Groq API"""
         try:
-            from groq import Groq
-            client = Groq(api_key=api_key)
+            client = self._groq_client(api_key)
             
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.7,
@@ -326,11 +966,11 @@ class AIProviderV2:
     async def _call_gemini(self, api_key: str, prompt: str) -> str:
         """Gemini API"""
         try:
-            import google.generativeai as genai
-            genai.configure(api_key=api_key)
-            
-            model = genai.GenerativeModel(self.model)
-            response = model.generate_content(prompt)
+            model = self._gemini_model(api_key)
+            if hasattr(model, 'generate_content_async'):
+                response = await model.generate_content_async(prompt)
+            else:
+                response = await self.pool.run_blocking(model.generate_content, prompt)
             
             return response.text
         except Exception as e:
@@ -339,32 +979,30 @@ class AIProviderV2:
     
     async def _call_together(self, api_key: str, prompt: str) -> str:
         """Together AI API"""
-        import aiohttp
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                'https://api.together.xyz/inference',
-                json={
-                    'model': self.model,
-                    'prompt': prompt,
-                    'max_tokens': 2048,
-                    'temperature': 0.7
-                },
-                headers={'Authorization': f'Bearer {api_key}'}
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data['output']['choices'][0]['text']
-                else:
-                    raise Exception(f"Together AI error: {resp.status}")
+        session = await self.pool.get_session()
+        
+        async with session.post(
+            'https://api.together.xyz/inference',
+            json={
+                'model': self.model,
+                'prompt': prompt,
+                'max_tokens': 2048,
+                'temperature': 0.7
+            },
+            headers={'Authorization': f'Bearer {api_key}'}
+        ) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                return data['output']['choices'][0]['text']
+            else:
+                raise Exception(f"Together AI error: {resp.status}")
     
     async def _call_openai(self, api_key: str, prompt: str) -> str:
         """OpenAI API"""
         try:
-            import openai
-            openai.api_key = api_key
+            client = self._openai_client(api_key)
             
-            response = openai.ChatCompletion.create(
+            response = await client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.7,
@@ -379,10 +1017,9 @@ class AIProviderV2:
     async def _call_claude(self, api_key: str, prompt: str) -> str:
         """Claude API"""
         try:
-            import anthropic
-            client = anthropic.Anthropic(api_key=api_key)
+            client = self._claude_client(api_key)
             
-            response = client.messages.create(
+            response = await client.messages.create(
                 model=self.model,
                 max_tokens=2048,
                 messages=[{"role": "user", "content": prompt}]
@@ -395,73 +1032,62 @@ class AIProviderV2:
     
     async def _call_deepseek(self, api_key: str, prompt: str) -> str:
         """DeepSeek API"""
-        import aiohttp
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                'https://api.deepseek.com/v1/chat/completions',
-                json={
-                    'model': self.model,
-                    'messages': [{"role": "user", "content": prompt}],
-                    'temperature': 0.7
-                },
-                headers={'Authorization': f'Bearer {api_key}'}
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data['choices'][0]['message']['content']
-                else:
-                    raise Exception(f"DeepSeek error: {resp.status}")
+        session = await self.pool.get_session()
+        
+        async with session.post(
+            'https://api.deepseek.com/v1/chat/completions',
+            json={
+                'model': self.model,
+                'messages': [{"role": "user", "content": prompt}],
+                'temperature': 0.7
+            },
+            headers={'Authorization': f'Bearer {api_key}'}
+        ) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                return data['choices'][0]['message']['content']
+            else:
+                raise Exception(f"DeepSeek error: {resp.status}")
     
     async def _call_glm(self, api_key: str, prompt: str) -> str:
         """ChatGLM (Zhipu AI) API"""
-        import aiohttp
-        import time
-        import jwt
+        token = self._glm_token(api_key)
+        session = await self.pool.get_session()
         
-        # GLM uses JWT authentication
-        def generate_token(apikey: str, exp_seconds: int = 3600):
-            try:
-                id, secret = apikey.split(".")
-            except Exception as e:
-                raise Exception("invalid apikey", e)
-            
-            payload = {
-                "api_key": id,
-                "exp": int(round(time.time() * 1000)) + exp_seconds * 1000,
-                "timestamp": int(round(time.time() * 1000)),
-            }
-            
-            return jwt.encode(
-                payload,
-                secret,
-                algorithm="HS256",
-                headers={"alg": "HS256", "sign_type": "SIGN"},
-            )
-        
-        token = generate_token(api_key)
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                'https://open.bigmodel.cn/api/paas/v4/chat/completions',
-                json={
-                    'model': self.model,
-                    'messages': [{"role": "user", "content": prompt}],
-                    'temperature': 0.7,
-                    'top_p': 0.7,
-                    'stream': False
-                },
-                headers={'Authorization': f'Bearer {token}'}
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data['choices'][0]['message']['content']
-                else:
-                    raise Exception(f"GLM error: {resp.status}")
+        async with session.post(
+            'https://open.bigmodel.cn/api/paas/v4/chat/completions',
+            json={
+                'model': self.model,
+                'messages': [{"role": "user", "content": prompt}],
+                'temperature': 0.7,
+                'top_p': 0.7,
+                'stream': False
+            },
+            headers={'Authorization': f'Bearer {token}'}
+        ) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                return data['choices'][0]['message']['content']
+            else:
+                raise Exception(f"GLM error: {resp.status}")
     
     def get_stats(self) -> Dict:
         """دریافت آمار کلی"""
-        return self.stats
+        return {
+            **self.stats,
+            'p95_response_time': self.latency_percentile(0.95),
+            'health': {
+                **self.health.get_stats(),
+                'expected_latency': self.expected_latency(),
+                'available_keys': len(self.keys) - len(self.failed_keys),
+                'breakers': [self._breaker(key).get_stats() for key in self.keys]
+            },
+            'quota': {
+                'headroom': self.quota_headroom(),
+                'keys': [self._quota(key).get_stats() for key in self.keys]
+            },
+            'pool': self.pool.get_stats()
+        }
 
 
 # Usage Example
@@ -0,0 +1,102 @@
+"""
+Key Quota - سهمیه سمت کلاینت برای هر کلید API
+Client-side token-bucket limiter per API key (requests/min and tokens/min)
+
+- هر کلید دو سطل دارد: درخواست در دقیقه (RPM) و توکن در دقیقه (TPM)
+- قبل از ارسال، توکن‌های تخمینی رزرو می‌شوند و بعد از پاسخ با مقدار واقعی تنظیم می‌شوند
+- headroom (ظرفیت باقیمانده نسبی) برای انتخاب کلید و زمان انتظار تا آزاد شدن ظرفیت محاسبه می‌شود
+"""
+
+import time
+from typing import Dict, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """تخمین تعداد توکن متن (حدود 4 کاراکتر لاتین یا 2 کاراکتر غیرلاتین برای هر توکن)"""
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return max(1, (len(text) - non_ascii) // 4 + non_ascii // 2)
+
+
+class TokenBucket:
+    """سطل توکن با پر شدن پیوسته"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def available(self) -> float:
+        """توکن‌های موجود"""
+        self._refill()
+        return self.tokens
+
+    def consume(self, amount: float):
+        """برداشت (ممکن است منفی شود - بدهی از پاسخ‌های بزرگ‌تر از تخمین)"""
+        self._refill()
+        self.tokens -= amount
+
+    def wait_time(self, amount: float) -> float:
+        """زمان تا موجود شدن amount توکن (ثانیه)"""
+        missing = min(amount, self.capacity) - self.available()
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_per_second if self.refill_per_second > 0 else float('inf')
+
+
+class KeyQuota:
+    """محدودیت RPM/TPM یک کلید - None یعنی بدون محدودیت"""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm, rpm / 60.0) if rpm else None
+        self.tokens = TokenBucket(tpm, tpm / 60.0) if tpm else None
+
+    def headroom(self) -> float:
+        """ظرفیت باقیمانده نسبی (0 تا 1)"""
+        ratios = [1.0]
+        if self.requests:
+            ratios.append(self.requests.available() / self.requests.capacity)
+        if self.tokens:
+            ratios.append(self.tokens.available() / self.tokens.capacity)
+        return max(0.0, min(ratios))
+
+    def wait_time(self, tokens: int = 0) -> float:
+        """زمان انتظار تا امکان یک درخواست با این تعداد توکن"""
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.wait_time(1))
+        if self.tokens:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    def can_acquire(self, tokens: int = 0) -> bool:
+        return self.wait_time(tokens) == 0.0
+
+    def acquire(self, tokens: int = 0):
+        """رزرو یک درخواست و توکن‌های تخمینی آن"""
+        if self.requests:
+            self.requests.consume(1)
+        if self.tokens:
+            self.tokens.consume(tokens)
+
+    def adjust(self, extra_tokens: int):
+        """تنظیم بعد از پاسخ (مثبت = مصرف بیشتر از تخمین، منفی = بازگشت)"""
+        if self.tokens and extra_tokens:
+            self.tokens.consume(extra_tokens)
+
+    def get_stats(self) -> Dict:
+        """وضعیت سهمیه"""
+        return {
+            'rpm': self.rpm,
+            'tpm': self.tpm,
+            'headroom': self.headroom()
+        }
@@ -0,0 +1,89 @@
+"""
+Loop Monitor - پایش تأخیر event loop
+Measures how long the asyncio event loop is blocked
+
+یک task هر interval ثانیه بیدار می‌شود؛ فاصله بین زمان مورد انتظار و زمان واقعی بیدار شدن
+همان مدتی است که loop توسط کد همگام مسدود بوده است.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """اندازه‌گیری lag (مسدود بودن) event loop"""
+
+    def __init__(self, interval: float = 0.5, warn_threshold: float = 0.1, window: int = 600):
+        """
+        Args:
+            interval: فاصله نمونه‌برداری (ثانیه)
+            warn_threshold: lag بیشتر از این مقدار به عنوان مسدود شدن ثبت و log می‌شود
+            window: تعداد نمونه‌های اخیر برای محاسبه میانگین و p95
+        """
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self._samples = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            'samples': 0,
+            'blocked_count': 0,
+            'max_lag': 0.0,
+            'total_blocked_time': 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """شروع پایش روی loop فعلی"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"⏱️ Event loop lag monitor started (threshold={self.warn_threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        """توقف پایش"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - expected))
+
+    def record(self, lag: float):
+        """ثبت یک نمونه lag (ثانیه)"""
+        self._samples.append(lag)
+        self.stats['samples'] += 1
+        self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+
+        if lag >= self.warn_threshold:
+            self.stats['blocked_count'] += 1
+            self.stats['total_blocked_time'] += lag
+            logger.warning(f"🐢 Event loop blocked for {lag * 1000:.0f}ms")
+
+    def get_stats(self) -> Dict:
+        """آمار lag (میلی‌ثانیه)"""
+        samples = sorted(self._samples)
+        count = len(samples)
+        return {
+            'samples': self.stats['samples'],
+            'blocked_count': self.stats['blocked_count'],
+            'total_blocked_ms': self.stats['total_blocked_time'] * 1000,
+            'max_lag_ms': self.stats['max_lag'] * 1000,
+            'avg_lag_ms': sum(samples) / count * 1000 if count else 0.0,
+            'p95_lag_ms': samples[min(count - 1, int(count * 0.95))] * 1000 if count else 0.0,
+            'running': self.running
+        }
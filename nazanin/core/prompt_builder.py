@@ -0,0 +1,153 @@
+"""
+Prompt Builder - مونتاژ prompt با بودجه توکن
+Token-budgeted prompt assembly with priority truncation and cached preamble segments
+
+- هر prompt از بخش‌هایی (PromptSection) با اولویت ساخته می‌شود
+- اگر prompt از بودجه توکن provider بزرگ‌تر باشد، بخش‌های اختیاری از کم‌اولویت‌ترین
+  حذف یا کوتاه می‌شوند؛ بخش‌های ضروری (مقدمه، پیام کاربر) فقط در آخرین مرحله کوتاه می‌شوند
+- متن ثابت مقدمه یک بار ساخته و همراه تعداد توکنش cache می‌شود
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+from nazanin.core.key_quota import estimate_tokens
+
+TRUNCATION_MARK = '…'
+
+
+class PromptSection:
+    """یک بخش از prompt"""
+
+    def __init__(
+        self,
+        name: str,
+        text: str,
+        priority: int = 50,
+        required: bool = False,
+        truncatable: bool = True,
+        tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            name: نام بخش
+            text: متن بخش
+            priority: اولویت (بیشتر = دیرتر حذف می‌شود)
+            required: بخش ضروری حذف نمی‌شود
+            truncatable: آیا می‌توان بخش را کوتاه کرد
+            tokens: تعداد توکن از پیش محاسبه شده (مثلاً برای مقدمه cache شده)
+        """
+        self.name = name
+        self.text = text
+        self.priority = priority
+        self.required = required
+        self.truncatable = truncatable
+        self.tokens = estimate_tokens(text) if tokens is None else tokens
+
+    def truncated(self, tokens: int) -> Optional['PromptSection']:
+        """نسخه کوتاه شده تا tokens توکن (None اگر جایی نمی‌ماند)"""
+        if tokens <= 0:
+            return None
+        chars = max(1, len(self.text) * tokens // max(self.tokens, 1) - len(TRUNCATION_MARK))
+        text = self.text[:chars].rstrip() + TRUNCATION_MARK
+        return PromptSection(self.name, text, self.priority, self.required, self.truncatable)
+
+
+class PromptBuilder:
+    """مونتاژ prompt در بودجه توکن"""
+
+    def __init__(self, max_segments: int = 64, separator: str = '\n'):
+        """
+        Args:
+            max_segments: حداکثر تعداد مقدمه‌های cache شده
+            separator: جداکننده بخش‌ها
+        """
+        self.max_segments = max_segments
+        self.separator = separator
+        self._segments: 'OrderedDict[Hashable, PromptSection]' = OrderedDict()
+
+        self.stats = {
+            'builds': 0,
+            'over_budget': 0,
+            'dropped_sections': 0,
+            'truncated_sections': 0,
+            'segment_hits': 0,
+            'segment_misses': 0,
+            'avg_tokens': 0.0
+        }
+
+    def segment(self, key: Hashable, render: Callable[[], str], name: str = 'preamble') -> PromptSection:
+        """بخش ثابت (مقدمه) - با key یکسان فقط یک بار ساخته و شمرده می‌شود"""
+        section = self._segments.get(key)
+        if section is not None:
+            self._segments.move_to_end(key)
+            self.stats['segment_hits'] += 1
+            return section
+
+        section = PromptSection(name, render(), priority=100, required=True, truncatable=False)
+        self._segments[key] = section
+        self.stats['segment_misses'] += 1
+        while len(self._segments) > self.max_segments:
+            self._segments.popitem(last=False)
+        return section
+
+    def build(self, sections: List[Optional[PromptSection]], budget: Optional[int] = None) -> str:
+        """
+        مونتاژ بخش‌ها به ترتیب داده شده در بودجه توکن
+
+        Args:
+            sections: بخش‌ها (None ها نادیده گرفته می‌شوند)
+            budget: حداکثر توکن prompt - None یعنی بدون محدودیت
+        """
+        fitted = self.fit([section for section in sections if section is not None], budget)
+        prompt = self.separator.join(section.text for section in fitted)
+
+        self.stats['builds'] += 1
+        tokens = sum(section.tokens for section in fitted)
+        self.stats['avg_tokens'] += (tokens - self.stats['avg_tokens']) / self.stats['builds']
+        return prompt
+
+    def fit(self, sections: List[PromptSection], budget: Optional[int] = None) -> List[PromptSection]:
+        """حذف و کوتاه کردن بخش‌ها تا مجموع توکن‌ها در بودجه جا شود"""
+        total = sum(section.tokens for section in sections)
+        if budget is None or total <= budget:
+            return sections
+
+        self.stats['over_budget'] += 1
+        fitted = list(sections)
+
+        # ابتدا بخش‌های اختیاری، سپس بخش‌های ضروری قابل کوتاه شدن - هر کدام از کم‌اولویت‌ترین
+        candidates = sorted(
+            range(len(fitted)),
+            key=lambda i: (fitted[i].required, fitted[i].priority)
+        )
+        for index in candidates:
+            if total <= budget:
+                break
+
+            section = fitted[index]
+            if section.required and not section.truncatable:
+                continue
+
+            excess = total - budget
+            shorter = section.truncated(section.tokens - excess) if section.truncatable else None
+            if shorter is None and section.required:
+                continue
+
+            total -= section.tokens
+            if shorter is not None:
+                fitted[index] = shorter
+                total += shorter.tokens
+                self.stats['truncated_sections'] += 1
+            else:
+                fitted[index] = None
+                self.stats['dropped_sections'] += 1
+
+        return [section for section in fitted if section is not None]
+
+    def get_stats(self) -> Dict:
+        """آمار مونتاژ"""
+        return {
+            **self.stats,
+            'cached_segments': len(self._segments)
+        }
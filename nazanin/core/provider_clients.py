@@ -0,0 +1,153 @@
+"""
+Provider Clients - pool اتصال ارائه‌دهندگان AI
+Reusable, pooled HTTP sessions and SDK clients per AI provider
+
+- یک session مشترک aiohttp برای هر provider (keep-alive و محدودیت اتصال به ازای هر host)
+- یک transport مشترک httpx.AsyncClient (در صورت نصب بودن h2 با HTTP/2) برای SDK های async
+- یک SDK client برای هر کلید که روی همان transport ساخته می‌شود
+- یک executor محدود برای SDK هایی که نسخه async ندارند (event loop مسدود نمی‌شود)
+- بستن همه اتصال‌ها در shutdown
+"""
+
+import asyncio
+import importlib.util
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def http2_available() -> bool:
+    """آیا httpx با پشتیبانی HTTP/2 (پکیج h2) نصب است؟"""
+    return (
+        importlib.util.find_spec('httpx') is not None
+        and importlib.util.find_spec('h2') is not None
+    )
+
+
+class ProviderClientPool:
+    """pool اتصال یک provider - یک بار ساخته و بین درخواست‌ها استفاده می‌شود"""
+
+    def __init__(self, name: str, config: Optional[Dict] = None):
+        """
+        Args:
+            config: limit (کل اتصال‌ها), limit_per_host, keepalive_timeout, timeout, http2,
+                executor_workers (حداکثر فراخوانی هم‌زمان SDK های همگام)
+        """
+        config = config or {}
+        self.name = name
+        self.limit = config.get('limit', 100)
+        self.limit_per_host = config.get('limit_per_host', 10)
+        self.keepalive_timeout = config.get('keepalive_timeout', 60)
+        self.timeout = config.get('timeout', 60)
+        self.http2 = config.get('http2', True) and http2_available()
+        self.executor_workers = config.get('executor_workers', 4)
+
+        self._session = None
+        self._http_client = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._clients: Dict[str, Any] = {}
+
+        self.stats = {
+            'sessions_created': 0,
+            'clients_created': 0,
+            'client_reuses': 0,
+            'blocking_calls': 0
+        }
+
+    async def get_session(self):
+        """session مشترک aiohttp (در اولین استفاده ساخته می‌شود)"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self.stats['sessions_created'] += 1
+
+        return self._session
+
+    def get_http_client(self):
+        """
+        transport مشترک httpx.AsyncClient برای SDK ها (یا None اگر httpx نصب نیست)
+
+        httpx محدودیت به ازای host ندارد؛ این client فقط به API همین provider (یک host) وصل
+        می‌شود، پس limit_per_host سقف کل اتصال‌های آن است.
+        """
+        if self._http_client is None and importlib.util.find_spec('httpx') is not None:
+            import httpx
+
+            max_connections = min(self.limit, self.limit_per_host)
+            self._http_client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=self.keepalive_timeout
+                )
+            )
+
+        return self._http_client
+
+    def get_client(self, key: str, factory: Callable[[str], Any]) -> Any:
+        """SDK client این کلید (فقط یک بار با factory ساخته می‌شود)"""
+        client = self._clients.get(key)
+        if client is None:
+            client = factory(key)
+            self._clients[key] = client
+            self.stats['clients_created'] += 1
+        else:
+            self.stats['client_reuses'] += 1
+        return client
+
+    async def run_blocking(self, func: Callable, *args) -> Any:
+        """اجرای یک فراخوانی همگام در executor محدود این provider"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.executor_workers,
+                thread_name_prefix=f'ai-{self.name}'
+            )
+
+        self.stats['blocking_calls'] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def retain_keys(self, keys):
+        """حذف client کلیدهایی که دیگر استفاده نمی‌شوند"""
+        for key in list(self._clients.keys()):
+            if key not in keys:
+                self._clients.pop(key, None)
+
+    async def close(self):
+        """بستن همه اتصال‌ها"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+        self._clients.clear()
+
+    def get_stats(self) -> Dict:
+        """آمار pool"""
+        return {
+            **self.stats,
+            'clients': len(self._clients),
+            'http2': self.http2,
+            'session_open': self._session is not None and not self._session.closed
+        }
@@ -0,0 +1,158 @@
+"""
+Provider Health - سلامت و امتیازدهی ارائه‌دهندگان AI
+Per-key circuit breakers and EWMA latency / error-rate scoring
+
+- هر کلید یک circuit breaker دارد: بعد از خطا باز می‌شود، بعد از backoff یک درخواست آزمایشی
+  (half-open) می‌گیرد و با موفقیت دوباره بسته می‌شود؛ backoff با هر شکست دوبرابر می‌شود
+- هر provider میانگین نمایی (EWMA) تأخیر و نرخ خطا دارد و زمان مورد انتظار پاسخ از آن محاسبه می‌شود
+"""
+
+import time
+from typing import Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """circuit breaker یک کلید API"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 2,
+        base_backoff: float = 5.0,
+        max_backoff: float = 300.0
+    ):
+        """
+        Args:
+            failure_threshold: تعداد خطای پشت سر هم برای باز شدن
+            base_backoff: مدت باز ماندن بعد از اولین باز شدن (ثانیه)
+            max_backoff: حداکثر مدت باز ماندن
+        """
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = base_backoff
+        self.open_until = 0.0
+        self.probing = False
+
+        self.times_opened = 0
+
+    def is_available(self, now: Optional[float] = None) -> bool:
+        """آیا کلید قابل استفاده است؟ (بدون تغییر وضعیت)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return (now or time.time()) >= self.open_until
+        return not self.probing
+
+    def acquire(self) -> bool:
+        """گرفتن اجازه درخواست - در حالت half-open فقط یک درخواست آزمایشی"""
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN:
+            if time.time() < self.open_until:
+                return False
+            self.state = HALF_OPEN
+            self.probing = False
+
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def release(self):
+        """درخواست بدون نتیجه تمام شد (مثلاً لغو شد) - آزاد کردن آزمایش half-open"""
+        self.probing = False
+
+    def record_success(self):
+        """موفقیت - بسته شدن و ریست backoff"""
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = self.base_backoff
+        self.probing = False
+
+    def record_failure(self, rate_limited: bool = False, retry_after: Optional[float] = None):
+        """
+        شکست - باز شدن بعد از رسیدن به آستانه (یا فوری برای 429)
+
+        Args:
+            retry_after: مدت پیشنهادی سرور برای انتظار (ثانیه)
+        """
+        self.failures += 1
+        self.probing = False
+
+        if self.state == HALF_OPEN:
+            # آزمایش ناموفق - backoff دوبرابر
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self._open(retry_after)
+        elif rate_limited or self.failures >= self.failure_threshold:
+            self._open(retry_after)
+
+    def _open(self, retry_after: Optional[float] = None):
+        self.state = OPEN
+        self.open_until = time.time() + max(self.backoff, retry_after or 0.0)
+        self.times_opened += 1
+
+    def get_stats(self) -> Dict:
+        """وضعیت breaker"""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'backoff': self.backoff,
+            'retry_in': max(0.0, self.open_until - time.time()) if self.state == OPEN else 0.0,
+            'times_opened': self.times_opened
+        }
+
+
+class ProviderHealth:
+    """EWMA تأخیر و نرخ خطای یک provider"""
+
+    def __init__(self, latency_alpha: float = 0.2, error_alpha: float = 0.1, default_latency: float = 3.0):
+        """
+        Args:
+            latency_alpha: وزن نمونه جدید در EWMA تأخیر
+            error_alpha: وزن نمونه جدید در EWMA نرخ خطا
+            default_latency: تأخیر فرضی قبل از اولین پاسخ موفق (ثانیه)
+        """
+        self.latency_alpha = latency_alpha
+        self.error_alpha = error_alpha
+        self.default_latency = default_latency
+
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+
+    def record_success(self, latency: float):
+        """ثبت پاسخ موفق"""
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += self.latency_alpha * (latency - self.ewma_latency)
+        self.error_rate *= 1 - self.error_alpha
+
+    def record_failure(self):
+        """ثبت خطا"""
+        self.error_rate += self.error_alpha * (1.0 - self.error_rate)
+
+    def expected_latency(self, available_ratio: float = 1.0) -> float:
+        """
+        زمان مورد انتظار تا پاسخ موفق
+
+        تأخیر بر احتمال موفقیت تقسیم می‌شود (هر خطا یعنی یک تلاش دیگر) و با کم شدن
+        کلیدهای در دسترس (سهمیه باقیمانده) امتیاز بدتر می‌شود.
+        """
+        latency = self.ewma_latency if self.ewma_latency is not None else self.default_latency
+        success = max(1.0 - self.error_rate, 0.05)
+        return latency / success / max(available_ratio, 0.1)
+
+    def get_stats(self) -> Dict:
+        """آمار سلامت"""
+        return {
+            'ewma_latency': self.ewma_latency,
+            'error_rate': self.error_rate
+        }
@@ -0,0 +1,65 @@
+"""
+Request Coalescer - ادغام درخواست‌های هم‌زمان یکسان
+In-flight deduplication of identical concurrent requests
+
+- درخواست‌های هم‌زمان با کلید یکسان یک future مشترک دارند و فقط یک بار اجرا می‌شوند
+- با window > 0 اولین درخواست کمی صبر می‌کند تا درخواست‌های یکسانی که بلافاصله بعد از آن
+  می‌رسند (مثلاً بعد از یک پست پربازدید) به همان اجرا بپیوندند
+- لغو شدن یک فراخوان اجرای مشترک را برای بقیه لغو نمی‌کند
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class RequestCoalescer:
+    """اشتراک اجرای درخواست‌های یکسان در حال انجام"""
+
+    def __init__(self, window: float = 0.0):
+        """
+        Args:
+            window: مدت جمع کردن درخواست‌های یکسان قبل از ارسال (ثانیه) - 0 یعنی ارسال فوری
+        """
+        self.window = window
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        self.stats = {
+            'requests': 0,
+            'dispatched': 0,
+            'coalesced': 0
+        }
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """اجرای factory برای key - یا پیوستن به اجرای در حال انجام همان key"""
+        self.stats['requests'] += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['dispatched'] += 1
+            task = asyncio.ensure_future(self._dispatch(factory))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+
+        return await asyncio.shield(task)
+
+    async def _dispatch(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        if self.window > 0:
+            await asyncio.sleep(self.window)
+        return await factory()
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # جلوگیری از هشدار "exception was never retrieved" وقتی همه فراخوان‌ها لغو شده‌اند
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict:
+        """آمار ادغام"""
+        return {
+            **self.stats,
+            'inflight': len(self._inflight),
+            'coalesce_rate': self.stats['coalesced'] / self.stats['requests'] if self.stats['requests'] else 0.0
+        }
@@ -0,0 +1,202 @@
+"""
+Response Cache - cache پاسخ‌های AI
+Normalized-prompt response cache with TTL, LRU eviction and optional similarity matching
+
+- کلید: hash متن نرمال‌شده prompt (یکسان‌سازی حروف فارسی، حروف کوچک، فاصله‌ها)
+- هر پاسخ تا ttl ثانیه معتبر است و تعداد پاسخ‌ها محدود است (LRU)
+- در حالت similarity، prompt با بردار n-gram کاراکتری (بدون مدل خارجی) embed می‌شود و
+  پاسخ prompt مشابه با شباهت کسینوسی بالاتر از آستانه برگردانده می‌شود
+- بردارها در یک ماتریس از پیش تخصیص‌یافته (max_entries × dimensions) نگهداری می‌شوند و هر
+  جستجو فقط یک ضرب ماتریس در بردار است
+"""
+
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from nazanin.utils.persian_text import normalize_persian
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """نرمال‌سازی prompt برای ساخت کلید"""
+    return _WHITESPACE.sub(' ', normalize_persian(prompt)).strip()
+
+
+def _hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def prompt_key(prompt: str) -> str:
+    """hash prompt نرمال‌شده"""
+    return _hash(normalize_prompt(prompt))
+
+
+def embed_prompt(normalized: str, dimensions: int = 512, ngram: int = 3) -> np.ndarray:
+    """بردار نرمال‌شده n-gram های کاراکتری (hashing trick)"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    text = f" {normalized} "
+    for i in range(max(1, len(text) - ngram + 1)):
+        digest = hashlib.blake2b(text[i:i + ngram].encode('utf-8'), digest_size=4).digest()
+        vector[int.from_bytes(digest, 'little') % dimensions] += 1.0
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class ResponseCache:
+    """cache پاسخ با TTL، LRU و تطبیق شباهت اختیاری"""
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries: int = 1000,
+        similarity_threshold: Optional[float] = None,
+        dimensions: int = 512
+    ):
+        """
+        Args:
+            ttl: مدت اعتبار هر پاسخ (ثانیه)
+            max_entries: حداکثر تعداد پاسخ‌ها
+            similarity_threshold: آستانه شباهت کسینوسی (مثلاً 0.95) - None یعنی فقط تطبیق دقیق
+            dimensions: ابعاد بردار embedding
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.dimensions = dimensions
+
+        # key -> (response, stored_at)
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+
+        # embedding ها: ردیف‌های یک ماتریس ثابت (در اولین ذخیره ساخته می‌شود)
+        self._matrix: Optional[np.ndarray] = None
+        self._occupied: Optional[np.ndarray] = None
+        self._rows: Dict[str, int] = {}
+        self._row_keys: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+
+        self.stats = {
+            'hits': 0,
+            'similar_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    def get(self, prompt: str) -> Optional[str]:
+        """پاسخ cache شده برای prompt (یا None)"""
+        normalized = normalize_prompt(prompt)
+        key = _hash(normalized)
+
+        response = self._lookup(key)
+        if response is not None:
+            self.stats['hits'] += 1
+            return response
+
+        if self.similarity_threshold is not None and self._rows:
+            key = self._most_similar(embed_prompt(normalized, self.dimensions))
+            if key is not None:
+                response = self._lookup(key)
+                if response is not None:
+                    self.stats['similar_hits'] += 1
+                    return response
+
+        self.stats['misses'] += 1
+        return None
+
+    def set(self, prompt: str, response: str):
+        """ذخیره پاسخ"""
+        normalized = normalize_prompt(prompt)
+        key = _hash(normalized)
+
+        # حذف قدیمی‌ترین قبل از افزودن تا ردیف آن برای بردار جدید آزاد شود
+        while key not in self._entries and len(self._entries) >= self.max_entries:
+            evicted = next(iter(self._entries))
+            self._remove(evicted)
+            self.stats['evictions'] += 1
+
+        self._entries[key] = (response, time.time())
+        self._entries.move_to_end(key)
+        if self.similarity_threshold is not None:
+            self._store_embedding(key, embed_prompt(normalized, self.dimensions))
+        self.stats['stores'] += 1
+
+    def invalidate(self, prompt: str):
+        """حذف پاسخ یک prompt"""
+        self._remove(prompt_key(prompt))
+
+    def clear(self):
+        """پاک کردن کل cache"""
+        self._entries.clear()
+        self._matrix = None
+        self._occupied = None
+        self._rows.clear()
+        self._row_keys = []
+        self._free_rows = []
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        response, stored_at = entry
+        if time.time() - stored_at >= self.ttl:
+            self._remove(key)
+            self.stats['expirations'] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return response
+
+    def _store_embedding(self, key: str, vector: np.ndarray):
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, self.dimensions), dtype=np.float32)
+            self._occupied = np.zeros(self.max_entries, dtype=bool)
+            self._row_keys = [None] * self.max_entries
+            self._free_rows = list(range(self.max_entries - 1, -1, -1))
+
+        row = self._rows.get(key)
+        if row is None:
+            row = self._free_rows.pop()
+            self._rows[key] = row
+            self._row_keys[row] = key
+            self._occupied[row] = True
+        self._matrix[row] = vector
+
+    def _most_similar(self, vector: np.ndarray) -> Optional[str]:
+        similarities = self._matrix @ vector
+        similarities[~self._occupied] = -np.inf
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            return self._row_keys[best]
+        return None
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._occupied[row] = False
+            self._row_keys[row] = None
+            self._free_rows.append(row)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        """آمار cache"""
+        hits = self.stats['hits'] + self.stats['similar_hits']
+        lookups = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
@@ -40,7 +40,7 @@ class SheetsAutoSetup:
         
         'AI_Data': {
             'sheets': {
-                'API_Keys': ['Provider', 'API_Key', 'Status', 'Usage_Count', 'Daily_Limit', 'Last_Used', 'Cost', 'Notes'],
+                'API_Keys': ['Provider', 'API_Key', 'Status', 'Usage_Count', 'Daily_Limit', 'Last_Used', 'Cost', 'Notes', 'RPM', 'TPM'],
                 'Model_Performance': ['Model_Name', 'Provider', 'Avg_Response_Time', 'Success_Rate', 'Cost_Per_Call', 'Total_Calls'],
                 'AI_Responses': ['Timestamp', 'Model_Used', 'Input_Tokens', 'Output_Tokens', 'Cost', 'Quality_Score'],
                 'Training_Data': ['Data_ID', 'Input', 'Expected_Output', 'Actual_Output', 'Feedback', 'Used_For_Training'],
@@ -0,0 +1,168 @@
+"""
+Sheets Cache - cache خواندن Google Sheets
+Single-flight, stale-while-revalidate LRU cache for sheet reads
+
+- درخواست‌های هم‌زمان برای یک کلید فقط یک بار بارگذاری می‌شوند (single-flight)
+- بعد از انقضای TTL داده قبلی فوراً برگردانده می‌شود و بارگذاری مجدد در پس‌زمینه انجام می‌شود
+- تعداد کلیدها محدود است و قدیمی‌ترین کلید استفاده‌نشده حذف می‌شود (LRU)
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class SheetsCache:
+    """cache با single-flight و stale-while-revalidate"""
+
+    def __init__(self, ttl: float = 300, max_entries: int = 64, max_stale: Optional[float] = None):
+        """
+        Args:
+            ttl: مدت تازه بودن داده (ثانیه)
+            max_entries: حداکثر تعداد کلیدها
+            max_stale: حداکثر زمان سرو داده کهنه بعد از ttl - None یعنی بدون محدودیت
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+
+        # key -> [data, loaded_at]
+        self._entries: 'OrderedDict[str, list]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._generations: Dict[str, int] = {}
+
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'evictions': 0
+        }
+
+    async def get(self, key: str, loader: Loader) -> Any:
+        """دریافت مقدار؛ فقط در اولین بار (یا بعد از حذف) منتظر بارگذاری می‌ماند"""
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            self._entries.move_to_end(key)
+            age = time.time() - entry[1]
+
+            if age < self.ttl:
+                self.stats['hits'] += 1
+                return entry[0]
+
+            if self.max_stale is None or age < self.ttl + self.max_stale:
+                self.stats['stale_hits'] += 1
+                self._refresh_in_background(key, loader)
+                return entry[0]
+
+        self.stats['misses'] += 1
+        return await self.refresh(key, loader)
+
+    async def refresh(self, key: str, loader: Loader) -> Any:
+        """بارگذاری اجباری (با اشتراک بارگذاری در حال انجام)"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_load(key, loader)
+        else:
+            self.stats['coalesced'] += 1
+
+        # shield: لغو یک فراخوان بارگذاری مشترک را لغو نمی‌کند
+        return await asyncio.shield(task)
+
+    def peek(self, key: str) -> Any:
+        """مقدار فعلی بدون بارگذاری (یا None)"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key: str, data: Any):
+        """قرار دادن مستقیم مقدار تازه"""
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._store(key, data, time.time())
+
+    def mark_stale(self, key: str):
+        """کهنه کردن کلید - خواننده بعدی داده فعلی را می‌گیرد و refresh شروع می‌شود"""
+        self._generations[key] = self._generations.get(key, 0) + 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] = 0.0
+
+    def invalidate(self, key: str):
+        """حذف کامل کلید"""
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """پاک کردن کل cache"""
+        for key in list(self._entries.keys()) + list(self._inflight.keys()):
+            self._generations[key] = self._generations.get(key, 0) + 1
+        self._entries.clear()
+
+    def _start_load(self, key: str, loader: Loader) -> asyncio.Task:
+        task = asyncio.ensure_future(self._load(key, loader))
+        self._inflight[key] = task
+        return task
+
+    async def _load(self, key: str, loader: Loader) -> Any:
+        generation = self._generations.get(key, 0)
+        try:
+            data = await loader()
+
+            # اگر در حین بارگذاری کلید کهنه شده، نتیجه هم کهنه ذخیره می‌شود
+            if self._generations.get(key, 0) == generation:
+                loaded_at = time.time()
+            else:
+                loaded_at = 0.0
+
+            self._store(key, data, loaded_at)
+            return data
+        finally:
+            self._inflight.pop(key, None)
+
+    def _refresh_in_background(self, key: str, loader: Loader):
+        if key in self._inflight:
+            return
+
+        self.stats['refreshes'] += 1
+        task = self._start_load(key, loader)
+        task.add_done_callback(lambda t: self._on_refresh_done(key, t))
+
+    def _on_refresh_done(self, key: str, task: asyncio.Task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.stats['refresh_errors'] += 1
+            logger.warning(f"⚠️ Background refresh failed for {key}: {error}")
+
+    def _store(self, key: str, data: Any, loaded_at: float):
+        self._entries[key] = [data, loaded_at]
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get_stats(self) -> Dict:
+        """آمار cache"""
+        lookups = self.stats['hits'] + self.stats['stale_hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'hit_rate': (self.stats['hits'] + self.stats['stale_hits']) / lookups if lookups else 0.0
+        }
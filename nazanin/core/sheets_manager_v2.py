@@ -4,14 +4,20 @@ Google Sheets Manager V2
 """
 
 import asyncio
+import functools
 import gspread
 from google.oauth2.service_account import Credentials
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Callable
 import json
 import time
 from datetime import datetime, timedelta
 import logging
 from .sheets_auto_setup import SheetsAutoSetup
+from .sheets_write_queue import SheetsWriteQueue
+from .sheets_cache import SheetsCache
+from .sheets_sync import SheetRowStore
+from .sheets_mirror import SheetsMirror, filter_records
 
 logger = logging.getLogger(__name__)
 
@@ -19,22 +25,97 @@ logger = logging.getLogger(__name__)
 class SheetsManagerV2:
     """مدیریت پیشرفته Google Sheets"""
     
-    def __init__(self, credentials_file: str, spreadsheet_ids: Dict[str, str] = None):
+    def __init__(self, credentials_file: str, spreadsheet_ids: Dict[str, str] = None, config: Dict = None):
         self.credentials_file = credentials_file
         self.spreadsheet_ids = spreadsheet_ids or {}
+        self.config = config or {}
         self.client = None
         self.spreadsheets = {}
         
-        # Cache
-        self._cache = {}
-        self._cache_timestamps = {}
-        self.cache_duration = 300  # 5 minutes
+        # I/O: فراخوانی‌های blocking gspread در thread pool محدود اجرا می‌شوند
+        self._io_executor = ThreadPoolExecutor(
+            max_workers=self.config.get('io_workers', 4),
+            thread_name_prefix='sheets-io'
+        )
+        self._worksheets = {}  # (spreadsheet_name, sheet_name) -> Worksheet
+        self.io_stats: Dict[str, Dict] = {}
+        
+        # Cache (single-flight + stale-while-revalidate + LRU)
+        self.cache_duration = self.config.get('cache_duration', 300)  # 5 minutes
+        self.cache = SheetsCache(
+            ttl=self.cache_duration,
+            max_entries=self.config.get('cache_max_entries', 64),
+            max_stale=self.config.get('cache_max_stale')
+        )
+        
+        # همگام‌سازی افزایشی برای sheet های append-only ("spreadsheet/sheet")
+        self.incremental_sheets = set(self.config.get('incremental_sheets', []))
+        self.full_resync_interval = self.config.get('full_resync_interval', 3600)
+        self._row_stores: Dict[tuple, SheetRowStore] = {}
+        
+        # Mirror محلی SQLite (اختیاری) - مسیر خواندن سریع و مستقل از شبکه
+        mirror_config = self.config.get('mirror', {})
+        self.mirror: Optional[SheetsMirror] = None
+        if mirror_config.get('enabled', False):
+            self.mirror = SheetsMirror(mirror_config.get('path', 'data/sheets/mirror.db'))
+        self.mirror_sync_interval = mirror_config.get('sync_interval', 300)
+        self._mirror_dirty = set()  # (spreadsheet_name, sheet_name) های نوشته‌شده از آخرین sync
+        self._mirror_versions: Dict[str, str] = {}  # spreadsheet_name -> زمان ویرایش در آخرین sync
+        self._mirror_task: Optional[asyncio.Task] = None
+        
+        # Write-behind: append_row ها دسته‌ای و در پس‌زمینه نوشته می‌شوند
+        write_config = self.config.get('write_behind', {})
+        self.write_behind_enabled = write_config.get('enabled', True)
+        self.write_queue = SheetsWriteQueue(
+            self._write_rows,
+            batch_size=write_config.get('batch_size', 50),
+            flush_interval=write_config.get('flush_interval', 2.0),
+            max_pending=write_config.get('max_pending', 1000),
+            max_retries=write_config.get('max_retries', 3),
+            spill_dir=write_config.get('spill_dir', 'data/sheets/pending_writes'),
+            spill_key=lambda name: self.spreadsheet_ids.get(name, name),
+            ready=lambda name: name in self.spreadsheets
+        )
     
     async def initialize(self, auto_setup: bool = True):
         """راه‌اندازی اولیه"""
         logger.info("🚀 Initializing Sheets Manager V2...")
         
+        if self.mirror:
+            await self.mirror.open()
+        
         # اتصال به Google
+        try:
+            await self._connect()
+        except Exception as e:
+            if not self.mirror:
+                raise
+            # با mirror محلی، خواندن‌ها بدون Google هم کار می‌کنند
+            logger.warning(f"⚠️ Google Sheets unreachable ({e}) - serving reads from local mirror")
+        
+        # اگه spreadsheet_ids نداریم، auto setup کن
+        if self.client and not self.spreadsheet_ids and auto_setup:
+            logger.info("📊 No spreadsheet IDs found. Starting auto setup...")
+            setup = SheetsAutoSetup(self.credentials_file)
+            await setup.initialize()
+            self.spreadsheet_ids = setup.get_spreadsheet_ids()
+            setup.save_config('config/spreadsheet_ids.json')
+            logger.info("✅ Auto setup completed")
+        
+        # باز کردن تمام spreadsheets
+        if self.client:
+            await self._open_all_spreadsheets()
+        
+        if self.write_behind_enabled:
+            await self.write_queue.start(self.spreadsheet_ids.keys())
+        
+        if self.mirror:
+            self._mirror_task = asyncio.create_task(self._mirror_sync_loop())
+        
+        logger.info(f"✅ Sheets Manager initialized with {len(self.spreadsheets)} spreadsheets")
+    
+    async def _connect(self):
+        """اتصال به Google Sheets API"""
         scope = [
             'https://spreadsheets.google.com/feeds',
             'https://www.googleapis.com/auth/drive'
@@ -43,29 +124,85 @@ class SheetsManagerV2:
             self.credentials_file,
             scopes=scope
         )
-        self.client = gspread.authorize(creds)
+        self.client = await self._run_io('authorize', gspread.authorize, creds)
         
         logger.info("✅ Connected to Google Sheets API")
+    
+    async def shutdown(self):
+        """خاموش کردن - flush نهایی صف نوشتن و بستن thread pool"""
+        if self._mirror_task:
+            self._mirror_task.cancel()
+            try:
+                await self._mirror_task
+            except asyncio.CancelledError:
+                pass
+            self._mirror_task = None
         
-        # اگه spreadsheet_ids نداریم، auto setup کن
-        if not self.spreadsheet_ids and auto_setup:
-            logger.info("📊 No spreadsheet IDs found. Starting auto setup...")
-            setup = SheetsAutoSetup(self.credentials_file)
-            await setup.initialize()
-            self.spreadsheet_ids = setup.get_spreadsheet_ids()
-            setup.save_config('config/spreadsheet_ids.json')
-            logger.info("✅ Auto setup completed")
+        await self.write_queue.stop()
         
-        # باز کردن تمام spreadsheets
-        await self._open_all_spreadsheets()
+        if self.mirror:
+            await self.mirror.close()
         
-        logger.info(f"✅ Sheets Manager initialized with {len(self.spreadsheets)} spreadsheets")
+        self._io_executor.shutdown(wait=False)
+    
+    # لایه I/O
+    
+    async def _run_io(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        اجرای یک فراخوانی blocking در thread pool
+        
+        مدت زمان هر فراخوانی در io_stats ثبت می‌شود.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        failed = False
+        
+        try:
+            return await loop.run_in_executor(
+                self._io_executor,
+                functools.partial(func, *args, **kwargs)
+            )
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self.io_stats.setdefault(operation, {
+                'calls': 0,
+                'errors': 0,
+                'total_time': 0.0,
+                'max_time': 0.0
+            })
+            stats['calls'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            if failed:
+                stats['errors'] += 1
+    
+    async def _get_worksheet(self, spreadsheet_name: str, sheet_name: str):
+        """دریافت worksheet از cache (فقط بار اول درخواست HTTP)"""
+        key = (spreadsheet_name, sheet_name)
+        worksheet = self._worksheets.get(key)
+        if worksheet is not None:
+            return worksheet
+        
+        spreadsheet = self.spreadsheets.get(spreadsheet_name)
+        if not spreadsheet:
+            return None
+        
+        worksheet = await self._run_io('worksheet', spreadsheet.worksheet, sheet_name)
+        self._worksheets[key] = worksheet
+        return worksheet
+    
+    def _forget_worksheet(self, spreadsheet_name: str, sheet_name: str):
+        """حذف worksheet از cache (مثلاً بعد از حذف/تغییر نام sheet)"""
+        self._worksheets.pop((spreadsheet_name, sheet_name), None)
     
     async def _open_all_spreadsheets(self):
         """باز کردن تمام spreadsheets"""
         for name, spreadsheet_id in self.spreadsheet_ids.items():
             try:
-                ss = self.client.open_by_key(spreadsheet_id)
+                ss = await self._run_io('open_by_key', self.client.open_by_key, spreadsheet_id)
                 self.spreadsheets[name] = ss
                 logger.info(f"   ✅ Opened: {name}")
             except Exception as e:
@@ -77,62 +214,198 @@ class SheetsManagerV2:
         self,
         spreadsheet_name: str,
         sheet_name: str,
-        use_cache: bool = True
+        use_cache: bool = True,
+        incremental: Optional[bool] = None,
+        raise_errors: bool = False
     ) -> List[Dict]:
-        """دریافت داده از یک sheet"""
+        """
+        دریافت داده از یک sheet
+        
+        بعد از اولین بارگذاری، داده کهنه فوراً برگردانده می‌شود و refresh در پس‌زمینه است؛
+        فراخوان‌های هم‌زمان فقط یک درخواست به Google می‌فرستند. تا وقتی داده تغییر نکرده
+        همان لیست برگردانده می‌شود (لیست‌های برگردانده‌شده هرگز درجا تغییر نمی‌کنند).
+        
+        Args:
+            incremental: فقط ردیف‌های جدید خوانده شوند (پیش‌فرض: طبق incremental_sheets)
+            raise_errors: خطای خواندن به جای [] دوباره raise شود (تا از sheet خالی قابل تشخیص باشد)
+        """
         cache_key = f"{spreadsheet_name}_{sheet_name}"
         
-        # چک کردن cache
-        if use_cache and self._is_cache_valid(cache_key):
-            logger.debug(f"📦 Using cached data for {cache_key}")
-            return self._cache[cache_key]
+        if incremental is None:
+            incremental = f"{spreadsheet_name}/{sheet_name}" in self.incremental_sheets
+        
+        # use_cache=False همیشه از Google می‌خواند (حتی با وجود mirror)
+        load = self._read_sheet if use_cache else self._fetch_sheet
+        loader = functools.partial(load, spreadsheet_name, sheet_name, incremental)
         
         try:
-            # دریافت spreadsheet
-            spreadsheet = self.spreadsheets.get(spreadsheet_name)
-            if not spreadsheet:
-                logger.error(f"❌ Spreadsheet not found: {spreadsheet_name}")
-                return []
-            
-            # دریافت sheet
-            worksheet = spreadsheet.worksheet(sheet_name)
-            data = worksheet.get_all_records()
-            
-            # ذخیره در cache
-            self._cache[cache_key] = data
-            self._cache_timestamps[cache_key] = time.time()
-            
-            logger.debug(f"✅ Loaded {len(data)} rows from {spreadsheet_name}/{sheet_name}")
-            return data
+            if use_cache:
+                return await self.cache.get(cache_key, loader)
+            return await self.cache.refresh(cache_key, loader)
             
+        except gspread.WorksheetNotFound:
+            logger.error(f"❌ Sheet not found: {spreadsheet_name}/{sheet_name}")
+            if raise_errors:
+                raise
+            return []
         except Exception as e:
             logger.error(f"❌ Error reading {spreadsheet_name}/{sheet_name}: {e}")
+            self._forget_worksheet(spreadsheet_name, sheet_name)
+            if raise_errors:
+                raise
             return []
     
+    async def _read_sheet(self, spreadsheet_name: str, sheet_name: str, incremental: bool) -> List[Dict]:
+        """خواندن از mirror محلی در صورت وجود، وگرنه از Google"""
+        key = (spreadsheet_name, sheet_name)
+        
+        if self.mirror and self.mirror.has_sheet(spreadsheet_name, sheet_name):
+            if key not in self._mirror_dirty or spreadsheet_name not in self.spreadsheets:
+                return self.mirror.get_rows(spreadsheet_name, sheet_name)
+            
+            # بعد از نوشتن، یک بار از Google خوانده می‌شود
+            try:
+                return await self._fetch_sheet(spreadsheet_name, sheet_name, incremental)
+            except Exception as e:
+                logger.warning(f"⚠️ Falling back to mirror for {spreadsheet_name}/{sheet_name}: {e}")
+                return self.mirror.get_rows(spreadsheet_name, sheet_name)
+        
+        return await self._fetch_sheet(spreadsheet_name, sheet_name, incremental)
+    
+    async def _fetch_sheet(self, spreadsheet_name: str, sheet_name: str, incremental: bool) -> List[Dict]:
+        """خواندن از Google و به‌روزرسانی mirror"""
+        key = (spreadsheet_name, sheet_name)
+        store = self._row_stores.get(key)
+        full_syncs_before = store.full_syncs if store else None
+        
+        if incremental:
+            records = await self._sync_sheet(spreadsheet_name, sheet_name)
+        else:
+            records = await self._load_sheet(spreadsheet_name, sheet_name)
+        
+        if self.mirror:
+            store = self._row_stores.get(key)
+            append_only = incremental and store is not None and store.full_syncs == full_syncs_before
+            await self.mirror.sync_sheet(spreadsheet_name, sheet_name, records, append_only=append_only)
+            self._mirror_dirty.discard(key)
+        
+        return records
+    
+    async def _load_sheet(self, spreadsheet_name: str, sheet_name: str) -> List[Dict]:
+        """بارگذاری کامل یک sheet از Google"""
+        worksheet = await self._get_worksheet(spreadsheet_name, sheet_name)
+        if worksheet is None:
+            raise LookupError(f"Spreadsheet not found: {spreadsheet_name}")
+        
+        data = await self._run_io('get_all_records', worksheet.get_all_records)
+        
+        logger.debug(f"✅ Loaded {len(data)} rows from {spreadsheet_name}/{sheet_name}")
+        return data
+    
+    async def _sync_sheet(self, spreadsheet_name: str, sheet_name: str) -> List[Dict]:
+        """
+        همگام‌سازی افزایشی - فقط ردیف‌های اضافه‌شده از آخرین بار خوانده می‌شوند
+        
+        اگر ویرایش یا حذف تشخیص داده شود (یا full_resync_interval گذشته باشد)
+        بارگذاری کامل انجام می‌شود. فقط آخرین ردیف شناخته‌شده دوباره بررسی می‌شود؛ ویرایش
+        بیرونی ردیف‌های قبلی تا بارگذاری کامل بعدی دیده نمی‌شود.
+        """
+        worksheet = await self._get_worksheet(spreadsheet_name, sheet_name)
+        if worksheet is None:
+            raise LookupError(f"Spreadsheet not found: {spreadsheet_name}")
+        
+        key = (spreadsheet_name, sheet_name)
+        store = self._row_stores.setdefault(key, SheetRowStore())
+        
+        if not store.needs_full_sync(self.full_resync_interval):
+            previous_rows = len(store.records)
+            values = await self._run_io('get_range', worksheet.get, store.tail_range())
+            
+            if store.apply_tail(values):
+                logger.debug(
+                    f"✅ Synced {len(store.records) - previous_rows} new rows "
+                    f"from {spreadsheet_name}/{sheet_name}"
+                )
+                return store.records
+            
+            logger.info(f"🔄 Edit detected in {spreadsheet_name}/{sheet_name} - full reload")
+        
+        values = await self._run_io('get_all_values', worksheet.get_all_values)
+        records = store.load_full(values)
+        
+        logger.debug(f"✅ Loaded {len(records)} rows from {spreadsheet_name}/{sheet_name}")
+        return records
+    
     async def append_row(
         self,
         spreadsheet_name: str,
         sheet_name: str,
-        row_data: List[Any]
+        row_data: List[Any],
+        immediate: bool = False
     ) -> bool:
-        """اضافه کردن ردیف جدید"""
+        """
+        اضافه کردن ردیف جدید
+        
+        به صورت پیش‌فرض ردیف در صف write-behind قرار می‌گیرد و دسته‌ای نوشته می‌شود
+        (حتی اگر spreadsheet هنوز متصل نباشد)؛ با immediate=True مستقیماً نوشته می‌شود.
+        
+        Returns:
+            در حالت write-behind، True یعنی ردیف صف شده است نه نوشته شده - خواندن‌ها ردیف را
+            بعد از flush بعدی می‌بینند (برای خواندن فوری: immediate=True یا flush_writes)
+        """
+        if not immediate and self.write_queue.running:
+            if spreadsheet_name not in self.spreadsheets and spreadsheet_name not in self.spreadsheet_ids:
+                return False
+            await self.write_queue.put(spreadsheet_name, sheet_name, row_data)
+            return True
+        
         try:
-            spreadsheet = self.spreadsheets.get(spreadsheet_name)
-            if not spreadsheet:
+            worksheet = await self._get_worksheet(spreadsheet_name, sheet_name)
+            if worksheet is None:
                 return False
             
-            worksheet = spreadsheet.worksheet(sheet_name)
-            worksheet.append_row(row_data)
+            await self._run_io('append_row', worksheet.append_row, row_data)
             
-            # پاک کردن cache
-            cache_key = f"{spreadsheet_name}_{sheet_name}"
-            self._clear_cache_key(cache_key)
+            # کهنه کردن cache و mirror
+            self._mark_written(spreadsheet_name, sheet_name)
             
             logger.debug(f"✅ Appended row to {spreadsheet_name}/{sheet_name}")
             return True
             
         except Exception as e:
             logger.error(f"❌ Error appending to {spreadsheet_name}/{sheet_name}: {e}")
+            self._forget_worksheet(spreadsheet_name, sheet_name)
+            return False
+    
+    async def flush_writes(self) -> int:
+        """ارسال فوری ردیف‌های صف write-behind - تعداد ردیف‌های نوشته‌شده"""
+        if not self.write_queue.running:
+            return 0
+        return await self.write_queue.flush()
+    
+    async def _write_rows(
+        self,
+        spreadsheet_name: str,
+        sheet_name: str,
+        rows: List[List[Any]]
+    ) -> bool:
+        """نوشتن دسته‌ای ردیف‌ها با یک فراخوانی append_rows"""
+        try:
+            worksheet = await self._get_worksheet(spreadsheet_name, sheet_name)
+            if worksheet is None:
+                return False
+            
+            await self._run_io('append_rows', worksheet.append_rows, rows)
+            
+            # کهنه کردن cache و mirror
+            self._mark_written(spreadsheet_name, sheet_name)
+            
+            logger.debug(f"✅ Appended {len(rows)} rows to {spreadsheet_name}/{sheet_name}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Error appending batch to {spreadsheet_name}/{sheet_name}: {e}")
+            self._forget_worksheet(spreadsheet_name, sheet_name)
             return False
     
     async def update_cell(
@@ -145,23 +418,139 @@ class SheetsManagerV2:
     ) -> bool:
         """به‌روزرسانی یک سلول"""
         try:
-            spreadsheet = self.spreadsheets.get(spreadsheet_name)
-            if not spreadsheet:
+            worksheet = await self._get_worksheet(spreadsheet_name, sheet_name)
+            if worksheet is None:
                 return False
             
-            worksheet = spreadsheet.worksheet(sheet_name)
-            worksheet.update_cell(row, col, value)
+            await self._run_io('update_cell', worksheet.update_cell, row, col, value)
             
-            # پاک کردن cache
-            cache_key = f"{spreadsheet_name}_{sheet_name}"
-            self._clear_cache_key(cache_key)
+            # کهنه کردن cache و mirror (ویرایش - sync افزایشی کافی نیست)
+            self._mark_written(spreadsheet_name, sheet_name, edited=True)
             
             return True
             
         except Exception as e:
             logger.error(f"❌ Error updating cell: {e}")
+            self._forget_worksheet(spreadsheet_name, sheet_name)
             return False
     
+    async def query_sheet(
+        self,
+        spreadsheet_name: str,
+        sheet_name: str,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        key: Optional[str] = None,
+        contains: Optional[str] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = False
+    ) -> List[Dict]:
+        """
+        جستجو در یک sheet
+        
+        با mirror فعال، جستجو با ایندکس‌های SQLite (ستون زمان و ستون کلید) انجام می‌شود؛
+        در غیر این صورت روی داده cache شده فیلتر می‌شود.
+        
+        Args:
+            since / until: بازه ستون زمان (رشته ISO)
+            key: مقدار ستون اول (مثلاً id یا key)
+            contains: متن مورد جستجو
+            limit: حداکثر تعداد نتایج
+            newest_first: ترتیب از جدیدترین ردیف
+        """
+        filters = {
+            'since': since,
+            'until': until,
+            'key': key,
+            'contains': contains,
+            'limit': limit,
+            'newest_first': newest_first
+        }
+        
+        if (
+            self.mirror
+            and self.mirror.has_sheet(spreadsheet_name, sheet_name)
+            and (spreadsheet_name, sheet_name) not in self._mirror_dirty
+        ):
+            try:
+                return self.mirror.query(spreadsheet_name, sheet_name, **filters)
+            except Exception as e:
+                logger.warning(f"⚠️ Mirror query failed for {spreadsheet_name}/{sheet_name}: {e}")
+        
+        records = await self.get_sheet_data(spreadsheet_name, sheet_name)
+        return filter_records(records, **filters)
+    
+    # Mirror
+    
+    async def _mirror_sync_loop(self):
+        """همگام‌سازی دوره‌ای mirror با Google"""
+        while True:
+            try:
+                if self.client is None:
+                    await self._connect()
+                    await self._open_all_spreadsheets()
+                
+                synced = await self.sync_mirror()
+                logger.debug(f"💽 Mirror synced {synced} sheets")
+            except Exception as e:
+                logger.error(f"❌ Mirror sync error: {e}")
+            
+            await asyncio.sleep(self.mirror_sync_interval)
+    
+    async def sync_mirror(self) -> int:
+        """
+        همگام‌سازی sheet های تمام spreadsheets با mirror
+        
+        spreadsheet هایی که از sync قبلی تغییر نکرده‌اند (زمان ویرایش Drive) رد می‌شوند؛ بقیه
+        افزایشی خوانده می‌شوند (فقط ردیف‌های جدید) و بارگذاری کامل فقط برای sheet های
+        ویرایش‌شده یا بعد از full_resync_interval انجام می‌شود.
+        """
+        if not self.mirror:
+            return 0
+        
+        synced = 0
+        for spreadsheet_name, spreadsheet in list(self.spreadsheets.items()):
+            modified = await self._spreadsheet_modified_time(spreadsheet)
+            if modified is not None and modified == self._mirror_versions.get(spreadsheet_name):
+                if not any(key[0] == spreadsheet_name for key in self._mirror_dirty):
+                    continue
+            
+            try:
+                worksheets = await self._run_io('worksheets', spreadsheet.worksheets)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not list sheets of {spreadsheet_name}: {e}")
+                continue
+            
+            complete = True
+            for worksheet in worksheets:
+                sheet_name = worksheet.title
+                self._worksheets[(spreadsheet_name, sheet_name)] = worksheet
+                
+                loader = functools.partial(self._fetch_sheet, spreadsheet_name, sheet_name, True)
+                
+                try:
+                    await self.cache.refresh(f"{spreadsheet_name}_{sheet_name}", loader)
+                    synced += 1
+                except Exception as e:
+                    complete = False
+                    logger.warning(f"⚠️ Mirror sync failed for {spreadsheet_name}/{sheet_name}: {e}")
+            
+            if complete and modified is not None:
+                self._mirror_versions[spreadsheet_name] = modified
+        
+        return synced
+    
+    async def _spreadsheet_modified_time(self, spreadsheet) -> Optional[str]:
+        """زمان آخرین ویرایش spreadsheet از Drive (None اگر در دسترس نباشد)"""
+        get_modified = getattr(spreadsheet, 'get_lastUpdateTime', None)
+        if get_modified is None:
+            return None
+        try:
+            return await self._run_io('last_update_time', get_modified)
+        except Exception as e:
+            logger.debug(f"Could not read last update time: {e}")
+            return None
+    
     # متدهای تخصصی
     
     async def log_telegram_message(self, message_data: Dict):
@@ -221,6 +610,30 @@ class SheetsManagerV2:
         
         return api_keys
     
+    async def get_api_key_limits(self) -> Dict:
+        """دریافت محدودیت RPM/TPM کلیدهای فعال (ستون‌های اختیاری RPM و TPM)"""
+        data = await self.get_sheet_data('ai_data', 'API_Keys')
+        
+        limits = {}
+        for row in data:
+            provider = row.get('Provider', '').lower()
+            if not provider or row.get('Status') != 'active':
+                continue
+            
+            key_limits = {}
+            for column in ('RPM', 'TPM'):
+                try:
+                    value = float(row.get(column) or 0)
+                except (TypeError, ValueError):
+                    value = 0
+                if value > 0:
+                    key_limits[column.lower()] = value
+            
+            if key_limits:
+                limits.setdefault(provider, {})[row.get('API_Key')] = key_limits
+        
+        return limits
+    
     async def get_telegram_channels(self) -> List[Dict]:
         """دریافت لیست کانال‌های تلگرام"""
         return await self.get_sheet_data('telegram_data', 'Channels')
@@ -255,24 +668,57 @@ class SheetsManagerV2:
     
     # Cache management
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """بررسی اعتبار cache"""
-        if cache_key not in self._cache:
-            return False
+    def _clear_cache_key(self, cache_key: str):
+        """
+        کهنه کردن یک کلید بعد از نوشتن
         
-        timestamp = self._cache_timestamps.get(cache_key, 0)
-        return (time.time() - timestamp) < self.cache_duration
+        خواننده بعدی داده فعلی را می‌گیرد و refresh در پس‌زمینه انجام می‌شود.
+        """
+        self.cache.mark_stale(cache_key)
     
-    def _clear_cache_key(self, cache_key: str):
-        """پاک کردن یک کلید از cache"""
-        self._cache.pop(cache_key, None)
-        self._cache_timestamps.pop(cache_key, None)
+    def _mark_written(self, spreadsheet_name: str, sheet_name: str, edited: bool = False):
+        """
+        ثبت نوشتن در sheet - cache کهنه و mirror نیازمند sync می‌شود
+        
+        Args:
+            edited: ردیف موجود تغییر کرده (نه append) - sync بعدی کامل خواهد بود
+        """
+        self._clear_cache_key(f"{spreadsheet_name}_{sheet_name}")
+        self._mirror_dirty.add((spreadsheet_name, sheet_name))
+        
+        store = self._row_stores.get((spreadsheet_name, sheet_name))
+        if edited and store is not None:
+            store.invalidate()
     
     def clear_all_cache(self):
         """پاک کردن کل cache"""
-        self._cache.clear()
-        self._cache_timestamps.clear()
+        self.cache.clear()
         logger.info("🗑️ All cache cleared")
+    
+    def get_cache_stats(self) -> Dict:
+        """آمار cache (hit / miss / refresh)"""
+        return self.cache.get_stats()
+    
+    def get_stats(self) -> Dict:
+        """آمار Sheets Manager"""
+        return {
+            'spreadsheets': len(self.spreadsheets),
+            'cache': self.cache.get_stats(),
+            'incremental_sync': {
+                f"{spreadsheet_name}/{sheet_name}": store.get_stats()
+                for (spreadsheet_name, sheet_name), store in self._row_stores.items()
+            },
+            'cached_worksheets': len(self._worksheets),
+            'io': {
+                operation: {
+                    **stats,
+                    'avg_time': stats['total_time'] / stats['calls'] if stats['calls'] else 0.0
+                }
+                for operation, stats in self.io_stats.items()
+            },
+            'write_queue': self.write_queue.get_stats(),
+            'mirror': self.mirror.get_stats() if self.mirror else None
+        }
 
 
 # Usage Example
@@ -297,5 +743,7 @@ if __name__ == '__main__':
             'response': 'سلام! چطور می‌تونم کمک کنم؟'
         })
         print("✅ Message logged")
+        
+        await manager.shutdown()
     
     asyncio.run(main())
@@ -0,0 +1,344 @@
+"""
+Sheets Mirror - نسخه محلی Google Sheets در SQLite
+Local persistent SQLite mirror of spreadsheet data
+
+- Google Sheets منبع اصلی داده است؛ mirror فقط برای خواندن سریع محلی است
+- ردیف‌ها با ایندکس روی ستون زمان و ستون کلید (ستون اول) ذخیره می‌شوند
+- نوشتن در یک thread جداگانه و خواندن مستقیم (WAL) انجام می‌شود
+- بعد از restart داده‌ها بدون نیاز به دسترسی به Google در دسترس هستند
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# نام ستون‌های زمانی رایج در ساختار اسپردشیت‌ها
+TIMESTAMP_COLUMNS = (
+    'timestamp', 'date', 'date_stored', 'created_at', 'created',
+    'start_time', 'last_updated', 'last_seen'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheet_rows (
+    spreadsheet TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    row_key TEXT,
+    ts TEXT,
+    data TEXT NOT NULL,
+    search_text TEXT,
+    PRIMARY KEY (spreadsheet, sheet, row_index)
+);
+CREATE INDEX IF NOT EXISTS idx_sheet_rows_ts ON sheet_rows (spreadsheet, sheet, ts);
+CREATE INDEX IF NOT EXISTS idx_sheet_rows_key ON sheet_rows (spreadsheet, sheet, row_key);
+CREATE TABLE IF NOT EXISTS sheet_meta (
+    spreadsheet TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (spreadsheet, sheet)
+);
+"""
+
+
+def detect_columns(headers: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    تشخیص ستون کلید و ستون زمان
+
+    Returns:
+        (key_column, timestamp_column) - ستون کلید همیشه ستون اول است
+    """
+    key_column = headers[0] if headers else None
+
+    timestamp_column = None
+    lowered = {str(h).lower(): h for h in headers}
+    for name in TIMESTAMP_COLUMNS:
+        if name in lowered:
+            timestamp_column = lowered[name]
+            break
+
+    if timestamp_column is None:
+        for header in headers:
+            if 'time' in str(header).lower() or 'date' in str(header).lower():
+                timestamp_column = header
+                break
+
+    return key_column, timestamp_column
+
+
+def search_text(record: Dict) -> str:
+    """متن قابل جستجوی یک ردیف (مقدار ستون‌ها با حروف کوچک) - مشترک بین mirror و filter_records"""
+    return '\x1f'.join(str(value) for value in record.values()).lower()
+
+
+def filter_records(
+    records: List[Dict],
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    key: Optional[str] = None,
+    contains: Optional[str] = None,
+    limit: Optional[int] = None,
+    newest_first: bool = False
+) -> List[Dict]:
+    """فیلتر در حافظه - همان معنای SheetsMirror.query بدون mirror"""
+    headers = list(records[0].keys()) if records else []
+    key_column, timestamp_column = detect_columns(headers)
+    needle = contains.lower() if contains else None
+
+    ordered = reversed(records) if newest_first else records
+    results = []
+
+    for record in ordered:
+        if key is not None and str(record.get(key_column, '')) != str(key):
+            continue
+        if timestamp_column and (since or until):
+            ts = str(record.get(timestamp_column, ''))
+            if since and ts < since:
+                continue
+            if until and ts >= until:
+                continue
+        if needle and needle not in search_text(record):
+            continue
+
+        results.append(record)
+        if limit and len(results) >= limit:
+            break
+
+    return results
+
+
+class SheetsMirror:
+    """mirror محلی SQLite برای داده‌های Sheets"""
+
+    def __init__(self, path: str = 'data/sheets/mirror.db'):
+        self.path = Path(path)
+        self._read_conn: sqlite3.Connection = None
+        self._write_conn: sqlite3.Connection = None
+
+        # تمام نوشتن‌ها در یک thread (ترتیب و یک connection)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sheets-mirror')
+        self._meta: Dict[Tuple[str, str], Dict] = {}
+
+        self.stats = {
+            'reads': 0,
+            'queries': 0,
+            'syncs': 0,
+            'rows_written': 0
+        }
+
+    async def open(self):
+        """باز کردن پایگاه داده و بارگذاری metadata"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._open_writer)
+
+        self._read_conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        for spreadsheet, sheet, headers, row_count, synced_at in self._read_conn.execute(
+            'SELECT spreadsheet, sheet, headers, row_count, synced_at FROM sheet_meta'
+        ):
+            self._meta[(spreadsheet, sheet)] = {
+                'headers': json.loads(headers),
+                'row_count': row_count,
+                'synced_at': synced_at
+            }
+
+        logger.info(f"💽 Sheets mirror opened: {self.path} ({len(self._meta)} sheets)")
+
+    def _open_writer(self):
+        self._write_conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._write_conn.execute('PRAGMA journal_mode=WAL')
+        self._write_conn.execute('PRAGMA synchronous=NORMAL')
+        self._write_conn.executescript(SCHEMA)
+
+        # mirror های قدیمی بدون ستون search_text: ستون اضافه و همه sheet ها دوباره sync می‌شوند
+        columns = {row[1] for row in self._write_conn.execute('PRAGMA table_info(sheet_rows)')}
+        if 'search_text' not in columns:
+            self._write_conn.execute('ALTER TABLE sheet_rows ADD COLUMN search_text TEXT')
+            self._write_conn.execute('DELETE FROM sheet_rows')
+            self._write_conn.execute('DELETE FROM sheet_meta')
+        self._write_conn.commit()
+
+    async def close(self):
+        """بستن پایگاه داده"""
+        loop = asyncio.get_running_loop()
+        if self._write_conn is not None:
+            await loop.run_in_executor(self._executor, self._write_conn.close)
+            self._write_conn = None
+        if self._read_conn is not None:
+            self._read_conn.close()
+            self._read_conn = None
+        self._executor.shutdown(wait=False)
+
+    def has_sheet(self, spreadsheet_name: str, sheet_name: str) -> bool:
+        """آیا این sheet در mirror هست؟"""
+        return (spreadsheet_name, sheet_name) in self._meta
+
+    def get_sheet_info(self, spreadsheet_name: str, sheet_name: str) -> Optional[Dict]:
+        """metadata یک sheet (headers, row_count, synced_at)"""
+        return self._meta.get((spreadsheet_name, sheet_name))
+
+    # خواندن
+
+    def get_rows(self, spreadsheet_name: str, sheet_name: str) -> List[Dict]:
+        """تمام ردیف‌های یک sheet به ترتیب اصلی"""
+        self.stats['reads'] += 1
+        cursor = self._read_conn.execute(
+            'SELECT data FROM sheet_rows WHERE spreadsheet = ? AND sheet = ? ORDER BY row_index',
+            (spreadsheet_name, sheet_name)
+        )
+        return [json.loads(data) for (data,) in cursor]
+
+    def query(
+        self,
+        spreadsheet_name: str,
+        sheet_name: str,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        key: Optional[str] = None,
+        contains: Optional[str] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = False
+    ) -> List[Dict]:
+        """
+        جستجو با استفاده از ایندکس‌ها
+
+        Args:
+            since / until: بازه ستون زمان (مقایسه رشته‌ای ISO)
+            key: مقدار ستون کلید (ستون اول)
+            contains: متنی که باید در ردیف وجود داشته باشد
+            limit: حداکثر تعداد نتایج
+            newest_first: ترتیب از آخرین ردیف
+        """
+        self.stats['queries'] += 1
+
+        sql = 'SELECT data FROM sheet_rows WHERE spreadsheet = ? AND sheet = ?'
+        params: List[Any] = [spreadsheet_name, sheet_name]
+
+        if since is not None:
+            sql += ' AND ts >= ?'
+            params.append(since)
+        if until is not None:
+            sql += ' AND ts < ?'
+            params.append(until)
+        if key is not None:
+            sql += ' AND row_key = ?'
+            params.append(str(key))
+        if contains:
+            # search_text در پایتون lower شده - مقایسه یکسان با filter_records (یونیکد، نقل قول)
+            sql += ' AND instr(search_text, ?) > 0'
+            params.append(contains.lower())
+
+        sql += ' ORDER BY row_index DESC' if newest_first else ' ORDER BY row_index'
+
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+
+        return [json.loads(data) for (data,) in self._read_conn.execute(sql, params)]
+
+    # نوشتن
+
+    async def sync_sheet(
+        self,
+        spreadsheet_name: str,
+        sheet_name: str,
+        records: List[Dict],
+        append_only: bool = False
+    ) -> int:
+        """
+        به‌روزرسانی یک sheet در mirror
+
+        Args:
+            append_only: فقط ردیف‌های بعد از row_count فعلی نوشته شوند
+        Returns:
+            تعداد ردیف‌های نوشته‌شده
+        """
+        loop = asyncio.get_running_loop()
+        written, meta = await loop.run_in_executor(
+            self._executor,
+            self._write_sheet,
+            spreadsheet_name,
+            sheet_name,
+            list(records),
+            append_only
+        )
+
+        self._meta[(spreadsheet_name, sheet_name)] = meta
+        self.stats['syncs'] += 1
+        self.stats['rows_written'] += written
+        return written
+
+    def _write_sheet(
+        self,
+        spreadsheet_name: str,
+        sheet_name: str,
+        records: List[Dict],
+        append_only: bool
+    ) -> Tuple[int, Dict]:
+        conn = self._write_conn
+        headers = list(records[0].keys()) if records else []
+        key_column, timestamp_column = detect_columns(headers)
+
+        known = self._meta.get((spreadsheet_name, sheet_name))
+        start = 0
+
+        with conn:
+            if append_only and known is not None and len(records) >= known['row_count']:
+                start = known['row_count']
+            else:
+                conn.execute(
+                    'DELETE FROM sheet_rows WHERE spreadsheet = ? AND sheet = ?',
+                    (spreadsheet_name, sheet_name)
+                )
+
+            conn.executemany(
+                'INSERT OR REPLACE INTO sheet_rows VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        spreadsheet_name,
+                        sheet_name,
+                        index,
+                        str(record.get(key_column, '')),
+                        str(record.get(timestamp_column, '')) if timestamp_column else None,
+                        json.dumps(record, ensure_ascii=False, default=str),
+                        search_text(record)
+                    )
+                    for index, record in enumerate(records[start:], start)
+                )
+            )
+
+            meta = {
+                'headers': headers,
+                'row_count': len(records),
+                'synced_at': time.time()
+            }
+            conn.execute(
+                'INSERT OR REPLACE INTO sheet_meta VALUES (?, ?, ?, ?, ?)',
+                (
+                    spreadsheet_name,
+                    sheet_name,
+                    json.dumps(headers, ensure_ascii=False),
+                    meta['row_count'],
+                    meta['synced_at']
+                )
+            )
+
+        return len(records) - start, meta
+
+    def get_stats(self) -> Dict:
+        """آمار mirror"""
+        return {
+            **self.stats,
+            'path': str(self.path),
+            'sheets': len(self._meta),
+            'rows': sum(meta['row_count'] for meta in self._meta.values())
+        }
@@ -0,0 +1,124 @@
+"""
+Sheets Sync - همگام‌سازی افزایشی ردیف‌ها
+Incremental row sync for append-only sheets
+
+به جای دانلود کل sheet در هر بار، فقط ردیف‌های جدید با یک range read خوانده می‌شوند.
+آخرین ردیف شناخته‌شده هم دوباره خوانده می‌شود؛ اگر تغییر کرده باشد (ویرایش یا حذف)
+بارگذاری کامل انجام می‌شود.
+
+محدودیت: ویرایش مستقیم ردیف‌های قبلی (به جز آخرین ردیف) در Google Sheets تا بارگذاری
+کامل بعدی (full_resync_interval) دیده نمی‌شود؛ ویرایش‌های خود برنامه (update_cell)
+بارگذاری کامل را فوراً فعال می‌کنند.
+
+لیست records هرگز درجا تغییر نمی‌کند - هر همگام‌سازی لیست جدید می‌سازد، پس لیستی که
+قبلاً به cache یا فراخوان داده شده ثابت می‌ماند.
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+from gspread.utils import numericise_all
+
+
+def column_letter(index: int) -> str:
+    """تبدیل شماره ستون (از 1) به حرف A1 - مثلاً 28 -> AB"""
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _normalize_row(row: List[Any]) -> List[str]:
+    """حذف سلول‌های خالی انتهای ردیف (API آن‌ها را برنمی‌گرداند)"""
+    values = [str(v) for v in row]
+    while values and values[-1] == '':
+        values.pop()
+    return values
+
+
+class SheetRowStore:
+    """نگهداری محلی ردیف‌های یک sheet و وضعیت همگام‌سازی آن"""
+
+    def __init__(self):
+        self.headers: List[str] = []
+        self.records: List[Dict] = []
+        self._last_raw_row: Optional[List[Any]] = None
+        self.last_full_sync = 0.0
+        self._invalidated = False
+
+        # آمار
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self.rows_fetched = 0
+
+    def needs_full_sync(self, max_age: Optional[float] = None) -> bool:
+        """آیا بارگذاری کامل لازم است؟"""
+        if not self.headers or self._invalidated:
+            return True
+        if max_age is not None and time.time() - self.last_full_sync > max_age:
+            return True
+        return False
+
+    def tail_range(self) -> str:
+        """
+        محدوده A1 برای خواندن ردیف‌های جدید
+
+        از آخرین ردیف شناخته‌شده (یا سرستون‌ها) شروع می‌شود تا تغییرات قابل تشخیص باشند.
+        """
+        anchor_row = len(self.records) + 1  # سطر 1 = سرستون‌ها
+        return f"A{anchor_row}:{column_letter(len(self.headers))}"
+
+    def load_full(self, values: List[List[Any]]) -> List[Dict]:
+        """جایگزینی کامل با خروجی get_all_values"""
+        self.headers = list(values[0]) if values else []
+        self.records = []
+        self._last_raw_row = None
+        self._append_rows(values[1:] if values else [])
+
+        self.last_full_sync = time.time()
+        self._invalidated = False
+        self.full_syncs += 1
+        self.rows_fetched += len(values)
+        return self.records
+
+    def invalidate(self):
+        """بارگذاری کامل در sync بعدی (مثلاً بعد از ویرایش یک ردیف موجود)"""
+        self._invalidated = True
+
+    def apply_tail(self, values: List[List[Any]]) -> bool:
+        """
+        ادغام خروجی tail_range
+
+        Returns:
+            False اگر ردیف مرجع تغییر کرده باشد (بارگذاری کامل لازم است)
+        """
+        anchor = self._last_raw_row if self.records else self.headers
+
+        if not values or _normalize_row(values[0]) != _normalize_row(anchor):
+            return False
+
+        self._append_rows(values[1:])
+
+        self.incremental_syncs += 1
+        self.rows_fetched += len(values)
+        return True
+
+    def _append_rows(self, rows: List[List[Any]]):
+        """تبدیل ردیف‌ها به رکورد - مشابه get_all_records (در یک لیست جدید)"""
+        width = len(self.headers)
+        records = list(self.records)
+        for row in rows:
+            padded = list(row[:width]) + [''] * (width - len(row))
+            records.append(dict(zip(self.headers, numericise_all(padded))))
+            self._last_raw_row = padded
+        self.records = records
+
+    def get_stats(self) -> Dict:
+        """آمار همگام‌سازی"""
+        return {
+            'rows': len(self.records),
+            'full_syncs': self.full_syncs,
+            'incremental_syncs': self.incremental_syncs,
+            'rows_fetched': self.rows_fetched
+        }
@@ -0,0 +1,284 @@
+"""
+Sheets Write Queue - صف نوشتن write-behind برای Google Sheets
+Background write-behind queue that batches appended rows per sheet
+
+- ردیف‌ها به ازای هر (spreadsheet, sheet) جمع می‌شوند
+- با رسیدن به batch_size یا گذشتن flush_interval یکجا ارسال می‌شوند
+- وقتی صف پر است، فراخوان منتظر می‌ماند (backpressure)
+- ردیف‌های spreadsheet های هنوز متصل‌نشده (آفلاین) در صف می‌مانند؛ اگر صف پر شود روی دیسک
+  منتقل و بعد از اتصال دوباره صف می‌شوند
+- در shutdown همه چیز flush می‌شود و هرچه ارسال نشد روی دیسک می‌ماند
+  (یک فایل برای هر spreadsheet، تا هر manager فقط ردیف‌های خودش را بازیابی کند)
+"""
+
+import asyncio
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SheetKey = Tuple[str, str]
+
+
+class SheetsWriteQueue:
+    """صف write-behind با flush دسته‌ای"""
+
+    def __init__(
+        self,
+        writer: Callable[[str, str, List[List[Any]]], Awaitable[bool]],
+        batch_size: int = 50,
+        flush_interval: float = 2.0,
+        max_pending: int = 1000,
+        max_retries: int = 3,
+        spill_dir: str = 'data/sheets/pending_writes',
+        spill_key: Optional[Callable[[str], str]] = None,
+        ready: Optional[Callable[[str], bool]] = None
+    ):
+        """
+        Args:
+            writer: تابع async که یک دسته ردیف را برای یک sheet می‌نویسد
+            batch_size: تعداد ردیف‌هایی که flush فوری را فعال می‌کند
+            flush_interval: حداکثر فاصله بین دو flush (ثانیه)
+            max_pending: حداکثر ردیف در صف قبل از اعمال backpressure
+            max_retries: تعداد تلاش ناموفق قبل از انتقال ردیف‌ها به دیسک
+            spill_dir: پوشه فایل‌های ردیف‌های ارسال‌نشده (در شروع بعدی دوباره صف می‌شوند)
+            spill_key: نام فایل spill هر spreadsheet (مثلاً spreadsheet id) - پیش‌فرض: نام آن
+            ready: آیا spreadsheet متصل است - ردیف‌های spreadsheet آفلاین ارسال نمی‌شوند
+        """
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.spill_dir = Path(spill_dir)
+        self.spill_key = spill_key or (lambda spreadsheet_name: spreadsheet_name)
+        self.ready = ready or (lambda spreadsheet_name: True)
+
+        self._buffers: Dict[SheetKey, List[List[Any]]] = {}
+        self._failures: Dict[SheetKey, int] = {}
+        self._offline: Set[str] = set()  # spreadsheet هایی که ردیف‌هایشان در حالت آفلاین روی دیسک رفت
+        self._pending = 0
+
+        # در start ساخته می‌شوند تا به event loop درست متصل باشند
+        self._flush_event: asyncio.Event = None
+        self._space: asyncio.Condition = None
+        self._flush_lock: asyncio.Lock = None
+        self._task: asyncio.Task = None
+
+        self.stats = {
+            'queued_rows': 0,
+            'flushed_rows': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'spilled_rows': 0,
+            'restored_rows': 0,
+            'backpressure_waits': 0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def start(self, spreadsheets: Iterable[str] = ()):
+        """
+        شروع task پس‌زمینه
+
+        Args:
+            spreadsheets: spreadsheet هایی که ردیف‌های ذخیره‌شده‌شان از اجرای قبلی بازیابی می‌شوند
+        """
+        if self.running:
+            return
+
+        self._flush_event = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+
+        for spreadsheet_name in spreadsheets:
+            self._restore_spilled(spreadsheet_name)
+        self._task = asyncio.create_task(self._run())
+
+        logger.info(
+            f"📝 Sheets write-behind queue started "
+            f"(batch={self.batch_size}, interval={self.flush_interval}s)"
+        )
+
+    async def put(self, spreadsheet_name: str, sheet_name: str, row: List[Any]):
+        """اضافه کردن ردیف به صف (در صورت پر بودن صف منتظر می‌ماند)"""
+        key = (spreadsheet_name, sheet_name)
+
+        async with self._space:
+            if self._pending >= self.max_pending:
+                self.stats['backpressure_waits'] += 1
+                self._flush_event.set()
+                await self._space.wait_for(lambda: self._pending < self.max_pending)
+
+            buffer = self._buffers.setdefault(key, [])
+            buffer.append(list(row))
+            self._pending += 1
+            self.stats['queued_rows'] += 1
+
+            if len(buffer) >= self.batch_size:
+                self._flush_event.set()
+
+    async def _run(self):
+        """حلقه flush بر اساس زمان یا اندازه"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._flush_event.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Write-behind flush error: {e}")
+
+    async def flush(self) -> int:
+        """ارسال تمام ردیف‌های صف - تعداد ردیف‌های نوشته‌شده را برمی‌گرداند"""
+        async with self._flush_lock:
+            flushed = 0
+            offline: List[SheetKey] = []
+
+            for key in list(self._buffers.keys()):
+                if not self.ready(key[0]):
+                    offline.append(key)
+                    continue
+
+                rows = self._buffers.pop(key, None)
+                if not rows:
+                    continue
+
+                try:
+                    success = await self.writer(key[0], key[1], rows)
+                except Exception as e:
+                    logger.error(f"❌ Batch write to {key[0]}/{key[1]} failed: {e}")
+                    success = False
+
+                if success:
+                    self._failures.pop(key, None)
+                    self.stats['batches'] += 1
+                    self.stats['flushed_rows'] += len(rows)
+                    flushed += len(rows)
+                    await self._release(len(rows))
+                    continue
+
+                self.stats['failed_batches'] += 1
+                failures = self._failures.get(key, 0) + 1
+
+                if failures >= self.max_retries:
+                    # بعد از چند تلاش ناموفق روی دیسک بماند تا صف مسدود نشود
+                    self._failures.pop(key, None)
+                    self._spill({key: rows})
+                    await self._release(len(rows))
+                else:
+                    self._failures[key] = failures
+                    self._buffers[key] = rows + self._buffers.get(key, [])
+
+            # ردیف‌های spill شده در حالت آفلاین بعد از اتصال دوباره صف می‌شوند
+            for spreadsheet_name in list(self._offline):
+                if self.ready(spreadsheet_name):
+                    self._offline.discard(spreadsheet_name)
+                    self._restore_spilled(spreadsheet_name)
+                    self._flush_event.set()
+
+            # صف پر و spreadsheet آفلاین: به جای مسدود کردن فراخوان‌ها روی دیسک منتقل شود
+            if offline and self._pending >= self.max_pending:
+                spilled = {key: self._buffers.pop(key) for key in offline if key in self._buffers}
+                self._spill(spilled)
+                self._offline.update(key[0] for key in spilled)
+                await self._release(sum(len(rows) for rows in spilled.values()))
+
+            return flushed
+
+    async def stop(self):
+        """توقف صف با flush نهایی؛ باقیمانده روی دیسک ذخیره می‌شود"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._flush_lock is None:
+            return
+
+        await self.flush()
+
+        if self._buffers:
+            remaining = self._buffers
+            self._buffers = {}
+            self._spill(remaining)
+            await self._release(sum(len(rows) for rows in remaining.values()))
+
+        logger.info(f"✅ Sheets write-behind queue stopped ({self.stats['flushed_rows']} rows written)")
+
+    async def _release(self, count: int):
+        """آزاد کردن ظرفیت صف"""
+        async with self._space:
+            self._pending = max(0, self._pending - count)
+            self._space.notify_all()
+
+    def _spill_file(self, spreadsheet_name: str) -> Path:
+        name = re.sub(r'[^\w.-]', '_', str(self.spill_key(spreadsheet_name)))
+        return self.spill_dir / f"{name}.jsonl"
+
+    def _spill(self, buffers: Dict[SheetKey, List[List[Any]]]):
+        """ذخیره ردیف‌های ارسال‌نشده روی دیسک (فایل جدا برای هر spreadsheet)"""
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            for (spreadsheet_name, sheet_name), rows in buffers.items():
+                with open(self._spill_file(spreadsheet_name), 'a', encoding='utf-8') as f:
+                    for row in rows:
+                        f.write(json.dumps({
+                            'spreadsheet': spreadsheet_name,
+                            'sheet': sheet_name,
+                            'row': row
+                        }, ensure_ascii=False, default=str) + '\n')
+                self.stats['spilled_rows'] += len(rows)
+                logger.warning(f"💾 Spilled {len(rows)} rows for {spreadsheet_name}/{sheet_name} to disk")
+        except Exception as e:
+            logger.error(f"❌ Could not spill pending rows: {e}")
+
+    def _restore_spilled(self, spreadsheet_name: str):
+        """بارگذاری ردیف‌های ذخیره‌شده یک spreadsheet"""
+        spill_file = self._spill_file(spreadsheet_name)
+        if not spill_file.exists():
+            return
+
+        restored = 0
+        try:
+            with open(spill_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    key = (spreadsheet_name, entry['sheet'])
+                    self._buffers.setdefault(key, []).append(entry['row'])
+                    restored += 1
+
+            spill_file.unlink()
+        except Exception as e:
+            logger.error(f"❌ Could not restore spilled rows for {spreadsheet_name}: {e}")
+
+        self._pending += restored
+        self.stats['restored_rows'] += restored
+        if restored:
+            logger.info(f"📥 Restored {restored} pending rows for {spreadsheet_name}")
+
+    def get_stats(self) -> Dict:
+        """آمار صف"""
+        return {
+            **self.stats,
+            'pending_rows': self._pending,
+            'running': self.running
+        }
@@ -0,0 +1,158 @@
+"""
+Stage Graph - اجرای مراحل پردازش بر اساس وابستگی
+Dependency-aware concurrent execution of processing stages
+
+مراحلی که به هم وابسته نیستند هم‌زمان اجرا می‌شوند:
+- مراحل async مستقیماً روی event loop
+- مراحل سنگین (NumPy) در thread pool
+- هر مرحله timeout مخصوص خودش را دارد و در صورت کندی کنار گذاشته می‌شود
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """یک مرحله از گراف پردازش"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        depends_on: Iterable[str] = (),
+        timeout: Optional[float] = None,
+        blocking: bool = False,
+        default: Any = None,
+        executor: Optional[Executor] = None
+    ):
+        """
+        Args:
+            name: نام مرحله
+            func: تابع مرحله با امضای func(inputs, deps)
+            depends_on: نام مراحلی که باید قبل از این مرحله تمام شوند
+            timeout: حداکثر زمان (ثانیه) - None یعنی بدون محدودیت
+            blocking: اگر True باشد func همگام است و در executor اجرا می‌شود
+            default: مقدار جایگزین در صورت timeout یا خطا
+            executor: executor اختصاصی این مرحله (مثلاً تک‌thread برای state مشترک)
+        """
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+        self.blocking = blocking
+        self.default = default
+        self.executor = executor
+
+        # آمار
+        self.runs = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_time = 0.0
+
+    def get_stats(self) -> Dict:
+        """آمار مرحله"""
+        return {
+            'runs': self.runs,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'avg_time': self.total_time / self.runs if self.runs else 0.0
+        }
+
+
+class StageGraph:
+    """
+    گراف مراحل - اجرای هم‌زمان مراحل مستقل
+
+    مثال:
+        graph = StageGraph(executor)
+        graph.add_stage('a', fetch_a)
+        graph.add_stage('b', fetch_b, blocking=True, timeout=2.0)
+        graph.add_stage('c', combine, depends_on=['a', 'b'])
+        results = await graph.run({'text': '...'})
+    """
+
+    def __init__(self, executor: Optional[Executor] = None):
+        self.executor = executor
+        self.stages: Dict[str, Stage] = {}
+        self._order: List[str] = []
+
+    def add_stage(
+        self,
+        name: str,
+        func: Callable,
+        depends_on: Iterable[str] = (),
+        timeout: Optional[float] = None,
+        blocking: bool = False,
+        default: Any = None,
+        executor: Optional[Executor] = None
+    ) -> Stage:
+        """اضافه کردن مرحله (وابستگی‌ها باید قبلاً اضافه شده باشند)"""
+        if name in self.stages:
+            raise ValueError(f"Stage already exists: {name}")
+
+        for dep in depends_on:
+            if dep not in self.stages:
+                raise ValueError(f"Unknown dependency '{dep}' for stage '{name}'")
+
+        stage = Stage(name, func, depends_on, timeout, blocking, default, executor)
+        self.stages[name] = stage
+        self._order.append(name)
+        return stage
+
+    async def run(self, inputs: Dict = None) -> Dict[str, Any]:
+        """اجرای کل گراف و برگرداندن نتیجه هر مرحله"""
+        inputs = inputs or {}
+        tasks: Dict[str, asyncio.Future] = {}
+
+        # ترتیب اضافه شدن یک ترتیب توپولوژیک معتبر است
+        for name in self._order:
+            tasks[name] = asyncio.ensure_future(
+                self._run_stage(self.stages[name], inputs, tasks)
+            )
+
+        results = await asyncio.gather(*tasks.values())
+        return dict(zip(tasks.keys(), results))
+
+    async def _run_stage(self, stage: Stage, inputs: Dict, tasks: Dict[str, asyncio.Future]) -> Any:
+        """اجرای یک مرحله پس از آماده شدن وابستگی‌ها"""
+        deps = {}
+        for dep in stage.depends_on:
+            deps[dep] = await tasks[dep]
+
+        start = time.perf_counter()
+        stage.runs += 1
+
+        try:
+            if stage.blocking:
+                loop = asyncio.get_running_loop()
+                call = loop.run_in_executor(
+                    stage.executor or self.executor,
+                    functools.partial(stage.func, inputs, deps)
+                )
+            else:
+                call = stage.func(inputs, deps)
+
+            return await asyncio.wait_for(call, stage.timeout)
+
+        except asyncio.TimeoutError:
+            stage.timeouts += 1
+            logger.warning(f"⏱️ Stage '{stage.name}' timed out after {stage.timeout}s - skipped")
+            return stage.default
+
+        except Exception as e:
+            stage.errors += 1
+            logger.error(f"❌ Stage '{stage.name}' failed: {e}")
+            return stage.default
+
+        finally:
+            stage.total_time += time.perf_counter() - start
+
+    def get_stats(self) -> Dict:
+        """آمار تمام مراحل"""
+        return {name: stage.get_stats() for name, stage in self.stages.items()}
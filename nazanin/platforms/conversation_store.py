@@ -0,0 +1,229 @@
+"""
+Conversation Store - حافظه محدود مکالمه‌ها
+Memory-bounded per-user conversation store with LRU spill to SQLite
+
+- پیام‌های هر مکالمه در یک deque با طول ثابت نگهداری می‌شوند (حذف قدیمی‌ترین O(1))
+- فقط max_resident مکالمه اخیر در حافظه می‌مانند؛ مکالمه‌های بیکار یا قدیمی‌تر در SQLite
+  ذخیره و از حافظه حذف می‌شوند
+- با دسترسی دوباره، مکالمه به صورت خودکار از دیسک بارگذاری می‌شود
+- مکالمه‌های بیرون رفته دسته‌ای و در یک تراکنش نوشته می‌شوند (هر spill یک commit همگام روی
+  event loop نیست)؛ تا نوشته شدن، دسترسی دوباره از همان دسته خوانده می‌شود
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    user_id INTEGER PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    return str(value)
+
+
+def _decode(obj: Dict):
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+class ConversationStore:
+    """مکالمه‌های کاربران با حافظه محدود"""
+
+    def __init__(
+        self,
+        path: Optional[str] = 'data/telegram/conversations.db',
+        max_messages: int = 200,
+        max_resident: int = 1000,
+        idle_ttl: float = 3600,
+        spill_batch: int = 50,
+        spill_interval: float = 5.0
+    ):
+        """
+        Args:
+            path: فایل SQLite مکالمه‌های بیرون رفته از حافظه - None یعنی حذف بدون ذخیره
+            max_messages: حداکثر پیام‌های هر مکالمه
+            max_resident: حداکثر مکالمه‌های داخل حافظه
+            idle_ttl: مکالمه‌هایی که این مدت (ثانیه) استفاده نشده‌اند به دیسک منتقل می‌شوند
+            spill_batch: تعداد مکالمه‌های بیرون رفته‌ای که با هم در یک تراکنش نوشته می‌شوند
+            spill_interval: حداکثر زمان (ثانیه) ماندن یک مکالمه بیرون رفته در دسته قبل از نوشتن
+        """
+        self.max_messages = max_messages
+        self.max_resident = max_resident
+        self.idle_ttl = idle_ttl
+        self.spill_batch = spill_batch
+        self.spill_interval = spill_interval
+
+        # user_id -> conversation، به ترتیب آخرین استفاده
+        self._resident: 'OrderedDict[int, Dict]' = OrderedDict()
+        self._last_used: Dict[int, float] = {}
+
+        # user_id -> داده مکالمه بیرون رفته‌ای که هنوز نوشته نشده
+        self._pending: Dict[int, Dict] = {}
+        self._pending_since = 0.0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+        self.stats = {
+            'spilled': 0,
+            'rehydrated': 0,
+            'dropped': 0,
+            'spill_commits': 0
+        }
+
+    def get(self, user_id: int, create: bool = True) -> Optional[Dict]:
+        """مکالمه کاربر (از حافظه، از دیسک یا جدید)"""
+        now = time.time()
+        conversation = self._resident.get(user_id)
+
+        if conversation is None:
+            conversation = self._load(user_id)
+            if conversation is None:
+                if not create:
+                    return None
+                conversation = {
+                    'start_time': datetime.now(),
+                    'messages': deque(maxlen=self.max_messages),
+                    'context': {}
+                }
+            self._resident[user_id] = conversation
+
+        self._resident.move_to_end(user_id)
+        self._last_used[user_id] = now
+        self._evict(now)
+        return conversation
+
+    def append(self, user_id: int, message: Dict):
+        """افزودن پیام به مکالمه (قدیمی‌ترین پیام در صورت پر بودن حذف می‌شود)"""
+        self.get(user_id)['messages'].append(message)
+
+    def history(self, user_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """پیام‌های مکالمه (limit پیام آخر)"""
+        conversation = self.get(user_id, create=False)
+        if conversation is None:
+            return []
+        messages = list(conversation['messages'])
+        return messages[-limit:] if limit else messages
+
+    def _evict(self, now: float):
+        cutoff = now - self.idle_ttl
+        while self._resident:
+            user_id = next(iter(self._resident))
+            if len(self._resident) <= self.max_resident and self._last_used[user_id] >= cutoff:
+                break
+            self._spill(user_id, self._resident.pop(user_id))
+            del self._last_used[user_id]
+
+        if self._pending and (
+            len(self._pending) >= self.spill_batch or now - self._pending_since >= self.spill_interval
+        ):
+            self._write_pending()
+
+    def _spill(self, user_id: int, conversation: Dict):
+        if self._conn is None:
+            self.stats['dropped'] += 1
+            return
+
+        if not self._pending:
+            self._pending_since = time.time()
+        self._pending[user_id] = {
+            'start_time': conversation['start_time'],
+            'messages': list(conversation['messages']),
+            'context': conversation['context']
+        }
+
+    def _write_pending(self):
+        """نوشتن همه مکالمه‌های بیرون رفته در یک تراکنش"""
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO conversations (user_id, updated_at, data) VALUES (?, ?, ?)',
+                    [
+                        (user_id, now, json.dumps(data, ensure_ascii=False, default=_encode))
+                        for user_id, data in pending.items()
+                    ]
+                )
+            self.stats['spilled'] += len(pending)
+            self.stats['spill_commits'] += 1
+        except sqlite3.Error as e:
+            self.stats['dropped'] += len(pending)
+            logger.error(f"❌ Failed to spill {len(pending)} conversations: {e}")
+
+    def _load(self, user_id: int) -> Optional[Dict]:
+        if self._conn is None:
+            return None
+
+        # مکالمه‌ای که هنوز در دسته نوشتن است
+        data = self._pending.pop(user_id, None)
+        if data is None:
+            row = self._conn.execute(
+                'SELECT data FROM conversations WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[0], object_hook=_decode)
+
+        self.stats['rehydrated'] += 1
+        return {
+            'start_time': data['start_time'],
+            'messages': deque(data['messages'], maxlen=self.max_messages),
+            'context': data['context']
+        }
+
+    def flush(self):
+        """ذخیره همه مکالمه‌های داخل حافظه (مثلاً در shutdown)"""
+        if self._conn is None:
+            return
+        for user_id, conversation in list(self._resident.items()):
+            self._spill(user_id, conversation)
+        if self._pending:
+            self._write_pending()
+
+    def close(self):
+        """ذخیره و بستن پایگاه داده"""
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._resident
+
+    def __len__(self) -> int:
+        return len(self._resident)
+
+    def get_stats(self) -> Dict:
+        """آمار مکالمه‌ها"""
+        stored = 0
+        if self._conn is not None:
+            stored = self._conn.execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
+        return {
+            **self.stats,
+            'resident': len(self._resident),
+            'pending_spills': len(self._pending),
+            'stored': stored
+        }
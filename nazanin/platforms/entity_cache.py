@@ -0,0 +1,136 @@
+"""
+Entity Cache - cache موجودیت‌های تلگرام
+TTL- and size-bounded cache for Telegram users, chats and channels keyed by peer id
+
+- هر موجودیت تا ttl ثانیه معتبر است و تعداد موجودیت‌ها محدود است (LRU)
+- درخواست‌های هم‌زمان برای یک peer فقط یک بار به API تلگرام ارسال می‌شوند
+- کانال‌ها و گروه‌های تنظیم شده در شروع از پیش بارگذاری می‌شوند
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EntityCache:
+    """cache موجودیت‌ها به ازای peer id"""
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 10000):
+        """
+        Args:
+            ttl: مدت اعتبار هر موجودیت (ثانیه)
+            max_entries: حداکثر تعداد موجودیت‌ها
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # peer_id -> (entity, stored_at)
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expirations': 0,
+            'evictions': 0,
+            'fetch_errors': 0,
+            'prefetched': 0
+        }
+
+    async def get(self, peer_id: Optional[int], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        موجودیت peer_id از cache یا با fetch (نتیجه None ذخیره نمی‌شود)
+
+        Args:
+            fetch: تابع async دریافت موجودیت از تلگرام (مثلاً event.get_sender)
+        """
+        if peer_id is None:
+            return await fetch()
+
+        entity = self._lookup(peer_id)
+        if entity is not None:
+            self.stats['hits'] += 1
+            return entity
+
+        self.stats['misses'] += 1
+        task = self._inflight.get(peer_id)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[peer_id] = task
+            task.add_done_callback(lambda t: self._store(peer_id, t))
+
+        return await asyncio.shield(task)
+
+    def put(self, peer_id: int, entity: Any):
+        """ذخیره موجودیت"""
+        if entity is None:
+            return
+        self._entries[peer_id] = (entity, time.time())
+        self._entries.move_to_end(peer_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, peer_id: int):
+        """حذف موجودیت (مثلاً بعد از تغییر نام یا عکس)"""
+        self._entries.pop(peer_id, None)
+
+    async def prefetch(
+        self,
+        peer_ids: Iterable[int],
+        fetch: Callable[[int], Awaitable[Any]],
+        concurrency: int = 5
+    ):
+        """بارگذاری از پیش موجودیت‌ها (مثلاً با client.get_entity)"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load(peer_id: int):
+            async with semaphore:
+                try:
+                    self.put(peer_id, await fetch(peer_id))
+                    self.stats['prefetched'] += 1
+                except Exception as e:
+                    self.stats['fetch_errors'] += 1
+                    logger.debug(f"Failed to prefetch entity {peer_id}: {e}")
+
+        await asyncio.gather(*(load(peer_id) for peer_id in set(peer_ids)))
+
+    def _lookup(self, peer_id: int) -> Any:
+        entry = self._entries.get(peer_id)
+        if entry is None:
+            return None
+
+        entity, stored_at = entry
+        if time.time() - stored_at >= self.ttl:
+            del self._entries[peer_id]
+            self.stats['expirations'] += 1
+            return None
+
+        self._entries.move_to_end(peer_id)
+        return entity
+
+    def _store(self, peer_id: int, task: asyncio.Future):
+        if self._inflight.get(peer_id) is task:
+            del self._inflight[peer_id]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.stats['fetch_errors'] += 1
+            return
+        self.put(peer_id, task.result())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        """آمار cache"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0
+        }
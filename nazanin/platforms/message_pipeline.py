@@ -0,0 +1,200 @@
+"""
+Message Pipeline - صف پردازش پیام‌های ورودی
+Bounded, prioritised worker-pool pipeline for inbound messages
+
+- پیام‌ها در دو مسیر صف می‌شوند: مسیر اولویت‌دار (پیام خصوصی، mention) و مسیر عادی (گروه‌ها)
+- تعداد ثابتی worker پیام‌ها را پردازش می‌کنند؛ چتی که پیام اولویت‌دار منتظر دارد زودتر نوبت می‌گیرد
+- پیام‌های یک چت (از هر دو مسیر) به ترتیب رسیدن پردازش می‌شوند و در هر لحظه حداکثر یک worker
+  روی هر چت است؛ اولویت فقط در انتخاب بین چت‌ها اعمال می‌شود، نه داخل یک چت
+- چت‌ها به نوبت (round-robin) سرویس می‌گیرند تا یک گروه پرترافیک بقیه را معطل نکند
+- با پر شدن صف، پیام‌های جدید رد می‌شوند و با پر شدن صف یک چت قدیمی‌ترین پیام آن چت حذف می‌شود
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY = 'priority'
+NORMAL = 'normal'
+
+
+class MessagePipeline:
+    """صف محدود با worker pool، مسیر اولویت‌دار و ترتیب به ازای هر چت"""
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        workers: int = 8,
+        max_pending: int = 2000,
+        priority_max_pending: int = 500,
+        max_per_chat: int = 200
+    ):
+        """
+        Args:
+            handler: تابع async پردازش یک پیام
+            workers: تعداد worker های هم‌زمان
+            max_pending: حداکثر پیام‌های منتظر در مسیر عادی
+            priority_max_pending: حداکثر پیام‌های منتظر در مسیر اولویت‌دار
+            max_per_chat: حداکثر پیام‌های منتظر یک چت (قدیمی‌ترها حذف می‌شوند)
+        """
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = {PRIORITY: priority_max_pending, NORMAL: max_pending}
+        self.max_per_chat = max_per_chat
+
+        # چت‌های آماده پردازش در هر مسیر و صف پیام‌های هر چت (item، زمان ورود، مسیر)
+        self._lanes: Dict[str, deque] = {PRIORITY: deque(), NORMAL: deque()}
+        self._chats: Dict[Hashable, deque] = {}
+        self._pending = {PRIORITY: 0, NORMAL: 0}
+
+        # نوبت فعلی هر چت آماده (مسیر، شماره نوبت)؛ ورودی‌های مسیر با نوبت دیگر کهنه‌اند
+        self._scheduled: Dict[Hashable, tuple] = {}
+        self._priority_pending: Dict[Hashable, int] = {}
+        self._turns = itertools.count()
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.stats = {
+            lane: {
+                'submitted': 0,
+                'processed': 0,
+                'shed': 0,
+                'errors': 0,
+                'avg_wait': 0.0
+            }
+            for lane in (PRIORITY, NORMAL)
+        }
+
+    def start(self):
+        """شروع worker ها"""
+        if self._tasks:
+            return
+        self._ready = asyncio.Semaphore(0)
+        # چت‌هایی که قبل از start صف شده‌اند
+        for _ in range(len(self._scheduled)):
+            self._ready.release()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f'message-worker-{i}')
+            for i in range(self.workers)
+        ]
+        logger.info(f"📥 Message pipeline started with {self.workers} workers")
+
+    async def stop(self):
+        """توقف worker ها (پیام‌های منتظر دور ریخته می‌شوند)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, chat_id: Hashable, item: Any, priority: bool = False) -> bool:
+        """
+        افزودن پیام به صف (بدون انتظار)
+
+        Returns:
+            False اگر صف پر بود و پیام رد شد
+        """
+        lane = PRIORITY if priority else NORMAL
+        stats = self.stats[lane]
+
+        if self._pending[lane] >= self.max_pending[lane]:
+            stats['shed'] += 1
+            return False
+
+        queue = self._chats.get(chat_id)
+        is_new = queue is None
+        if is_new:
+            queue = deque()
+            self._chats[chat_id] = queue
+        elif len(queue) >= self.max_per_chat:
+            _, _, dropped_lane = queue.popleft()
+            self._pending[dropped_lane] -= 1
+            self.stats[dropped_lane]['shed'] += 1
+            if dropped_lane == PRIORITY:
+                self._take_priority(chat_id)
+
+        queue.append((item, time.monotonic(), lane))
+        self._pending[lane] += 1
+        stats['submitted'] += 1
+        if lane == PRIORITY:
+            self._priority_pending[chat_id] = self._priority_pending.get(chat_id, 0) + 1
+
+        if is_new:
+            self._schedule(chat_id)
+        elif lane == PRIORITY and chat_id in self._scheduled and self._scheduled[chat_id][0] == NORMAL:
+            # چت منتظر در مسیر عادی به مسیر اولویت‌دار منتقل می‌شود (ورودی قبلی کهنه می‌شود، permit همان است)
+            self._enqueue(chat_id, PRIORITY)
+        return True
+
+    def _take_priority(self, chat_id: Hashable):
+        count = self._priority_pending[chat_id] - 1
+        if count:
+            self._priority_pending[chat_id] = count
+        else:
+            del self._priority_pending[chat_id]
+
+    def _enqueue(self, chat_id: Hashable, lane: str):
+        turn = next(self._turns)
+        self._scheduled[chat_id] = (lane, turn)
+        self._lanes[lane].append((chat_id, turn))
+
+    def _schedule(self, chat_id: Hashable):
+        self._enqueue(chat_id, PRIORITY if chat_id in self._priority_pending else NORMAL)
+        if self._ready is not None:
+            self._ready.release()
+
+    def _next_chat(self) -> Hashable:
+        """چت آماده بعدی - مسیر اولویت‌دار اول، ورودی‌های کهنه رد می‌شوند"""
+        for lane in (PRIORITY, NORMAL):
+            entries = self._lanes[lane]
+            while entries:
+                chat_id, turn = entries.popleft()
+                if self._scheduled.get(chat_id) == (lane, turn):
+                    del self._scheduled[chat_id]
+                    return chat_id
+        raise RuntimeError("No scheduled chat for a ready permit")
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+
+            chat_id = self._next_chat()
+            queue = self._chats[chat_id]
+            item, enqueued_at, lane = queue.popleft()
+            self._pending[lane] -= 1
+            if lane == PRIORITY:
+                self._take_priority(chat_id)
+
+            stats = self.stats[lane]
+            wait = time.monotonic() - enqueued_at
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats['errors'] += 1
+                logger.error(f"❌ Message handler failed: {e}")
+            finally:
+                stats['processed'] += 1
+                stats['avg_wait'] += (wait - stats['avg_wait']) / stats['processed']
+
+                # یک پیام در هر نوبت - چت دوباره به انتهای مسیر برمی‌گردد
+                if queue:
+                    self._schedule(chat_id)
+                else:
+                    del self._chats[chat_id]
+
+    def get_stats(self) -> Dict:
+        """آمار صف"""
+        return {
+            lane: {
+                **self.stats[lane],
+                'pending': self._pending[lane],
+                'chats': sum(1 for scheduled, _ in self._scheduled.values() if scheduled == lane)
+            }
+            for lane in (PRIORITY, NORMAL)
+        }
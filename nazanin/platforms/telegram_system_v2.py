@@ -5,22 +5,33 @@ Telegram System V2 - کنترل کامل
 
 import asyncio
 import logging
+import time
+from collections import deque
 from telethon import TelegramClient, events
 from telethon.tl.types import User, Channel, Message
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import json
 
+from nazanin.core.prompt_builder import PromptBuilder, PromptSection
+from nazanin.platforms.conversation_store import ConversationStore
+from nazanin.platforms.entity_cache import EntityCache
+from nazanin.platforms.message_pipeline import MessagePipeline
+
 logger = logging.getLogger(__name__)
 
+# حداکثر طول یک پیام تلگرام
+MAX_MESSAGE_LENGTH = 4096
+
 
 class TelegramSystemV2:
     """سیستم پیشرفته تلگرام"""
     
-    def __init__(self, config: Dict, sheets_manager=None, organism=None):
+    def __init__(self, config: Dict, sheets_manager=None, organism=None, api_manager=None):
         self.config = config.get('telegram', {})
         self.sheets_manager = sheets_manager
         self.organism = organism  # موجود زیستی
+        self.api_manager = api_manager  # برای پاسخ جریانی با AI
         
         # Client برای کنترل کامل اکانت
         self.client = None
@@ -32,9 +43,44 @@ class TelegramSystemV2:
         # Settings
         self.settings = self.config.get('settings', {})
         
-        # Conversation memory
-        self.conversations = {}  # {user_id: conversation_data}
-        self.saved_messages = []
+        # Conversation memory - مکالمه‌های بیکار به دیسک منتقل می‌شوند
+        conversation_config = self.settings.get('conversations', {})
+        self.conversations = ConversationStore(
+            path=conversation_config.get('path', 'data/telegram/conversations.db'),
+            max_messages=conversation_config.get('max_messages', 200),
+            max_resident=conversation_config.get('max_resident', 1000),
+            idle_ttl=conversation_config.get('idle_ttl', 3600),
+            spill_batch=conversation_config.get('spill_batch', 50),
+            spill_interval=conversation_config.get('spill_interval', 5.0)
+        )
+        # نگه‌داری فقط 10000 پیام اخیر
+        self.saved_messages = deque(maxlen=10000)
+        
+        # cache کاربران و چت‌ها (کاهش درخواست‌های get_sender / get_chat / get_entity)
+        entity_cache_config = self.settings.get('entity_cache', {})
+        self.entity_cache = EntityCache(
+            ttl=entity_cache_config.get('ttl', 3600),
+            max_entries=entity_cache_config.get('max_entries', 10000)
+        )
+        
+        # صف پردازش پیام‌ها (پیام‌های خصوصی و mention ها جلوتر از گروه‌ها)
+        pipeline_config = self.settings.get('pipeline', {})
+        self.pipeline = MessagePipeline(
+            self._process_new_message,
+            workers=pipeline_config.get('workers', 8),
+            max_pending=pipeline_config.get('max_pending', 2000),
+            priority_max_pending=pipeline_config.get('priority_max_pending', 500),
+            max_per_chat=pipeline_config.get('max_per_chat', 200)
+        ) if pipeline_config.get('enabled', True) else None
+        
+        # prompt پاسخ جریانی در بودجه توکن provider ها
+        self.prompt_builder = PromptBuilder()
+        
+        self.stats = {
+            'streamed_replies': 0,
+            'stream_edits': 0,
+            'avg_first_chunk_time': 0.0
+        }
         
         logger.info("✅ Telegram System V2 initialized")
     
@@ -54,7 +100,12 @@ class TelegramSystemV2:
         
         logger.info("✅ Telegram client started")
         
+        # بارگذاری از پیش کانال‌ها و گروه‌های تنظیم شده
+        await self.entity_cache.prefetch(self._configured_peer_ids(), self.client.get_entity)
+        
         # تنظیم event handlers
+        if self.pipeline:
+            self.pipeline.start()
         await self._setup_handlers()
         
         # به‌روزرسانی لیست کانال‌ها و گروه‌ها در sheets
@@ -69,7 +120,13 @@ class TelegramSystemV2:
         @self.client.on(events.NewMessage)
         async def handle_new_message(event):
             """پردازش پیام جدید"""
-            await self._process_new_message(event)
+            if self.pipeline is None:
+                await self._process_new_message(event)
+                return
+            
+            priority = event.is_private or bool(getattr(event, 'mentioned', False))
+            if not self.pipeline.submit(event.chat_id, event, priority=priority):
+                logger.debug(f"⏭️ Message shed in {event.chat_id} (queue full)")
         
         @self.client.on(events.MessageEdited)
         async def handle_edited_message(event):
@@ -85,8 +142,8 @@ class TelegramSystemV2:
         """پردازش پیام جدید"""
         try:
             message = event.message
-            sender = await event.get_sender()
-            chat = await event.get_chat()
+            sender = await self.entity_cache.get(event.sender_id, event.get_sender)
+            chat = await self.entity_cache.get(event.chat_id, event.get_chat)
             
             # ذخیره پیام اگه تنظیم شده
             if self.settings.get('save_messages', True):
@@ -115,10 +172,6 @@ class TelegramSystemV2:
         
         self.saved_messages.append(message_data)
         
-        # نگه‌داری فقط 10000 پیام اخیر
-        if len(self.saved_messages) > 10000:
-            self.saved_messages = self.saved_messages[-10000:]
-        
         # Forward به Saved Messages اگه تنظیم شده
         if self.settings.get('forward_to_saved', False):
             try:
@@ -132,42 +185,129 @@ class TelegramSystemV2:
         user_text = message.text or ''
         
         # شروع یا ادامه conversation
-        if user_id not in self.conversations:
-            self.conversations[user_id] = {
-                'start_time': datetime.now(),
-                'messages': [],
-                'context': {}
-            }
-        
-        self.conversations[user_id]['messages'].append({
+        self.conversations.append(user_id, {
             'from': 'user',
             'text': user_text,
             'timestamp': message.date
         })
         
-        # استفاده از موجود زیستی برای پردازش
-        if self.organism:
-            # درک پیام
-            perception = await self.organism.perceive(user_text)
-            
-            # فکر کردن
-            thought = await self.organism.think(user_text)
-            
-            # تولید پاسخ
-            response_text = thought.get('decision', {}).get('action', 'متوجه نشدم، می‌تونی دوباره بگی؟')
-        else:
-            response_text = "سلام! در حال پردازش..."
+        response_text = None
         
-        # ارسال پاسخ
-        await event.respond(response_text)
+        # پاسخ جریانی با AI - پیام با رسیدن متن به تدریج ویرایش می‌شود
+        if self.api_manager and self.settings.get('stream_responses', False):
+            try:
+                response_text = await self._stream_reply(event, self._build_reply_prompt(user_id))
+            except Exception as e:
+                logger.error(f"❌ Streaming reply failed: {e}")
+        
+        if response_text is None:
+            # استفاده از موجود زیستی برای پردازش
+            if self.organism:
+                # درک پیام
+                perception = await self.organism.perceive(user_text)
+                
+                # فکر کردن
+                thought = await self.organism.think(user_text)
+                
+                # تولید پاسخ
+                response_text = thought.get('decision', {}).get('action', 'متوجه نشدم، می‌تونی دوباره بگی؟')
+            else:
+                response_text = "سلام! در حال پردازش..."
+            
+            # ارسال پاسخ
+            await event.respond(response_text)
         
         # ذخیره پاسخ
-        self.conversations[user_id]['messages'].append({
+        self.conversations.append(user_id, {
             'from': 'bot',
             'text': response_text,
             'timestamp': datetime.now()
         })
     
+    def _build_reply_prompt(self, user_id: int, history_size: int = 10) -> str:
+        """
+        prompt پاسخ از پیام‌های اخیر مکالمه
+        
+        اگر prompt از بودجه provider بزرگ‌تر باشد قدیمی‌ترین پیام‌های تاریخچه اول حذف
+        می‌شوند؛ آخرین پیام کاربر فقط در آخرین مرحله کوتاه می‌شود.
+        """
+        history = self.get_conversation_history(user_id, limit=history_size)
+        
+        sections = [self.prompt_builder.segment('telegram_reply', lambda: (
+            "تو نازنین هستی و در تلگرام گفتگو می‌کنی. "
+            "به آخرین پیام کاربر طبیعی و به همان زبان پاسخ بده.\n"
+        ))]
+        for index, item in enumerate(history):
+            speaker = 'کاربر' if item['from'] == 'user' else 'نازنین'
+            last = index == len(history) - 1
+            sections.append(PromptSection(
+                'message' if last else 'history',
+                f"{speaker}: {item['text']}",
+                priority=index,
+                required=last,
+                truncatable=last
+            ))
+        sections.append(PromptSection('suffix', 'نازنین:', required=True, truncatable=False))
+        
+        return self.prompt_builder.build(sections, self.api_manager.prompt_budget())
+    
+    async def _stream_reply(self, event, prompt: str) -> Optional[str]:
+        """
+        ارسال پاسخ جریانی
+        
+        اولین chunk فوراً ارسال می‌شود و بعد پیام حداکثر هر stream_edit_interval ثانیه
+        (محدودیت ویرایش تلگرام) با متن جدید ویرایش می‌شود.
+        
+        Returns:
+            متن کامل پاسخ، یا None اگر هیچ متنی تولید نشد
+        """
+        edit_interval = self.settings.get('stream_edit_interval', 1.0)
+        min_new_chars = self.settings.get('stream_min_chars', 20)
+        
+        start_time = time.monotonic()
+        reply = None
+        text = ''
+        shown = ''
+        last_edit = 0.0
+        
+        async for chunk in self.api_manager.generate_stream(prompt):
+            text += chunk
+            visible = text.strip()[:MAX_MESSAGE_LENGTH]
+            if not visible:
+                continue
+            
+            now = time.monotonic()
+            if reply is None:
+                reply = await event.respond(visible)
+                shown = visible
+                last_edit = now
+                
+                self.stats['streamed_replies'] += 1
+                self.stats['avg_first_chunk_time'] += (
+                    (now - start_time - self.stats['avg_first_chunk_time']) / self.stats['streamed_replies']
+                )
+            elif now - last_edit >= edit_interval and len(visible) - len(shown) >= min_new_chars:
+                await self._edit_reply(reply, visible)
+                shown = visible
+                last_edit = now
+        
+        if reply is None:
+            return None
+        
+        final = text.strip()[:MAX_MESSAGE_LENGTH]
+        if final != shown:
+            await self._edit_reply(reply, final)
+        
+        return text.strip()
+    
+    async def _edit_reply(self, reply: Message, text: str):
+        """ویرایش پیام در حال ارسال"""
+        try:
+            await reply.edit(text)
+            self.stats['stream_edits'] += 1
+        except Exception as e:
+            logger.debug(f"Failed to edit streamed reply: {e}")
+    
     async def _log_message_to_sheets(self, message: Message, sender, chat):
         """ثبت پیام در sheets"""
         try:
@@ -192,7 +332,10 @@ class TelegramSystemV2:
             for channel_key, channel_id in self.channels.items():
                 if channel_id:
                     try:
-                        entity = await self.client.get_entity(int(channel_id))
+                        peer_id = int(channel_id)
+                        entity = await self.entity_cache.get(
+                            peer_id, lambda: self.client.get_entity(peer_id)
+                        )
                         # به‌روزرسانی در sheets
                         # در واقعیت باید append یا update کنیم
                         logger.debug(f"   ✅ Synced channel: {channel_key}")
@@ -201,6 +344,16 @@ class TelegramSystemV2:
         except Exception as e:
             logger.debug(f"Failed to sync channels: {e}")
     
+    def _configured_peer_ids(self) -> List[int]:
+        """شناسه کانال‌ها و گروه‌های تنظیم شده"""
+        peer_ids = []
+        for peer_id in [*self.channels.values(), *self.groups.values()]:
+            try:
+                peer_ids.append(int(peer_id))
+            except (TypeError, ValueError):
+                continue
+        return peer_ids
+    
     # متدهای عمومی
     
     async def send_to_channel(self, channel_key: str, message: str, **kwargs):
@@ -289,9 +442,17 @@ class TelegramSystemV2:
         
         return success
     
-    def get_conversation_history(self, user_id: int) -> List[Dict]:
-        """دریافت تاریخچه مکالمه با کاربر"""
-        return self.conversations.get(user_id, {}).get('messages', [])
+    async def shutdown(self):
+        """توقف صف پردازش و قطع اتصال"""
+        if self.pipeline:
+            await self.pipeline.stop()
+        if self.client:
+            await self.client.disconnect()
+        self.conversations.close()
+    
+    def get_conversation_history(self, user_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """دریافت تاریخچه مکالمه با کاربر (در صورت نیاز از دیسک بارگذاری می‌شود)"""
+        return self.conversations.history(user_id, limit)
     
     def get_stats(self) -> Dict:
         """آمار سیستم تلگرام"""
@@ -299,7 +460,12 @@ class TelegramSystemV2:
             'active_conversations': len(self.conversations),
             'saved_messages': len(self.saved_messages),
             'monitored_channels': len(self.channels),
-            'monitored_groups': len(self.groups)
+            'monitored_groups': len(self.groups),
+            'pipeline': self.pipeline.get_stats() if self.pipeline else None,
+            'entity_cache': self.entity_cache.get_stats(),
+            'conversations': self.conversations.get_stats(),
+            'prompt_builder': self.prompt_builder.get_stats(),
+            **self.stats
         }
 
 
@@ -5,9 +5,12 @@ Security Manager - مدیریت امنیت
 import hashlib
 import hmac
 import secrets
+import sqlite3
 import time
 import logging
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 import json
 
@@ -77,66 +80,248 @@ class SecurityManager:
         return suspicious
 
 
+class MemoryRateStore:
+    """
+    حالت rate limiter در حافظه
+    
+    کاربران به ترتیب آخرین فعالیت نگهداری می‌شوند تا کاربران بیکار با هزینه O(1)
+    از ابتدای صف حذف شوند.
+    """
+    
+    def __init__(self, idle_ttl: float = 7200, max_users: int = 100000):
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self._states: 'OrderedDict[int, list]' = OrderedDict()  # {user_id: [last_seen, *windows]}
+        self.evictions = 0
+    
+    def update(self, user_id: int, now: float, func: Callable[[Optional[list], float], tuple]):
+        """اجرای func روی حالت کاربر و ذخیره حالت جدید - func(state, now) -> (state, result)"""
+        entry = self._states.get(user_id)
+        state, result = func(entry[1:] if entry is not None else None, now)
+        
+        self._states[user_id] = [now, *state]
+        self._states.move_to_end(user_id)
+        self._evict(now)
+        return result
+    
+    def peek(self, user_id: int, now: float, func: Callable[[Optional[list], float], tuple]):
+        """اجرای func روی کپی حالت کاربر بدون ذخیره (کاربر جدید ساخته نمی‌شود)"""
+        entry = self._states.get(user_id)
+        return func(entry[1:] if entry is not None else None, now)[1]
+    
+    def _evict(self, now: float):
+        cutoff = now - self.idle_ttl
+        while self._states:
+            user_id, entry = next(iter(self._states.items()))
+            if entry[0] >= cutoff and len(self._states) <= self.max_users:
+                break
+            del self._states[user_id]
+            self.evictions += 1
+    
+    def __len__(self) -> int:
+        return len(self._states)
+    
+    def close(self):
+        self._states.clear()
+
+
+class SQLiteRateStore:
+    """
+    حالت rate limiter در یک فایل SQLite محلی - مشترک بین چند process
+    
+    هر بررسی یک تراکنش BEGIN IMMEDIATE است، پس خواندن و نوشتن حالت یک کاربر اتمی است؛
+    خواندن بدون تغییر (peek) یک SELECT ساده است و قفل نوشتن نمی‌گیرد.
+    بررسی‌ها روی event loop اجرا می‌شوند، پس انتظار برای قفل فایل کوتاه است (busy_timeout) و
+    با قفل بودن فایل sqlite3.OperationalError بالا می‌رود تا RateLimiter اجازه دهد (fail-open).
+    """
+    
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        user_id TEXT PRIMARY KEY,
+        last_seen REAL NOT NULL,
+        state TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_rate_limits_last_seen ON rate_limits (last_seen);
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        idle_ttl: float = 7200,
+        evict_every: int = 1000,
+        busy_timeout: float = 0.05
+    ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.idle_ttl = idle_ttl
+        self.evict_every = evict_every
+        self.evictions = 0
+        self._updates = 0
+        
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+    
+    def update(self, user_id: int, now: float, func: Callable[[Optional[list], float], tuple]):
+        """اجرای func روی حالت کاربر در یک تراکنش"""
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT state FROM rate_limits WHERE user_id = ?', (str(user_id),)
+            ).fetchone()
+            state, result = func(json.loads(row[0]) if row else None, now)
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_limits (user_id, last_seen, state) VALUES (?, ?, ?)',
+                (str(user_id), now, json.dumps(state))
+            )
+            
+            self._updates += 1
+            if self._updates % self.evict_every == 0:
+                self.evictions += conn.execute(
+                    'DELETE FROM rate_limits WHERE last_seen < ?', (now - self.idle_ttl,)
+                ).rowcount
+            
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+    
+    def peek(self, user_id: int, now: float, func: Callable[[Optional[list], float], tuple]):
+        """اجرای func روی حالت کاربر بدون تراکنش نوشتن"""
+        row = self._conn.execute(
+            'SELECT state FROM rate_limits WHERE user_id = ?', (str(user_id),)
+        ).fetchone()
+        return func(json.loads(row[0]) if row else None, now)[1]
+    
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
+    
+    def close(self):
+        self._conn.close()
+
+
 class RateLimiter:
-    """محدودسازی نرخ درخواست"""
+    """
+    محدودسازی نرخ درخواست با sliding window counter
+    
+    برای هر پنجره (دقیقه و ساعت) فقط شمارش پنجره جاری و قبلی نگهداری می‌شود و تعداد
+    درخواست‌های بازه لغزان با وزن‌دهی خطی پنجره قبلی تخمین زده می‌شود - هر بررسی O(1) است.
+    """
     
     def __init__(self, config: Dict):
         self.enabled = config.get('enabled', True)
         self.max_per_minute = config.get('max_requests_per_minute', 60)
         self.max_per_hour = config.get('max_requests_per_hour', 1000)
         
-        self.minute_counts = {}  # {user_id: [(timestamp, count)]}
-        self.hour_counts = {}
+        # (نام، طول پنجره، حداکثر)
+        self.windows = (
+            ('minute', 60, self.max_per_minute),
+            ('hour', 3600, self.max_per_hour)
+        )
+        
+        # حالت کاربر بعد از دو پنجره کامل بیکاری صفر است و حذف آن اثری ندارد
+        idle_ttl = config.get('idle_ttl', 2 * max(window for _, window, _ in self.windows))
+        store_path = config.get('store_path')
+        if store_path:
+            self.store = SQLiteRateStore(
+                store_path,
+                idle_ttl=idle_ttl,
+                busy_timeout=config.get('store_busy_timeout', 0.05)
+            )
+        else:
+            self.store = MemoryRateStore(idle_ttl=idle_ttl, max_users=config.get('max_users', 100000))
+        
+        self.stats = {
+            'allowed': 0,
+            'limited': 0,
+            'store_errors': 0
+        }
     
     def check(self, user_id: int) -> bool:
         """بررسی آیا کاربر از حد مجاز رد نشده"""
         if not self.enabled:
             return True
         
-        now = time.time()
-        
-        # بررسی per minute
-        minute_count = self._get_count(user_id, now, 60, self.minute_counts)
-        if minute_count >= self.max_per_minute:
-            logger.warning(f"⚠️ Rate limit exceeded (per minute) for user {user_id}")
-            return False
+        try:
+            exceeded = self.store.update(user_id, time.time(), self._hit)
+        except sqlite3.OperationalError as e:
+            # store مشترک قفل است - به جای معطل کردن event loop درخواست اجازه می‌گیرد
+            self.stats['store_errors'] += 1
+            logger.warning(f"⚠️ Rate limit store unavailable, allowing user {user_id}: {e}")
+            exceeded = None
         
-        # بررسی per hour
-        hour_count = self._get_count(user_id, now, 3600, self.hour_counts)
-        if hour_count >= self.max_per_hour:
-            logger.warning(f"⚠️ Rate limit exceeded (per hour) for user {user_id}")
+        if exceeded:
+            self.stats['limited'] += 1
+            logger.warning(f"⚠️ Rate limit exceeded (per {exceeded}) for user {user_id}")
             return False
         
-        # اضافه کردن request جدید
-        self._add_request(user_id, now)
-        
+        self.stats['allowed'] += 1
         return True
     
     def get_count(self, user_id: int) -> int:
-        """دریافت تعداد درخواست‌ها در دقیقه اخیر"""
-        now = time.time()
-        return self._get_count(user_id, now, 60, self.minute_counts)
-    
-    def _get_count(self, user_id: int, now: float, window: int, counts_dict: Dict) -> int:
-        """محاسبه تعداد درخواست‌ها در بازه زمانی"""
-        if user_id not in counts_dict:
+        """دریافت تعداد (تخمینی) درخواست‌ها در دقیقه اخیر (بدون تغییر حالت)"""
+        try:
+            return self.store.peek(user_id, time.time(), self._minute_count)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ Rate limit store unavailable: {e}")
             return 0
+    
+    def _hit(self, state: Optional[list], now: float) -> tuple:
+        """ثبت یک درخواست اگر هیچ پنجره‌ای پر نباشد - نام پنجره پر شده یا None"""
+        state, estimates = self._roll(state, now)
+        
+        for index, (name, _, limit) in enumerate(self.windows):
+            if estimates[index] >= limit:
+                return state, name
+        
+        for index in range(len(self.windows)):
+            state[index * 3 + 1] += 1
+        return state, None
+    
+    def _minute_count(self, state: Optional[list], now: float) -> tuple:
+        state, estimates = self._roll(state, now)
+        return state, int(estimates[0])
+    
+    def _roll(self, state: Optional[list], now: float) -> tuple:
+        """
+        جلو بردن پنجره‌ها تا زمان now
         
-        # حذف request های قدیمی
-        cutoff = now - window
-        counts_dict[user_id] = [
-            (ts, count) for ts, count in counts_dict[user_id]
-            if ts > cutoff
-        ]
+        state برای هر پنجره [شروع پنجره جاری، شمارش جاری، شمارش قبلی] است.
+        """
+        if state is None:
+            state = []
+            for _ in self.windows:
+                state.extend((now, 0, 0))
         
-        return sum(count for _, count in counts_dict[user_id])
-    
-    def _add_request(self, user_id: int, timestamp: float):
-        """اضافه کردن درخواست جدید"""
-        for counts_dict in [self.minute_counts, self.hour_counts]:
-            if user_id not in counts_dict:
-                counts_dict[user_id] = []
-            counts_dict[user_id].append((timestamp, 1))
+        estimates = []
+        for index, (_, window, _) in enumerate(self.windows):
+            offset = index * 3
+            start, current, previous = state[offset:offset + 3]
+            
+            elapsed = int((now - start) // window)
+            if elapsed > 0:
+                previous = current if elapsed == 1 else 0
+                current = 0
+                start += elapsed * window
+                state[offset:offset + 3] = [start, current, previous]
+            
+            estimates.append(previous * (1.0 - (now - start) / window) + current)
+        
+        return state, estimates
+    
+    def get_stats(self) -> Dict:
+        """آمار rate limiter"""
+        return {
+            **self.stats,
+            'tracked_users': len(self.store),
+            'evictions': self.store.evictions
+        }
+    
+    def close(self):
+        """بستن store"""
+        self.store.close()
 
 
 class AccessControl:
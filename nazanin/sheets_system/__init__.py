@@ -24,6 +24,12 @@ from nazanin.sheets_system.initial_data import (
 
 from nazanin.sheets_system.initialization_manager import InitializationManager
 
+from nazanin.sheets_system.search_index import (
+    InvertedIndex,
+    SheetSearchIndex,
+    normalize_persian
+)
+
 __all__ = [
     'SPREADSHEET_STRUCTURE',
     'get_all_spreadsheet_names',
@@ -31,5 +37,8 @@ __all__ = [
     'get_summary',
     'get_initial_data',
     'get_spreadsheet_initial_data',
-    'InitializationManager'
+    'InitializationManager',
+    'InvertedIndex',
+    'SheetSearchIndex',
+    'normalize_persian'
 ]
@@ -0,0 +1,220 @@
+"""
+Search Index - ایندکس معکوس جستجوی متن
+Persian-aware inverted index with BM25 ranking
+
+- یکسان‌سازی ی/ي، ک/ك، حذف نیم‌فاصله، اعراب و کشیده، تبدیل ارقام فارسی/عربی
+- به‌روزرسانی افزایشی با اضافه شدن ردیف‌های جدید
+- رتبه‌بندی BM25 و برگرداندن top-k
+"""
+
+import heapq
+import logging
+import math
+import re
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from nazanin.utils.persian_text import normalize_persian
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """تبدیل متن به توکن‌های نرمال‌شده"""
+    return _TOKEN.findall(normalize_persian(text))
+
+
+class InvertedIndex:
+    """ایندکس معکوس با رتبه‌بندی BM25"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._doc_terms: Dict[Hashable, Dict[str, int]] = {}
+        self._doc_lengths: Dict[Hashable, int] = {}
+        self._payloads: Dict[Hashable, Any] = {}
+        self._total_length = 0
+
+    def add(self, doc_id: Hashable, text: str, payload: Any = None):
+        """اضافه کردن (یا جایگزینی) یک سند"""
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+
+        terms: Dict[str, int] = {}
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0) + 1
+
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = length
+        self._payloads[doc_id] = payload
+        self._total_length += length
+
+    def remove(self, doc_id: Hashable):
+        """حذف یک سند"""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+        self._payloads.pop(doc_id, None)
+
+    def clear(self):
+        """پاک کردن کل ایندکس"""
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_lengths.clear()
+        self._payloads.clear()
+        self._total_length = 0
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[Any, float]]:
+        """
+        جستجوی BM25
+
+        Returns:
+            لیست (payload, score) به ترتیب امتیاز
+        """
+        doc_count = len(self._doc_lengths)
+        if not doc_count:
+            return []
+
+        avg_length = self._total_length / doc_count or 1.0
+        scores: Dict[Hashable, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+
+            df = len(postings)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self._payloads[doc_id], score) for doc_id, score in top]
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._doc_lengths
+
+    def get_stats(self) -> Dict:
+        """آمار ایندکس"""
+        return {
+            'documents': len(self._doc_lengths),
+            'terms': len(self._postings),
+            'avg_length': self._total_length / len(self._doc_lengths) if self._doc_lengths else 0
+        }
+
+
+class SheetSearchIndex:
+    """
+    ایندکس جستجوی یک sheet
+
+    هر جستجو داده را از get_sheet_data می‌گیرد (معمولاً از cache)؛ فقط وقتی لیست ردیف‌ها عوض
+    شده باشد، ردیف‌های جدید، تغییر کرده یا حذف شده دوباره ایندکس می‌شوند.
+    """
+
+    def __init__(self, spreadsheet_name: str, sheet_name: str, fields: Optional[List[str]] = None):
+        """
+        Args:
+            fields: ستون‌هایی که ایندکس می‌شوند (None یعنی همه ستون‌ها)
+        """
+        self.spreadsheet_name = spreadsheet_name
+        self.sheet_name = sheet_name
+        self.fields = fields
+        self.index = InvertedIndex()
+
+        self._records: List[Dict] = []
+        self._source: Optional[List[Dict]] = None  # آخرین لیستی که manager برگرداند
+
+        self.syncs = 0
+        self.reindexed_rows = 0
+
+    def sync(self, records: List[Dict]) -> int:
+        """
+        هماهنگ کردن ایندکس با ردیف‌های فعلی sheet
+
+        Returns:
+            تعداد ردیف‌های ایندکس‌شده دوباره
+        """
+        previous = self._records
+        changed = 0
+
+        for row_index, record in enumerate(records):
+            if row_index < len(previous):
+                old = previous[row_index]
+                if record is old or record == old:
+                    continue
+            self.index.add(row_index, self._document_text(record), record)
+            changed += 1
+
+        # ردیف‌های حذف شده از انتها
+        for row_index in range(len(records), len(previous)):
+            self.index.remove(row_index)
+            changed += 1
+
+        # کپی سطحی: لیستی که فراخوان داده ممکن است بعداً تغییر کند
+        self._records = list(records)
+        self.syncs += 1
+        self.reindexed_rows += changed
+        return changed
+
+    async def refresh(self, manager):
+        """
+        همگام‌سازی با داده فعلی manager
+
+        داده همیشه از get_sheet_data خوانده می‌شود تا TTL و stale-while-revalidate cache و
+        ویرایش‌های مستقیم در Google Sheets رعایت شوند؛ اگر همان لیست قبلی برگردد sync انجام
+        نمی‌شود. با خطای خواندن ایندکس قبلی حفظ می‌شود، ولی sheet خالی ایندکس را خالی می‌کند.
+        """
+        try:
+            records = await manager.get_sheet_data(
+                self.spreadsheet_name, self.sheet_name, raise_errors=True
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Keeping previous index for {self.spreadsheet_name}/{self.sheet_name}: {e}")
+            return
+
+        if records is self._source:
+            return
+
+        self.sync(records)
+        self._source = records
+
+    async def search(self, manager, query: str, limit: int = 10) -> List[Tuple[Dict, float]]:
+        """جستجو پس از همگام‌سازی با داده فعلی manager"""
+        await self.refresh(manager)
+        return self.index.search(query, limit)
+
+    def _document_text(self, record: Dict) -> str:
+        if self.fields is None:
+            values = record.values()
+        else:
+            values = (record.get(field, '') for field in self.fields)
+        return ' '.join(str(value) for value in values)
+
+    def get_stats(self) -> Dict:
+        """آمار ایندکس sheet"""
+        return {
+            **self.index.get_stats(),
+            'syncs': self.syncs,
+            'reindexed_rows': self.reindexed_rows
+        }
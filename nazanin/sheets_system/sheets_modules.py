@@ -6,7 +6,9 @@ Sheets Modules - ماژول‌های مدیریت Sheets
 import asyncio
 import logging
 from typing import Dict, List, Any, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from nazanin.sheets_system.search_index import SheetSearchIndex, tokenize
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,12 @@ class SheetsMemoryModule:
     def __init__(self, sheets_manager):
         self.manager = sheets_manager
         self.name = "Memory Module"
+        
+        # ایندکس جستجو (با اضافه شدن حافظه‌های جدید به‌روز می‌شود)
+        self.long_term_index = SheetSearchIndex(
+            'MEMORY_SYSTEM', 'Long_Term_Memory',
+            fields=['content', 'category']
+        )
     
     async def store_memory(self, memory_type: str, content: str, importance: float = 0.5) -> bool:
         """
@@ -55,16 +63,25 @@ class SheetsMemoryModule:
             return False
     
     async def retrieve_memories(self, query: str, limit: int = 10) -> List[Dict]:
-        """جستجو و بازیابی حافظه‌ها"""
+        """
+        جستجو و بازیابی حافظه‌ها (مرتب بر اساس امتیاز BM25)
+        
+        query بدون کلمه قابل ایندکس (مثلاً فقط علامت) با query_sheet جستجو می‌شود.
+        """
         memories = []
         
         try:
             # جستجو در Long_Term_Memory
-            data = await self.manager.get_sheet_data('MEMORY_SYSTEM', 'Long_Term_Memory')
+            if not tokenize(query):
+                return await self.manager.query_sheet(
+                    'MEMORY_SYSTEM', 'Long_Term_Memory',
+                    contains=query,
+                    limit=limit,
+                    newest_first=True
+                )
             
-            for row in data[:limit]:
-                if query.lower() in str(row).lower():
-                    memories.append(row)
+            results = await self.long_term_index.search(self.manager, query, limit)
+            memories = [row for row, score in results]
             
         except Exception as e:
             logger.error(f"Error retrieving memories: {e}")
@@ -147,7 +164,8 @@ class SheetsAnalyticsModule:
     async def get_stats_summary(self, days: int = 7) -> Dict:
         """دریافت خلاصه آمار"""
         try:
-            data = await self.manager.get_sheet_data('ANALYTICS_DATA', 'Daily_Stats')
+            since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+            data = await self.manager.query_sheet('ANALYTICS_DATA', 'Daily_Stats', since=since)
             
             # محاسبه خلاصه
             summary = {
@@ -158,13 +176,28 @@ class SheetsAnalyticsModule:
             }
             
             # پردازش داده‌ها
-            # ...
+            if data:
+                summary['total_messages'] = sum(self._to_number(row.get('messages')) for row in data)
+                summary['total_users'] = sum(self._to_number(row.get('users')) for row in data)
+                summary['avg_response_time'] = sum(
+                    self._to_number(row.get('avg_response_time')) for row in data
+                ) / len(data)
+                summary['avg_satisfaction'] = sum(
+                    self._to_number(row.get('satisfaction')) for row in data
+                ) / len(data)
             
             return summary
             
         except Exception as e:
             logger.error(f"Error getting stats summary: {e}")
             return {}
+    
+    @staticmethod
+    def _to_number(value: Any) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
 
 
 class SheetsContentModule:
@@ -261,6 +294,10 @@ class SheetsKnowledgeModule:
     def __init__(self, sheets_manager):
         self.manager = sheets_manager
         self.name = "Knowledge Module"
+        
+        # ایندکس‌های جستجو
+        self.facts_index = SheetSearchIndex('KNOWLEDGE_BASE', 'Facts')
+        self.definitions_index = SheetSearchIndex('KNOWLEDGE_BASE', 'Definitions')
     
     async def add_fact(self, category: str, fact: str, source: str, confidence: float) -> bool:
         """اضافه کردن حقیقت"""
@@ -281,22 +318,34 @@ class SheetsKnowledgeModule:
             logger.error(f"Error adding fact: {e}")
             return False
     
-    async def search_knowledge(self, query: str) -> List[Dict]:
-        """جستجو در پایگاه دانش"""
+    async def search_knowledge(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        جستجو در پایگاه دانش (top-k بر اساس امتیاز BM25)
+        
+        امتیاز BM25 دو ایندکس جدا قابل مقایسه نیست؛ امتیاز هر ایندکس به بهترین نتیجه همان
+        ایندکس تقسیم می‌شود (0 تا 1) و بعد نتایج ادغام می‌شوند.
+        """
         results = []
         
         try:
-            # جستجو در Facts
-            facts = await self.manager.get_sheet_data('KNOWLEDGE_BASE', 'Facts')
-            for fact in facts:
-                if query.lower() in str(fact).lower():
-                    results.append({'type': 'fact', 'data': fact})
+            if not tokenize(query):
+                for result_type, sheet_name in (('fact', 'Facts'), ('definition', 'Definitions')):
+                    rows = await self.manager.query_sheet('KNOWLEDGE_BASE', sheet_name, contains=query, limit=limit)
+                    results.extend({'type': result_type, 'data': row} for row in rows)
+                return results[:limit]
+            
+            for result_type, index in (('fact', self.facts_index), ('definition', self.definitions_index)):
+                matches = await index.search(self.manager, query, limit)
+                top_score = matches[0][1] if matches else 0.0
+                for row, score in matches:
+                    results.append({
+                        'type': result_type,
+                        'data': row,
+                        'score': score / top_score if top_score else 0.0
+                    })
             
-            # جستجو در Definitions
-            definitions = await self.manager.get_sheet_data('KNOWLEDGE_BASE', 'Definitions')
-            for definition in definitions:
-                if query.lower() in str(definition).lower():
-                    results.append({'type': 'definition', 'data': definition})
+            results.sort(key=lambda result: result['score'], reverse=True)
+            results = results[:limit]
             
         except Exception as e:
             logger.error(f"Error searching knowledge: {e}")
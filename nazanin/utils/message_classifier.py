@@ -7,9 +7,11 @@ import asyncio
 import logging
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
+import hashlib
 import json
 import re
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +47,221 @@ class MessagePattern:
         return score
 
 
+def _trie_regex(words: List[str]) -> str:
+    """regex درخت‌وار (trie) برای مجموعه کلمات - در هر موقعیت طولانی‌ترین کلمه تطبیق می‌خورد"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class CompiledClassifier:
+    """
+    موتور دسته‌بندی کامپایل شده
+    
+    به جای جستجوی جداگانه هر کلمه کلیدی و هر regex، متن دو بار پیمایش می‌شود:
+    - همه کلمات کلیدی و کلمات احساسی با یک regex درخت‌وار روی متن کوچک‌شده
+    - همه الگوهای regex و پرچم‌های متادیتا با یک tokenizer روی متن اصلی
+    هزینه هر کاراکتر مستقل از تعداد دسته‌ها و کلمات کلیدی است.
+    """
+    
+    # regex های داخلی دسته‌ها و ویژگی معادل آن‌ها در tokenizer
+    REGEX_FEATURES = {
+        r'\?$': 'question_mark_end',
+        r'^(why|how|what|when|where|who)\s': 'question_word_start',
+        r'\b[A-Z]{2,}\b': 'abbreviation',
+        r'```[\s\S]*?```': 'code_block',
+        r'!!!+': 'exclamations',
+        r'[A-Z]{5,}': 'caps_run'
+    }
+    # توجه: [A-Z] با IGNORECASE سه حرف غیر ASCII (ı، ſ، K) را هم می‌پذیرد که اینجا در نظر گرفته نمی‌شوند
+    
+    TOKENS = re.compile(
+        r'(?P<latin>[A-Za-z]+)'
+        r'|(?P<persian>[\u0600-\u06FF]+)'
+        r'|(?P<emoji>[\U0001F600-\U0001F64F])'
+        r'|(?P<backticks>```)'
+        r'|(?P<exclamations>!!!)'
+        r'|(?P<mention>@(?=\w))'
+        r'|(?P<hashtag>\#(?=\w))'
+        r'|(?P<question_mark_end>\?$)'
+    )
+    QUESTION_START = re.compile(r'(why|how|what|when|where|who)\s', re.IGNORECASE)
+    
+    def __init__(self, patterns: Dict[str, 'MessagePattern'], sentiment_words: Dict[str, List[str]]):
+        # ترتیب دسته‌ها (در امتیاز برابر، دسته اول انتخاب می‌شود)
+        self.categories = list(patterns)
+        
+        # کلمه (کوچک‌شده) -> [(دسته یا احساس، وزن)]
+        self.keyword_targets: Dict[str, List[Tuple[str, float]]] = {}
+        for cat_id, pattern in patterns.items():
+            for keyword in pattern.keywords:
+                self.keyword_targets.setdefault(keyword.lower(), []).append((cat_id, pattern.weight))
+        for sentiment, words in sentiment_words.items():
+            for word in words:
+                self.keyword_targets.setdefault(word.lower(), []).append((sentiment, 1.0))
+        
+        words = [word for word in self.keyword_targets if word]
+        self.keywords = re.compile(_trie_regex(words)) if words else None
+        
+        # کلمات کوتاه‌تری که پیشوند کلمه تطبیق‌خورده هستند در همان موقعیت هم وجود دارند
+        self.prefixes = {
+            word: [other for other in words if word.startswith(other)]
+            for word in words
+        }
+        
+        # regex های هر دسته: ویژگی tokenizer یا (برای regex های افزوده شده) جستجوی مستقیم
+        self.regex_features: Dict[str, List[Tuple[str, float]]] = {}
+        self.extra_regexes: List[Tuple[str, Any, float]] = []
+        for cat_id, pattern in patterns.items():
+            for regex in pattern.regex_patterns:
+                feature = self.REGEX_FEATURES.get(regex.pattern) if regex.flags & re.IGNORECASE else None
+                if feature:
+                    self.regex_features.setdefault(feature, []).append((cat_id, pattern.weight * 1.5))
+                else:
+                    self.extra_regexes.append((cat_id, regex, pattern.weight * 1.5))
+    
+    def match_keywords(self, text: str) -> set:
+        """کلمات کلیدی موجود در متن"""
+        found = set()
+        if self.keywords is None:
+            return found
+        
+        # جستجو از موقعیت بعد از شروع هر تطبیق تا کلمات هم‌پوشان هم پیدا شوند
+        text = text.lower()
+        search = self.keywords.search
+        match = search(text)
+        while match is not None:
+            found.update(self.prefixes[match.group()])
+            match = search(text, match.start() + 1)
+        return found
+    
+    def scan_features(self, text: str) -> Dict[str, Any]:
+        """پرچم‌ها و شمارش حروف در یک پیمایش"""
+        flags = {
+            'emoji': False,
+            'url': False,
+            'mention': False,
+            'hashtag': False,
+            'exclamations': False,
+            'question_mark_end': False
+        }
+        latin_chars = persian_chars = backticks = 0
+        abbreviation = caps_run = False
+        length = len(text)
+        
+        for match in self.TOKENS.finditer(text):
+            kind = match.lastgroup
+            start, end = match.span()
+            if kind == 'latin':
+                run = end - start
+                latin_chars += run
+                if run >= 5:
+                    caps_run = True
+                if (
+                    run >= 2 and not abbreviation
+                    and (start == 0 or not _is_word_char(text[start - 1]))
+                    and (end == length or not _is_word_char(text[end]))
+                ):
+                    abbreviation = True
+                if text.startswith('://', end) and (
+                    text.endswith('http', start, end) or text.endswith('https', start, end)
+                ):
+                    flags['url'] = True
+            elif kind == 'persian':
+                persian_chars += end - start
+            elif kind == 'backticks':
+                backticks += 1
+            else:
+                flags[kind] = True
+        
+        return {
+            **flags,
+            'latin_chars': latin_chars,
+            'persian_chars': persian_chars,
+            'abbreviation': abbreviation,
+            'caps_run': caps_run,
+            'code_block': backticks >= 2,
+            'question_word_start': self.QUESTION_START.match(text) is not None
+        }
+    
+    def scan(self, text: str) -> Tuple[Dict[str, float], Dict[str, int], Dict[str, Any]]:
+        """
+        امتیاز همه دسته‌ها، شمارش کلمات احساسی و ویژگی‌های متن
+        
+        Returns:
+            (scores, sentiment_counts, features)
+        """
+        scores: Dict[str, float] = {}
+        sentiment_counts = {'positive': 0, 'negative': 0}
+        
+        for keyword in self.match_keywords(text):
+            for target, weight in self.keyword_targets[keyword]:
+                if target in sentiment_counts:
+                    sentiment_counts[target] += 1
+                else:
+                    scores[target] = scores.get(target, 0.0) + weight
+        
+        features = self.scan_features(text)
+        for feature, targets in self.regex_features.items():
+            if features[feature]:
+                for cat_id, weight in targets:
+                    scores[cat_id] = scores.get(cat_id, 0.0) + weight
+        
+        for cat_id, regex, weight in self.extra_regexes:
+            if regex.search(text):
+                scores[cat_id] = scores.get(cat_id, 0.0) + weight
+        
+        scores = {cat_id: scores[cat_id] for cat_id in self.categories if cat_id in scores}
+        return scores, sentiment_counts, features
+
+
+class LearningRecord:
+    """رکورد فشرده یادگیری (به جای نتیجه کامل دسته‌بندی و context)"""
+    
+    __slots__ = ('message', 'category', 'confidence', 'priority', 'feedback', 'timestamp')
+    
+    def __init__(
+        self,
+        message: str,
+        category: str,
+        confidence: float,
+        priority: int,
+        feedback: Optional[str] = None
+    ):
+        self.message = message[:100]  # خلاصه
+        self.category = category
+        self.confidence = confidence
+        self.priority = priority
+        self.feedback = feedback
+        self.timestamp = datetime.now().timestamp()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'message': self.message,
+            'category': self.category,
+            'confidence': self.confidence,
+            'priority': self.priority,
+            'feedback': self.feedback,
+            'timestamp': datetime.fromtimestamp(self.timestamp).isoformat()
+        }
+
+
 class MessageClassifier:
     """سیستم دسته‌بندی پیشرفته پیام‌ها"""
     
@@ -102,10 +319,28 @@ class MessageClassifier:
         }
     }
     
-    def __init__(self):
+    # کلمات تحلیل احساسات
+    SENTIMENT_WORDS = {
+        'positive': ['good', 'great', 'awesome', 'perfect', 'love', 'عالی', 'خوب', '😊', '❤️', '👍'],
+        'negative': ['bad', 'terrible', 'awful', 'hate', 'بد', 'افتضاح', '😢', '😡', '👎']
+    }
+    
+    def __init__(self, cache_size: int = 1024, learning_size: int = 1000):
+        """
+        Args:
+            cache_size: حداکثر نتایج cache شده (پیام‌های تکراری مثل سلام دوباره دسته‌بندی نمی‌شوند)
+            learning_size: ظرفیت ring buffer رکوردهای یادگیری
+        """
         self.patterns = {}
-        self.learning_data = []
+        self.learning_data = deque(maxlen=learning_size)
         self.category_history = Counter()
+        self.engine: Optional[CompiledClassifier] = None
+        
+        # hash پیام نرمال‌شده (strip + casefold) -> بخش ثابت نتیجه (بدون timestamp)
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[bytes, Dict]' = OrderedDict()
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        
         self._initialize_patterns()
         
     def _initialize_patterns(self):
@@ -129,10 +364,38 @@ class MessageClassifier:
                 pattern.add_regex(r'[A-Z]{5,}')  # حروف بزرگ متوالی
             
             self.patterns[cat_id] = pattern
+        
+        self.compile()
+    
+    def compile(self):
+        """کامپایل دوباره موتور دسته‌بندی (بعد از تغییر کلمات کلیدی یا regex ها)"""
+        self.engine = CompiledClassifier(self.patterns, self.SENTIMENT_WORDS)
+        self._cache.clear()
     
     async def classify(self, message: str, context: Optional[Dict] = None) -> Dict[str, Any]:
         """دسته‌بندی پیام"""
-        
+        return self._classify(message, context)
+    
+    async def classify_batch(
+        self,
+        messages: List[str],
+        contexts: Optional[List[Optional[Dict]]] = None,
+        yield_every: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        دسته‌بندی دسته‌ای پیام‌ها (مثلاً پیام‌های عقب‌افتاده)
+        
+        هر yield_every پیام کنترل به event loop برگردانده می‌شود.
+        """
+        contexts = contexts or [None] * len(messages)
+        results = []
+        for index, (message, context) in enumerate(zip(messages, contexts)):
+            results.append(self._classify(message, context))
+            if yield_every and (index + 1) % yield_every == 0:
+                await asyncio.sleep(0)
+        return results
+    
+    def _classify(self, message: str, context: Optional[Dict] = None) -> Dict[str, Any]:
         if not message or len(message.strip()) == 0:
             return {
                 'primary_category': 'unknown',
@@ -141,12 +404,48 @@ class MessageClassifier:
                 'metadata': {}
             }
         
-        # محاسبه امتیاز هر دسته
-        scores = {}
-        for cat_id, pattern in self.patterns.items():
-            score = pattern.match_score(message)
-            if score > 0:
-                scores[cat_id] = score
+        # "سلام"، " سلام " و "Hello"/"hello" یک ورودی cache دارند؛ دسته‌بندی روی همان متن نرمال‌شده
+        # انجام می‌شود تا نتیجه فقط به کلید وابسته باشد
+        normalized = message.strip().casefold()
+        key = hashlib.blake2b(normalized.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_stats['hits'] += 1
+        else:
+            self.cache_stats['misses'] += 1
+            cached = self._compute(normalized)
+            self._cache[key] = cached
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        
+        primary = cached['primary_category']
+        self.category_history[primary] += 1
+        
+        # نسخه جدید برای هر فراخوان (نتیجه cache شده نباید تغییر کند)؛ طول از پیام اصلی
+        result = {
+            **cached,
+            'all_categories': dict(cached['all_categories']),
+            'metadata': {
+                **cached['metadata'],
+                'length': len(message),
+                'word_count': len(message.split()),
+                'timestamp': datetime.now().isoformat()
+            }
+        }
+        
+        # یادگیری
+        self.learning_data.append(
+            LearningRecord(message, primary, result['confidence'], result['priority'])
+        )
+        
+        return result
+    
+    def _compute(self, message: str) -> Dict[str, Any]:
+        """دسته‌بندی بدون cache (نتیجه بدون timestamp)"""
+        # امتیاز همه دسته‌ها و ویژگی‌های متن در یک پیمایش
+        scores, sentiment_counts, features = self.engine.scan(message)
+        scores = {cat: score for cat, score in scores.items() if score > 0}
         
         # نرمال‌سازی امتیازها
         if scores:
@@ -165,19 +464,15 @@ class MessageClassifier:
         metadata = {
             'length': len(message),
             'word_count': len(message.split()),
-            'has_emoji': bool(re.search(r'[\U0001F600-\U0001F64F]', message)),
-            'has_url': bool(re.search(r'https?://', message)),
-            'has_mention': bool(re.search(r'@\w+', message)),
-            'has_hashtag': bool(re.search(r'#\w+', message)),
-            'language': self._detect_language(message),
-            'sentiment': await self._analyze_sentiment(message),
-            'timestamp': datetime.now().isoformat()
+            'has_emoji': features['emoji'],
+            'has_url': features['url'],
+            'has_mention': features['mention'],
+            'has_hashtag': features['hashtag'],
+            'language': self._language_from_counts(features['persian_chars'], features['latin_chars']),
+            'sentiment': self._sentiment_from_counts(sentiment_counts)
         }
         
-        # ذخیره برای یادگیری
-        self.category_history[primary[0]] += 1
-        
-        result = {
+        return {
             'primary_category': primary[0],
             'primary_category_name': self.CATEGORIES.get(primary[0], {}).get('name', 'نامشخص'),
             'confidence': primary[1],
@@ -186,26 +481,15 @@ class MessageClassifier:
             'priority': self._calculate_priority(primary[0], metadata),
             'suggested_response_type': self._suggest_response_type(primary[0], metadata)
         }
-        
-        # یادگیری
-        self.learning_data.append({
-            'message': message[:100],  # خلاصه
-            'classification': result,
-            'context': context
-        })
-        
-        # محدود کردن حافظه
-        if len(self.learning_data) > 1000:
-            self.learning_data = self.learning_data[-500:]
-        
-        return result
     
     def _detect_language(self, text: str) -> str:
         """تشخیص زبان"""
+        features = self.engine.scan_features(text)
+        return self._language_from_counts(features['persian_chars'], features['latin_chars'])
+    
+    @staticmethod
+    def _language_from_counts(persian_chars: int, english_chars: int) -> str:
         # ساده: بر اساس حروف فارسی
-        persian_chars = len(re.findall(r'[\u0600-\u06FF]', text))
-        english_chars = len(re.findall(r'[a-zA-Z]', text))
-        
         if persian_chars > english_chars:
             return 'fa'
         elif english_chars > 0:
@@ -214,13 +498,13 @@ class MessageClassifier:
     
     async def _analyze_sentiment(self, text: str) -> str:
         """تحلیل احساسات ساده"""
-        positive_words = ['good', 'great', 'awesome', 'perfect', 'love', 'عالی', 'خوب', '😊', '❤️', '👍']
-        negative_words = ['bad', 'terrible', 'awful', 'hate', 'بد', 'افتضاح', '😢', '😡', '👎']
-        
-        text_lower = text.lower()
-        
-        pos_count = sum(1 for word in positive_words if word in text_lower)
-        neg_count = sum(1 for word in negative_words if word in text_lower)
+        _, sentiment_counts, _ = self.engine.scan(text)
+        return self._sentiment_from_counts(sentiment_counts)
+    
+    @staticmethod
+    def _sentiment_from_counts(sentiment_counts: Dict[str, int]) -> str:
+        pos_count = sentiment_counts['positive']
+        neg_count = sentiment_counts['negative']
         
         if pos_count > neg_count:
             return 'positive'
@@ -372,9 +656,10 @@ class MessageClassifier:
         """مثال‌های مشابه از تاریخچه"""
         category = classification['primary_category']
         
+        recent = list(islice(reversed(self.learning_data), 50))  # 50 تای اخیر
         similar = [
-            item for item in self.learning_data[-50:]  # 50 تای اخیر
-            if item['classification']['primary_category'] == category
+            record.to_dict() for record in reversed(recent)
+            if record.category == category
         ]
         
         return similar[:3]  # حداکثر 3 مثال
@@ -397,14 +682,17 @@ class MessageClassifier:
                 for word in important_words[:3]:  # حداکثر 3 کلمه
                     if word not in self.patterns[correct_cat].keywords:
                         self.patterns[correct_cat].keywords.append(word)
+                
+                self.compile()
         
         # ذخیره بازخورد
-        self.learning_data.append({
-            'message': message[:100],
-            'classification': classification,
-            'feedback': user_feedback,
-            'timestamp': datetime.now().isoformat()
-        })
+        self.learning_data.append(LearningRecord(
+            message,
+            classification.get('primary_category', 'unknown'),
+            classification.get('confidence', 0.0),
+            classification.get('priority', 5),
+            feedback=user_feedback.get('correct_category')
+        ))
         
         logger.info(f"✅ یادگیری از بازخورد: {user_feedback.get('correct_category', 'N/A')}")
     
@@ -417,6 +705,10 @@ class MessageClassifier:
             'category_distribution': dict(self.category_history),
             'most_common': self.category_history.most_common(5),
             'learning_samples': len(self.learning_data),
+            'cache': {
+                **self.cache_stats,
+                'entries': len(self._cache)
+            },
             'patterns_count': len(self.patterns)
         }
 
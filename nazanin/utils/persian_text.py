@@ -0,0 +1,33 @@
+"""
+Persian Text - یکسان‌سازی متن فارسی
+Persian/Arabic text normalisation shared by search, caching and classification
+
+- یکسان‌سازی ی/ي، ک/ك، حذف نیم‌فاصله، اعراب و کشیده، تبدیل ارقام فارسی/عربی
+"""
+
+import re
+
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ئ': 'ی',
+    'ك': 'ک',
+    'ۀ': 'ه',
+    'ة': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'ٱ': 'ا',
+    '\u200c': None,  # ZWNJ (نیم‌فاصله)
+    '\u200d': None,  # ZWJ
+    '\u0640': None,  # کشیده
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # ارقام عربی
+})
+
+_DIACRITICS = re.compile('[\u064B-\u065F\u0670]')
+
+
+def normalize_persian(text: str) -> str:
+    """یکسان‌سازی متن فارسی/عربی برای جستجو"""
+    text = _DIACRITICS.sub('', str(text).translate(_CHAR_MAP))
+    return text.lower()
@@ -0,0 +1,28 @@
+"""
+اسکریپت مقایسه سرعت مسیر ادغام‌شده مغز با مسیر جداگانه هر کورتکس
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from nazanin.brain.fused_inference import benchmark_fused_forward, benchmark_think_learn
+
+
+if __name__ == '__main__':
+    print("🧠 Fused vs per-cortex forward pass")
+    for rows, result in benchmark_fused_forward().items():
+        print(
+            f"  batch={rows:<4} per_cortex={result['per_cortex_ms']:.3f}ms "
+            f"fused={result['fused_ms']:.3f}ms speedup={result['speedup']:.2f}x "
+            f"max_error={result['max_abs_error']:.2e}"
+        )
+
+    print("🧠 think → learn cycles (process_complete pattern)")
+    result = benchmark_think_learn()
+    print(
+        f"  cycles={result['cycles']} per_cortex={result['per_cortex_s']:.3f}s "
+        f"fused={result['fused_s']:.3f}s speedup={result['speedup']:.2f}x "
+        f"rebuilds={result['rebuilds']} max_error={result['max_abs_error']:.2e}"
+    )
@@ -0,0 +1,8 @@
+"""
+pytest configuration - اضافه کردن ریشه پروژه به مسیر import
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,81 @@
+"""
+Tests for APIManagerV2 / AIProviderV2 - client های هر کلید و ادغام درخواست‌ها
+"""
+
+import asyncio
+import sys
+import types
+
+from nazanin.core.api_manager_v2 import AIProviderV2, APIManagerV2
+
+
+class FakeServiceClient:
+    def __init__(self, client_options=None):
+        self.client_options = client_options
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._client = None
+        self._async_client = None
+
+
+def _install_fake_genai(monkeypatch):
+    configured = []
+
+    genai = types.ModuleType('google.generativeai')
+    genai.GenerativeModel = FakeGenerativeModel
+    genai.configure = lambda **kwargs: configured.append(kwargs)
+
+    glm = types.ModuleType('google.ai.generativelanguage')
+    glm.GenerativeServiceClient = FakeServiceClient
+    glm.GenerativeServiceAsyncClient = FakeServiceClient
+
+    google = types.ModuleType('google')
+    google.generativeai = genai
+    google_ai = types.ModuleType('google.ai')
+    google_ai.generativelanguage = glm
+    google.ai = google_ai
+
+    monkeypatch.setitem(sys.modules, 'google', google)
+    monkeypatch.setitem(sys.modules, 'google.generativeai', genai)
+    monkeypatch.setitem(sys.modules, 'google.ai', google_ai)
+    monkeypatch.setitem(sys.modules, 'google.ai.generativelanguage', glm)
+    return configured
+
+
+def test_gemini_models_carry_their_own_key(monkeypatch):
+    configured = _install_fake_genai(monkeypatch)
+    provider = AIProviderV2('gemini', ['key-a', 'key-b'], 'gemini-pro')
+
+    model_a = provider._gemini_model('key-a')
+    model_b = provider._gemini_model('key-b')
+
+    assert provider._gemini_model('key-a') is model_a
+    assert model_a._client.client_options == {'api_key': 'key-a'}
+    assert model_a._async_client.client_options == {'api_key': 'key-a'}
+    assert model_b._async_client.client_options == {'api_key': 'key-b'}
+    # بدون state سراسری
+    assert configured == []
+
+
+async def test_coalescing_respects_request_options():
+    manager = APIManagerV2({'ai_apis': {'response_cache': {'enabled': False}}})
+    runs = []
+
+    async def fake_generate(prompt, preferred_provider, max_retries, mode, race, use_cache):
+        runs.append(mode)
+        await asyncio.sleep(0.01)
+        return f'{prompt}:{mode}'
+
+    manager._generate = fake_generate
+
+    results = await asyncio.gather(
+        manager.generate('hi', mode='race'),
+        manager.generate('hi', mode='race'),
+        manager.generate('hi', mode='sequential')
+    )
+
+    assert results == ['hi:race', 'hi:race', 'hi:sequential']
+    assert sorted(runs) == ['race', 'sequential']
@@ -0,0 +1,68 @@
+"""
+Tests for ConversationStore - حافظه محدود، spill دسته‌ای به SQLite و بارگذاری دوباره
+"""
+
+from datetime import datetime
+
+from nazanin.platforms.conversation_store import ConversationStore
+
+
+def _store(tmp_path, **kwargs):
+    kwargs.setdefault('max_resident', 2)
+    return ConversationStore(path=str(tmp_path / 'conversations.db'), **kwargs)
+
+
+def test_messages_are_bounded(tmp_path):
+    store = _store(tmp_path, max_messages=3)
+    for i in range(5):
+        store.append(1, {'text': str(i)})
+
+    assert [m['text'] for m in store.history(1)] == ['2', '3', '4']
+    assert [m['text'] for m in store.history(1, limit=2)] == ['3', '4']
+    store.close()
+
+
+def test_evicted_conversations_are_written_in_one_batch(tmp_path):
+    store = _store(tmp_path, spill_batch=3, spill_interval=3600)
+    for user_id in range(5):
+        store.append(user_id, {'text': f'hello {user_id}'})
+
+    # سه مکالمه بیرون رفتند و با هم در یک تراکنش نوشته شدند
+    stats = store.get_stats()
+    assert stats['resident'] == 2
+    assert stats['spilled'] == 3
+    assert stats['spill_commits'] == 1
+    assert stats['stored'] == 3
+    store.close()
+
+
+def test_pending_spill_is_rehydrated_without_disk(tmp_path):
+    store = _store(tmp_path, spill_batch=100, spill_interval=3600)
+    for user_id in range(3):
+        store.append(user_id, {'text': f'hello {user_id}', 'at': datetime(2024, 1, 1)})
+    assert store.get_stats()['pending_spills'] == 1
+
+    assert store.history(0) == [{'text': 'hello 0', 'at': datetime(2024, 1, 1)}]
+    assert store.get_stats()['spill_commits'] == 0
+    store.close()
+
+
+def test_conversations_survive_reopen(tmp_path):
+    store = _store(tmp_path)
+    store.append(7, {'text': 'persisted', 'at': datetime(2024, 1, 1)})
+    store.close()
+
+    reopened = _store(tmp_path)
+    assert 7 not in reopened
+    assert reopened.history(7) == [{'text': 'persisted', 'at': datetime(2024, 1, 1)}]
+    assert reopened.get_stats()['rehydrated'] == 1
+    reopened.close()
+
+
+def test_without_path_evicted_conversations_are_dropped():
+    store = ConversationStore(path=None, max_resident=1)
+    store.append(1, {'text': 'a'})
+    store.append(2, {'text': 'b'})
+
+    assert store.history(1) == []
+    assert store.get_stats()['dropped'] == 1
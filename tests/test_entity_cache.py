@@ -0,0 +1,108 @@
+"""
+Tests for EntityCache - TTL، LRU، ادغام درخواست‌های هم‌زمان و بارگذاری از پیش
+"""
+
+import asyncio
+
+import pytest
+
+from nazanin.platforms import entity_cache
+from nazanin.platforms.entity_cache import EntityCache
+
+
+class Clock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(entity_cache.time, 'time', fake)
+    return fake
+
+
+def _fetcher(value, calls):
+    async def fetch():
+        calls.append(value)
+        await asyncio.sleep(0.005)
+        return value
+    return fetch
+
+
+async def test_concurrent_lookups_fetch_once(clock):
+    cache = EntityCache()
+    calls = []
+
+    results = await asyncio.gather(*(cache.get(1, _fetcher('user', calls)) for _ in range(3)))
+
+    assert results == ['user'] * 3
+    assert calls == ['user']
+    assert await cache.get(1, _fetcher('other', calls)) == 'user'
+    assert cache.get_stats()['hits'] == 1
+
+
+async def test_entities_expire_after_ttl(clock):
+    cache = EntityCache(ttl=10)
+    calls = []
+    await cache.get(1, _fetcher('old', calls))
+
+    clock.now += 10
+    assert await cache.get(1, _fetcher('new', calls)) == 'new'
+    assert cache.get_stats()['expirations'] == 1
+
+
+async def test_failed_and_empty_fetches_are_not_cached(clock):
+    cache = EntityCache()
+
+    async def fail():
+        raise ConnectionError('flood wait')
+
+    with pytest.raises(ConnectionError):
+        await cache.get(1, fail)
+    assert await cache.get(1, _fetcher(None, [])) is None
+    assert len(cache) == 0
+    assert cache.get_stats()['fetch_errors'] == 1
+
+
+async def test_unknown_peer_is_fetched_without_caching(clock):
+    cache = EntityCache()
+    calls = []
+    await cache.get(None, _fetcher('x', calls))
+    await cache.get(None, _fetcher('x', calls))
+
+    assert len(calls) == 2
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = EntityCache(max_entries=2)
+    cache.put(1, 'a')
+    cache.put(2, 'b')
+    cache._lookup(1)
+    cache.put(3, 'c')
+
+    assert cache._lookup(2) is None
+    assert cache._lookup(1) == 'a'
+    assert cache.get_stats()['evictions'] == 1
+
+    cache.invalidate(1)
+    assert cache._lookup(1) is None
+
+
+async def test_prefetch_loads_entities_and_counts_errors(clock):
+    cache = EntityCache()
+
+    async def fetch(peer_id):
+        if peer_id == 3:
+            raise ValueError('no such channel')
+        return f'entity{peer_id}'
+
+    await cache.prefetch([1, 2, 2, 3], fetch)
+
+    assert len(cache) == 2
+    assert cache.get_stats()['prefetched'] == 2
+    assert cache.get_stats()['fetch_errors'] == 1
@@ -0,0 +1,92 @@
+"""
+Tests for FusedCortexEngine - برابری خروجی مسیر ادغام‌شده و جداگانه، قبل و بعد از یادگیری
+"""
+
+import numpy as np
+import pytest
+
+from nazanin.brain.deep_neural_brain import DeepNeuralBrain
+
+TOLERANCE = 1e-5
+
+
+def _twin_brains(seed: int = 0):
+    brains = []
+    for fused in (False, True):
+        np.random.seed(seed)
+        brains.append(DeepNeuralBrain(fused=fused))
+    return brains
+
+
+def _max_error(plain, fused, encoded):
+    reference, reference_integrated = plain._forward_cortexes(encoded, {})
+    outputs, integrated = fused._forward_cortexes(encoded, {})
+
+    assert reference.keys() == outputs.keys()
+    error = max(float(np.max(np.abs(reference[name] - outputs[name]))) for name in reference)
+    return max(error, float(np.max(np.abs(reference_integrated - integrated))))
+
+
+def test_fused_matches_per_cortex_forward():
+    plain, fused = _twin_brains()
+
+    encoded = fused._encode_input('hello world')
+    assert _max_error(plain, fused, encoded) < TOLERANCE
+
+    batch = fused._encode_batch([f'message {i}' for i in range(16)])
+    assert _max_error(plain, fused, batch) < TOLERANCE
+
+
+def test_fused_matches_per_cortex_after_learning():
+    plain, fused = _twin_brains()
+
+    for i in range(20):
+        message = f'message number {i}'
+        for brain in (plain, fused):
+            brain.think_sync(message)
+            brain.learn_sync({'input': message}, feedback=1.0)
+
+    encoded = fused._encode_input('probe')
+    assert _max_error(plain, fused, encoded) < TOLERANCE
+
+    batch = fused._encode_batch([f'probe {i}' for i in range(16)])
+    assert _max_error(plain, fused, batch) < TOLERANCE
+
+    assert fused.fused_engine.rebuilds == 1
+
+
+def test_think_learn_cycle_stays_on_fused_path():
+    plain, fused = _twin_brains()
+    engine = fused.fused_engine
+
+    fused.think_sync('hello')
+    assert engine.learn_sync(1.0)
+    # وزن‌های لایه اول بعد از یادگیری هنوز برش ماتریس ادغام‌شده‌اند
+    for cortex in fused.cortexes.values():
+        assert cortex.layers[0].weights.base is engine.first_weights
+
+    # بعد از عبور جداگانه کورتکس‌ها یادگیری به مسیر جداگانه برمی‌گردد
+    for cortex in fused.cortexes.values():
+        cortex.forward(fused._encode_input('hello'))
+    assert not engine.learn_sync(1.0)
+
+
+def test_replaced_layer_weights_trigger_rebuild():
+    plain, fused = _twin_brains()
+    for brain in (plain, fused):
+        layer = brain.cortexes['temporal'].layers[0]
+        layer.weights = layer.weights * 2
+
+    assert fused.fused_engine.refresh()
+    assert not fused.fused_engine.refresh()
+    assert _max_error(plain, fused, fused._encode_input('probe')) < TOLERANCE
+
+
+def test_think_results_match():
+    plain, fused = _twin_brains()
+
+    for message in ('first', 'second'):
+        expected = plain.think_sync(message)
+        actual = fused.think_sync(message)
+        assert actual['decision']['type'] == expected['decision']['type']
+        assert actual['decision']['confidence'] == pytest.approx(expected['decision']['confidence'], abs=TOLERANCE)
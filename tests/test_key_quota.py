@@ -0,0 +1,88 @@
+"""
+Tests for KeyQuota / TokenBucket - سطل‌های RPM/TPM و انتخاب کلید بر اساس headroom
+"""
+
+import pytest
+
+from nazanin.core import key_quota
+from nazanin.core.api_manager_v2 import AIProviderV2
+from nazanin.core.key_quota import KeyQuota, estimate_tokens
+
+
+class Clock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(key_quota.time, 'monotonic', fake)
+    return fake
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abcdefgh') == 2
+    assert estimate_tokens('سلام') == 2
+
+
+def test_rpm_bucket_refills_continuously(clock):
+    quota = KeyQuota(rpm=2)
+    quota.acquire()
+    quota.acquire()
+
+    assert not quota.can_acquire()
+    assert quota.wait_time() == pytest.approx(30.0)
+
+    clock.now += 30
+    assert quota.can_acquire()
+    assert quota.headroom() == pytest.approx(0.5)
+
+
+def test_tpm_reservation_is_settled_after_response(clock):
+    quota = KeyQuota(tpm=1000)
+    quota.acquire(600)
+    assert quota.can_acquire(400)
+    assert not quota.can_acquire(500)
+
+    # پاسخ کوتاه‌تر از تخمین بود - توکن‌های اضافه برمی‌گردند
+    quota.adjust(-300)
+    assert quota.can_acquire(700)
+
+
+def test_unlimited_quota_never_waits(clock):
+    quota = KeyQuota()
+    for _ in range(100):
+        quota.acquire(10_000)
+    assert quota.headroom() == 1.0
+    assert quota.wait_time(10_000) == 0.0
+
+
+def test_provider_prefers_key_with_most_headroom(clock):
+    provider = AIProviderV2('groq', ['a', 'b'], 'model', quota_config={'rpm': 4})
+
+    assert provider.get_next_key() == 'a'
+    assert provider.get_next_key() == 'b'
+    provider._quota('a').acquire()
+    assert provider.get_next_key() == 'b'
+
+
+def test_provider_per_key_limits_and_exhaustion(clock):
+    provider = AIProviderV2('groq', ['a', 'b'], 'model', quota_config={'rpm': 60})
+    provider.update_keys(['a', 'b'], key_limits={'a': {'rpm': 1}, 'b': {'rpm': 1}})
+
+    assert {provider.get_next_key(), provider.get_next_key()} == {'a', 'b'}
+    assert provider.get_next_key() is None
+    assert provider.quota_wait_time() == pytest.approx(60.0)
+
+
+async def test_acquire_key_gives_up_beyond_max_wait(clock):
+    provider = AIProviderV2('groq', ['a'], 'model', quota_config={'rpm': 1, 'max_wait': 2.0})
+
+    assert await provider.acquire_key() == 'a'
+    assert await provider.acquire_key() is None
+    assert provider.stats['quota_exhausted'] == 1
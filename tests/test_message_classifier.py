@@ -0,0 +1,52 @@
+"""
+Tests for MessageClassifier - cache نتایج با کلید نرمال‌شده و ring buffer یادگیری
+"""
+
+from nazanin.utils.message_classifier import MessageClassifier
+
+
+async def test_normalized_variants_share_one_cache_entry():
+    classifier = MessageClassifier()
+
+    first = await classifier.classify('Hello, how are you?')
+    second = await classifier.classify('  hello, HOW are you?  ')
+
+    assert classifier.cache_stats == {'hits': 1, 'misses': 1}
+    assert second['primary_category'] == first['primary_category']
+    # طول و تعداد کلمات از پیام اصلی
+    assert first['metadata']['length'] == len('Hello, how are you?')
+    assert second['metadata']['length'] == len('  hello, HOW are you?  ')
+    assert second['metadata']['word_count'] == 4
+
+
+async def test_cached_results_are_independent_copies():
+    classifier = MessageClassifier()
+
+    first = await classifier.classify('سلام')
+    first['all_categories']['changed'] = 1.0
+    first['metadata']['length'] = -1
+
+    second = await classifier.classify('سلام')
+    assert 'changed' not in second['all_categories']
+    assert second['metadata']['length'] == len('سلام')
+
+
+async def test_cache_is_bounded_and_cleared_on_compile():
+    classifier = MessageClassifier(cache_size=2)
+    for message in ('one', 'two', 'three'):
+        await classifier.classify(message)
+
+    assert classifier.get_statistics()['cache']['entries'] == 2
+    await classifier.classify('one')
+    assert classifier.cache_stats['hits'] == 0
+
+    classifier.compile()
+    assert classifier.get_statistics()['cache']['entries'] == 0
+
+
+async def test_learning_records_are_a_ring_buffer():
+    classifier = MessageClassifier(learning_size=3)
+    for i in range(5):
+        await classifier.classify(f'message {i}')
+
+    assert len(classifier.learning_data) == 3
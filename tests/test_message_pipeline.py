@@ -0,0 +1,157 @@
+"""
+Tests for MessagePipeline - ترتیب پیام‌های هر چت، مسیر اولویت‌دار و حذف پیام‌ها در صف پر
+"""
+
+import asyncio
+
+from nazanin.platforms.message_pipeline import NORMAL, PRIORITY, MessagePipeline
+
+
+async def _drain(pipeline: MessagePipeline, expected: int, processed: list):
+    for _ in range(200):
+        if len(processed) >= expected:
+            break
+        await asyncio.sleep(0.005)
+    await pipeline.stop()
+
+
+async def test_messages_of_one_chat_keep_order():
+    processed = []
+
+    async def handler(item):
+        await asyncio.sleep(0.001 * (item[1] % 3))
+        processed.append(item)
+
+    pipeline = MessagePipeline(handler, workers=4)
+    for i in range(10):
+        pipeline.submit('a', ('a', i))
+        pipeline.submit('b', ('b', i))
+    pipeline.start()
+    await _drain(pipeline, 20, processed)
+
+    for chat in ('a', 'b'):
+        assert [i for c, i in processed if c == chat] == list(range(10))
+
+
+async def test_priority_lane_is_served_first():
+    processed = []
+
+    async def handler(item):
+        processed.append(item)
+
+    pipeline = MessagePipeline(handler, workers=1)
+    for i in range(3):
+        pipeline.submit(f'group{i}', f'group{i}')
+    pipeline.submit('private', 'private', priority=True)
+    pipeline.start()
+    await _drain(pipeline, 4, processed)
+
+    assert processed[0] == 'private'
+
+
+async def test_priority_message_waits_for_earlier_messages_of_its_chat():
+    processed = []
+    active = set()
+
+    async def handler(item):
+        chat, _ = item
+        assert chat not in active
+        active.add(chat)
+        await asyncio.sleep(0.005)
+        active.discard(chat)
+        processed.append(item)
+
+    pipeline = MessagePipeline(handler, workers=4)
+    pipeline.start()
+    pipeline.submit('group', ('group', 0))
+    pipeline.submit('group', ('group', 1))
+    pipeline.submit('group', ('group', 2), priority=True)
+    await _drain(pipeline, 3, processed)
+
+    assert processed == [('group', 0), ('group', 1), ('group', 2)]
+
+
+async def test_chat_with_priority_message_jumps_other_chats():
+    processed = []
+
+    async def handler(item):
+        processed.append(item)
+
+    pipeline = MessagePipeline(handler, workers=1)
+    pipeline.submit('group0', 'group0')
+    pipeline.submit('group1', 'group1')
+    pipeline.submit('mention', 'before-mention')
+    pipeline.submit('mention', 'mention', priority=True)
+    assert pipeline.get_stats()[PRIORITY]['chats'] == 1
+    pipeline.start()
+    await _drain(pipeline, 4, processed)
+
+    assert processed == ['before-mention', 'mention', 'group0', 'group1']
+
+
+async def test_chats_are_served_round_robin():
+    processed = []
+
+    async def handler(item):
+        processed.append(item)
+
+    pipeline = MessagePipeline(handler, workers=1)
+    for i in range(3):
+        pipeline.submit('busy', f'busy{i}')
+    pipeline.submit('quiet', 'quiet0')
+    pipeline.start()
+    await _drain(pipeline, 4, processed)
+
+    assert processed.index('quiet0') == 1
+
+
+def test_full_lane_sheds_new_messages():
+    async def handler(item):
+        pass
+
+    pipeline = MessagePipeline(handler, max_pending=2, priority_max_pending=1)
+
+    assert pipeline.submit(1, 'a')
+    assert pipeline.submit(2, 'b')
+    assert not pipeline.submit(3, 'c')
+    assert pipeline.submit(4, 'd', priority=True)
+    assert not pipeline.submit(5, 'e', priority=True)
+
+    stats = pipeline.get_stats()
+    assert stats[NORMAL]['shed'] == 1
+    assert stats[PRIORITY]['shed'] == 1
+    assert stats[NORMAL]['pending'] == 2
+
+
+async def test_full_chat_drops_its_oldest_message():
+    processed = []
+
+    async def handler(item):
+        processed.append(item)
+
+    pipeline = MessagePipeline(handler, workers=1, max_per_chat=2)
+    for i in range(4):
+        assert pipeline.submit('chat', i)
+    assert pipeline.get_stats()[NORMAL]['shed'] == 2
+
+    pipeline.start()
+    await _drain(pipeline, 2, processed)
+    assert processed == [2, 3]
+
+
+async def test_handler_errors_do_not_stop_workers():
+    processed = []
+
+    async def handler(item):
+        if item == 'bad':
+            raise ValueError(item)
+        processed.append(item)
+
+    pipeline = MessagePipeline(handler, workers=1)
+    pipeline.submit('chat', 'bad')
+    pipeline.submit('chat', 'good')
+    pipeline.start()
+    await _drain(pipeline, 1, processed)
+
+    assert processed == ['good']
+    assert pipeline.get_stats()[NORMAL]['errors'] == 1
@@ -0,0 +1,85 @@
+"""
+Tests for PromptBuilder - بودجه توکن، ترتیب حذف/کوتاه کردن بخش‌ها و cache مقدمه
+"""
+
+from nazanin.core.prompt_builder import TRUNCATION_MARK, PromptBuilder, PromptSection
+
+
+def _section(name, tokens, **kwargs):
+    # هر 4 کاراکتر لاتین حدود یک توکن
+    return PromptSection(name, 'abcd' * tokens, **kwargs)
+
+
+def test_prompt_within_budget_is_unchanged():
+    builder = PromptBuilder(separator='|')
+    sections = [PromptSection('a', 'first'), None, PromptSection('b', 'second')]
+
+    assert builder.build(sections, budget=100) == 'first|second'
+    assert builder.build(sections) == 'first|second'
+    assert builder.get_stats()['over_budget'] == 0
+
+
+def test_lowest_priority_optional_section_goes_first():
+    builder = PromptBuilder()
+    sections = [
+        _section('preamble', 10, required=True, truncatable=False, priority=100),
+        _section('memories', 10, priority=20),
+        _section('history', 10, priority=60),
+        _section('message', 5, required=True, priority=90)
+    ]
+
+    fitted = builder.fit(sections, budget=25)
+    assert [section.name for section in fitted] == ['preamble', 'history', 'message']
+    assert sum(section.tokens for section in fitted) <= 25
+    assert builder.get_stats()['dropped_sections'] == 1
+
+
+def test_sections_are_truncated_when_partly_fitting():
+    builder = PromptBuilder()
+    sections = [
+        _section('preamble', 10, required=True, truncatable=False),
+        _section('history', 20, priority=60)
+    ]
+
+    fitted = builder.fit(sections, budget=20)
+    history = fitted[1]
+    assert history.text.endswith(TRUNCATION_MARK)
+    assert sum(section.tokens for section in fitted) <= 20
+    assert builder.get_stats()['truncated_sections'] == 1
+
+
+def test_required_sections_are_only_truncated_last():
+    builder = PromptBuilder()
+    sections = [
+        _section('preamble', 10, required=True, truncatable=False),
+        _section('notes', 5, priority=10, truncatable=False),
+        _section('message', 20, required=True, priority=90)
+    ]
+
+    fitted = builder.fit(sections, budget=20)
+    assert [section.name for section in fitted] == ['preamble', 'message']
+    assert fitted[0].text == sections[0].text
+    assert fitted[1].text.endswith(TRUNCATION_MARK)
+
+
+def test_segments_are_rendered_once_and_bounded():
+    builder = PromptBuilder(max_segments=2)
+    renders = []
+
+    def render(text):
+        def inner():
+            renders.append(text)
+            return text
+        return inner
+
+    first = builder.segment('persona-a', render('A'))
+    assert builder.segment('persona-a', render('A')) is first
+    assert first.required and not first.truncatable
+
+    builder.segment('persona-b', render('B'))
+    builder.segment('persona-c', render('C'))
+    builder.segment('persona-a', render('A'))
+
+    assert renders == ['A', 'B', 'C', 'A']
+    assert builder.get_stats()['cached_segments'] == 2
+    assert builder.get_stats()['segment_hits'] == 1
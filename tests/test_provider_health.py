@@ -0,0 +1,93 @@
+"""
+Tests for CircuitBreaker / ProviderHealth - باز و بسته شدن breaker، half-open و EWMA
+"""
+
+import pytest
+
+from nazanin.core import provider_health
+from nazanin.core.provider_health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderHealth
+
+
+class Clock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(provider_health.time, 'time', fake)
+    return fake
+
+
+def test_opens_after_threshold_and_recovers_through_half_open(clock):
+    breaker = CircuitBreaker(failure_threshold=2, base_backoff=5)
+
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.acquire()
+
+    clock.now += 5
+    assert breaker.is_available()
+    assert breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    # فقط یک درخواست آزمایشی
+    assert not breaker.acquire()
+    assert not breaker.is_available()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.acquire()
+
+
+def test_failed_probe_doubles_backoff_up_to_max(clock):
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=5, max_backoff=15)
+    breaker.record_failure()
+
+    for expected in (10, 15, 15):
+        clock.now = breaker.open_until
+        assert breaker.acquire()
+        breaker.record_failure()
+        assert breaker.backoff == expected
+        assert breaker.open_until == clock.now + expected
+
+    breaker.record_success()
+    assert breaker.backoff == 5
+
+
+def test_rate_limit_opens_immediately_with_retry_after(clock):
+    breaker = CircuitBreaker(failure_threshold=3, base_backoff=5)
+    breaker.record_failure(rate_limited=True, retry_after=30)
+
+    assert breaker.state == OPEN
+    assert breaker.get_stats()['retry_in'] == 30
+
+
+def test_released_probe_can_be_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=5)
+    breaker.record_failure()
+    clock.now += 5
+
+    assert breaker.acquire()
+    breaker.release()
+    assert breaker.acquire()
+
+
+def test_health_expected_latency():
+    health = ProviderHealth(latency_alpha=0.5, error_alpha=0.5, default_latency=3.0)
+    assert health.expected_latency() == 3.0
+
+    health.record_success(1.0)
+    health.record_success(2.0)
+    assert health.ewma_latency == 1.5
+
+    health.record_failure()
+    assert health.error_rate == 0.5
+    assert health.expected_latency() == pytest.approx(3.0)
+    # کلیدهای کمتر در دسترس یعنی امتیاز بدتر
+    assert health.expected_latency(available_ratio=0.5) == pytest.approx(6.0)
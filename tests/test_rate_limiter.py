@@ -0,0 +1,113 @@
+"""
+Tests for RateLimiter - پنجره‌های لغزان دقیقه و ساعت، در حافظه و SQLite
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from nazanin.security import security_manager
+from nazanin.security.security_manager import RateLimiter
+
+
+class Clock:
+    """زمان ساختگی برای time.time"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(security_manager.time, 'time', fake)
+    return fake
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def limiter_config(request, tmp_path):
+    config = {'max_requests_per_minute': 3, 'max_requests_per_hour': 5}
+    if request.param == 'sqlite':
+        config['store_path'] = str(tmp_path / 'rate_limits.db')
+    return config
+
+
+def test_minute_window_limits_and_recovers(clock, limiter_config):
+    limiter = RateLimiter(limiter_config)
+
+    assert all(limiter.check(1) for _ in range(3))
+    assert not limiter.check(1)
+    assert limiter.check(2)
+
+    # دو پنجره بعد شمارش قبلی دیگر وزنی ندارد
+    clock.now += 120
+    assert limiter.check(1)
+    limiter.close()
+
+
+def test_sliding_window_weights_previous_window(clock, limiter_config):
+    limiter = RateLimiter(limiter_config)
+    start = clock.now
+    for _ in range(3):
+        limiter.check(1)
+
+    # نیمه پنجره بعدی: نصف 3 درخواست قبلی هنوز شمرده می‌شود
+    clock.now = start + 90
+    assert limiter.get_count(1) == 1
+    limiter.close()
+
+
+def test_hour_window_limits(clock, limiter_config):
+    limiter = RateLimiter(limiter_config)
+
+    allowed = 0
+    for _ in range(4):
+        allowed += sum(limiter.check(1) for _ in range(3))
+        clock.now += 120
+
+    assert allowed == 5
+    limiter.close()
+
+
+def test_get_count_does_not_create_state(clock, limiter_config):
+    limiter = RateLimiter(limiter_config)
+
+    assert limiter.get_count(2) == 0
+    assert limiter.get_stats()['tracked_users'] == 0
+
+    limiter.check(2)
+    limiter.check(2)
+    assert limiter.get_count(2) == 2
+    assert limiter.get_stats()['tracked_users'] == 1
+    limiter.close()
+
+
+def test_disabled_limiter_allows_everything(clock):
+    limiter = RateLimiter({'enabled': False, 'max_requests_per_minute': 1})
+
+    assert all(limiter.check(1) for _ in range(5))
+
+
+def test_locked_store_fails_open_quickly(clock, tmp_path):
+    path = str(tmp_path / 'rate_limits.db')
+    limiter = RateLimiter({'max_requests_per_minute': 1, 'store_path': path, 'store_busy_timeout': 0.01})
+    assert limiter.check(1)
+
+    # process دیگری قفل نوشتن را نگه داشته
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    try:
+        start = time.perf_counter()
+        assert limiter.check(1)
+        assert time.perf_counter() - start < 1.0
+        assert limiter.get_stats()['store_errors'] == 1
+    finally:
+        other.execute('ROLLBACK')
+        other.close()
+
+    assert not limiter.check(1)
+    limiter.close()
@@ -0,0 +1,71 @@
+"""
+Tests for RequestCoalescer - اشتراک اجرا، خطا و لغو فراخوان‌ها
+"""
+
+import asyncio
+
+import pytest
+
+from nazanin.core.request_coalescer import RequestCoalescer
+
+
+async def test_identical_concurrent_requests_share_one_run():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'answer'
+
+    results = await asyncio.gather(*(coalescer.run('k', work) for _ in range(5)))
+
+    assert results == ['answer'] * 5
+    assert len(calls) == 1
+    assert coalescer.get_stats()['coalesced'] == 4
+    assert coalescer.get_stats()['inflight'] == 0
+
+
+async def test_different_keys_run_separately():
+    coalescer = RequestCoalescer()
+
+    async def work(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        coalescer.run('a', lambda: work('a')),
+        coalescer.run('b', lambda: work('b'))
+    )
+    assert results == ['a', 'b']
+    assert coalescer.get_stats()['dispatched'] == 2
+
+
+async def test_error_reaches_every_caller():
+    coalescer = RequestCoalescer()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError('boom')
+
+    results = await asyncio.gather(
+        coalescer.run('k', fail), coalescer.run('k', fail), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_cancelled_caller_does_not_cancel_shared_run():
+    coalescer = RequestCoalescer()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return 'done'
+
+    first = asyncio.ensure_future(coalescer.run('k', work))
+    second = asyncio.ensure_future(coalescer.run('k', work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == 'done'
+    with pytest.raises(asyncio.CancelledError):
+        await first
@@ -0,0 +1,91 @@
+"""
+Tests for ResponseCache - کلید نرمال‌شده، TTL، LRU و تطبیق شباهت
+"""
+
+import pytest
+
+from nazanin.core import response_cache
+from nazanin.core.response_cache import ResponseCache, normalize_prompt, prompt_key
+
+
+class Clock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(response_cache.time, 'time', fake)
+    return fake
+
+
+def test_prompt_normalization():
+    assert normalize_prompt('  Hello\n\tWorld  ') == normalize_prompt('hello world')
+    assert prompt_key('كتاب يك') == prompt_key('کتاب یک')
+
+
+def test_exact_hit_after_normalization(clock):
+    cache = ResponseCache()
+    cache.set('What is Python?', 'a language')
+
+    assert cache.get('  what is   python? ') == 'a language'
+    assert cache.get('what is java?') is None
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl=10)
+    cache.set('prompt', 'response')
+
+    clock.now += 9
+    assert cache.get('prompt') == 'response'
+    clock.now += 1
+    assert cache.get('prompt') is None
+    assert cache.get_stats()['expirations'] == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_similar_prompt_hits_and_reuses_rows(clock):
+    cache = ResponseCache(max_entries=2, similarity_threshold=0.8)
+    cache.set('please tell me the weather in tehran today', 'sunny')
+
+    assert cache.get('please tell me the weather in tehran today!') == 'sunny'
+    assert cache.get('completely unrelated question about cooking') is None
+    assert cache.get_stats()['similar_hits'] == 1
+
+    # ردیف‌های ماتریس بعد از حذف دوباره استفاده می‌شوند
+    for i in range(5):
+        cache.set(f'prompt number {i}', str(i))
+    assert len(cache) == 2
+    assert cache.get('prompt number 4') == '4'
+
+
+def test_invalidate_and_clear(clock):
+    cache = ResponseCache(similarity_threshold=0.9)
+    cache.set('one', '1')
+    cache.set('two', '2')
+
+    cache.invalidate('ONE')
+    assert cache.get('one') is None
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get('two') is None
@@ -0,0 +1,106 @@
+"""
+Tests for InvertedIndex و SheetSearchIndex - رتبه‌بندی BM25 و همگام‌سازی افزایشی
+"""
+
+from nazanin.sheets_system.search_index import InvertedIndex, SheetSearchIndex, tokenize
+
+
+class FakeManager:
+    """manager ساختگی - مثل cache، تا تغییر داده همان لیست را برمی‌گرداند"""
+
+    def __init__(self, records):
+        self.records = records
+        self.fail = False
+        self.reads = 0
+
+    async def get_sheet_data(self, spreadsheet_name, sheet_name, raise_errors=False):
+        self.reads += 1
+        if self.fail:
+            if raise_errors:
+                raise ConnectionError('sheets unavailable')
+            return []
+        return self.records
+
+
+def test_tokenize_normalizes_persian_variants():
+    assert tokenize('كتاب يك') == tokenize('کتاب یک')
+    assert tokenize('۱۲۳') == ['123']
+
+
+def test_bm25_prefers_more_relevant_documents():
+    index = InvertedIndex()
+    index.add(1, 'python python programming', 'both')
+    index.add(2, 'python snakes in the wild forest', 'one')
+    index.add(3, 'cooking recipes', 'none')
+
+    results = index.search('python programming')
+    assert [payload for payload, _ in results] == ['both', 'one']
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_bm25_rare_terms_weigh_more():
+    index = InvertedIndex()
+    index.add(1, 'common rare', 'rare')
+    index.add(2, 'common word', 'plain')
+    index.add(3, 'common text', 'plain2')
+
+    assert index.search('common rare', limit=1)[0][0] == 'rare'
+
+
+def test_remove_drops_document():
+    index = InvertedIndex()
+    index.add(1, 'hello world', 'a')
+    index.remove(1)
+
+    assert index.search('hello') == []
+    assert len(index) == 0
+
+
+def test_sync_reindexes_only_changed_rows():
+    sheet = SheetSearchIndex('SS', 'Sheet', fields=['content'])
+    records = [{'content': 'alpha'}, {'content': 'beta'}]
+
+    assert sheet.sync(records) == 2
+    assert sheet.sync(records) == 0
+
+    # ویرایش، اضافه شدن و حذف ردیف
+    assert sheet.sync([{'content': 'gamma'}, {'content': 'beta'}, {'content': 'delta'}]) == 2
+    assert [row['content'] for row, _ in sheet.index.search('gamma')] == ['gamma']
+    assert sheet.index.search('alpha') == []
+
+    assert sheet.sync([{'content': 'gamma'}]) == 2
+    assert sheet.index.search('delta') == []
+
+
+async def test_search_reindexes_only_when_rows_change():
+    manager = FakeManager([{'content': 'first note'}])
+    sheet = SheetSearchIndex('SS', 'Sheet', fields=['content'])
+
+    assert [row['content'] for row, _ in await sheet.search(manager, 'note')] == ['first note']
+    await sheet.search(manager, 'note')
+    assert manager.reads == 2
+    assert sheet.syncs == 1
+
+    # ویرایش مستقیم در Google Sheets - لیست جدید از cache
+    manager.records = [{'content': 'edited note'}, {'content': 'second note'}]
+    results = await sheet.search(manager, 'note')
+    assert sorted(row['content'] for row, _ in results) == ['edited note', 'second note']
+    assert sheet.syncs == 2
+
+
+async def test_read_error_keeps_previous_index():
+    manager = FakeManager([{'content': 'kept'}])
+    sheet = SheetSearchIndex('SS', 'Sheet')
+    await sheet.refresh(manager)
+
+    manager.fail = True
+    assert len(await sheet.search(manager, 'kept')) == 1
+
+
+async def test_emptied_sheet_empties_index():
+    manager = FakeManager([{'content': 'gone'}])
+    sheet = SheetSearchIndex('SS', 'Sheet')
+    await sheet.refresh(manager)
+
+    manager.records = []
+    assert await sheet.search(manager, 'gone') == []
@@ -0,0 +1,47 @@
+"""
+Tests for SheetRowStore - همگام‌سازی افزایشی ردیف‌ها و تشخیص ویرایش
+"""
+
+from nazanin.core.sheets_sync import SheetRowStore, column_letter
+
+
+def test_column_letter():
+    assert column_letter(1) == 'A'
+    assert column_letter(26) == 'Z'
+    assert column_letter(28) == 'AB'
+
+
+def test_tail_appends_new_rows():
+    store = SheetRowStore()
+    store.load_full([['name'], ['a'], ['b']])
+
+    assert store.tail_range() == 'A3:A'
+    assert store.apply_tail([['b'], ['c']])
+    assert [record['name'] for record in store.records] == ['a', 'b', 'c']
+
+
+def test_changed_anchor_row_requires_full_sync():
+    store = SheetRowStore()
+    store.load_full([['name'], ['a'], ['b']])
+
+    assert not store.apply_tail([['edited'], ['c']])
+    assert not store.apply_tail([])
+
+
+def test_records_handed_out_are_not_mutated():
+    store = SheetRowStore()
+    first = store.load_full([['name'], ['a']])
+
+    store.apply_tail([['a'], ['b']])
+
+    assert [record['name'] for record in first] == ['a']
+    assert len(store.records) == 2
+
+
+def test_invalidate_forces_full_sync():
+    store = SheetRowStore()
+    store.load_full([['name'], ['a']])
+    assert not store.needs_full_sync()
+
+    store.invalidate()
+    assert store.needs_full_sync()
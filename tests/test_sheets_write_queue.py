@@ -0,0 +1,105 @@
+"""
+Tests for SheetsWriteQueue - flush دسته‌ای، spill روی دیسک و بازیابی ردیف‌ها
+"""
+
+from nazanin.core.sheets_write_queue import SheetsWriteQueue
+
+
+class RecordingWriter:
+    """writer ساختگی که دسته‌های نوشته‌شده را نگه می‌دارد"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches = []
+
+    async def __call__(self, spreadsheet, sheet, rows):
+        if self.fail:
+            return False
+        self.batches.append((spreadsheet, sheet, rows))
+        return True
+
+
+async def test_rows_are_batched_per_sheet(tmp_path):
+    writer = RecordingWriter()
+    queue = SheetsWriteQueue(writer, flush_interval=60, spill_dir=str(tmp_path))
+    await queue.start()
+
+    await queue.put('SS', 'A', [1])
+    await queue.put('SS', 'A', [2])
+    await queue.put('SS', 'B', [3])
+    assert await queue.flush() == 3
+    await queue.stop()
+
+    assert sorted(writer.batches) == [('SS', 'A', [[1], [2]]), ('SS', 'B', [[3]])]
+    assert queue.pending == 0
+
+
+async def test_unflushed_rows_are_spilled_and_restored_per_spreadsheet(tmp_path):
+    queue = SheetsWriteQueue(RecordingWriter(fail=True), flush_interval=60, spill_dir=str(tmp_path))
+    await queue.start()
+    await queue.put('SS1', 'A', ['one'])
+    await queue.put('SS2', 'A', ['two'])
+    await queue.stop()
+
+    assert queue.stats['spilled_rows'] == 2
+    assert len(list(tmp_path.iterdir())) == 2
+
+    # manager دیگری که فقط SS1 را دارد ردیف‌های SS2 را برنمی‌دارد
+    writer = RecordingWriter()
+    restored = SheetsWriteQueue(writer, flush_interval=60, spill_dir=str(tmp_path))
+    await restored.start(['SS1'])
+    assert restored.pending == 1
+    await restored.flush()
+    await restored.stop()
+
+    assert writer.batches == [('SS1', 'A', [['one']])]
+    assert [path.name for path in tmp_path.iterdir()] == ['SS2.jsonl']
+
+
+async def test_failed_batches_are_retried_before_spilling(tmp_path):
+    writer = RecordingWriter(fail=True)
+    queue = SheetsWriteQueue(writer, flush_interval=60, max_retries=3, spill_dir=str(tmp_path))
+    await queue.start()
+    await queue.put('SS', 'A', [1])
+
+    await queue.flush()
+    await queue.flush()
+    assert queue.pending == 1
+    assert queue.stats['spilled_rows'] == 0
+
+    await queue.flush()
+    assert queue.pending == 0
+    assert queue.stats['spilled_rows'] == 1
+    await queue.stop()
+
+
+async def test_offline_spreadsheet_rows_wait_then_spill_and_restore(tmp_path):
+    online = set()
+    writer = RecordingWriter()
+    queue = SheetsWriteQueue(
+        writer,
+        flush_interval=60,
+        max_pending=2,
+        spill_dir=str(tmp_path),
+        ready=lambda name: name in online
+    )
+    await queue.start()
+
+    await queue.put('SS', 'A', [1])
+    await queue.flush()
+    assert writer.batches == []
+    assert queue.pending == 1
+
+    # صف پر شد - ردیف‌های آفلاین به جای مسدود کردن put روی دیسک می‌روند
+    await queue.put('SS', 'A', [2])
+    await queue.flush()
+    assert queue.pending == 0
+    assert queue.stats['spilled_rows'] == 2
+
+    online.add('SS')
+    await queue.flush()
+    await queue.flush()
+    await queue.stop()
+
+    assert writer.batches == [('SS', 'A', [[1], [2]])]
+    assert queue.stats['restored_rows'] == 2
@@ -0,0 +1,104 @@
+"""
+Tests for StageGraph - وابستگی، timeout، مقدار پیش‌فرض و executor اختصاصی مراحل
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nazanin.core.stage_graph import StageGraph
+
+
+async def test_dependencies_receive_results():
+    graph = StageGraph()
+
+    async def a(inputs, deps):
+        return inputs['x'] + 1
+
+    async def b(inputs, deps):
+        return deps['a'] * 10
+
+    graph.add_stage('a', a)
+    graph.add_stage('b', b, depends_on=['a'])
+
+    assert await graph.run({'x': 1}) == {'a': 2, 'b': 20}
+
+
+async def test_independent_stages_run_concurrently():
+    graph = StageGraph()
+    started = []
+
+    async def slow(inputs, deps):
+        started.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(0.1)
+        return True
+
+    graph.add_stage('a', slow)
+    graph.add_stage('b', slow)
+
+    start = asyncio.get_running_loop().time()
+    await graph.run()
+    assert asyncio.get_running_loop().time() - start < 0.18
+
+
+async def test_timeout_returns_default_and_dependents_still_run():
+    graph = StageGraph()
+
+    async def slow(inputs, deps):
+        await asyncio.sleep(1)
+        return 'late'
+
+    async def after(inputs, deps):
+        return deps['slow']
+
+    graph.add_stage('slow', slow, timeout=0.05, default='fallback')
+    graph.add_stage('after', after, depends_on=['slow'])
+
+    results = await graph.run()
+    assert results == {'slow': 'fallback', 'after': 'fallback'}
+    assert graph.get_stats()['slow']['timeouts'] == 1
+
+
+async def test_error_returns_default():
+    graph = StageGraph()
+
+    async def broken(inputs, deps):
+        raise RuntimeError('boom')
+
+    graph.add_stage('broken', broken, default=[])
+
+    assert await graph.run() == {'broken': []}
+    assert graph.get_stats()['broken']['errors'] == 1
+
+
+async def test_blocking_stage_uses_its_own_executor():
+    shared = ThreadPoolExecutor(max_workers=2, thread_name_prefix='shared')
+    dedicated = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dedicated')
+    graph = StageGraph(shared)
+
+    def thread_name(inputs, deps):
+        return threading.current_thread().name
+
+    graph.add_stage('own', thread_name, blocking=True, executor=dedicated)
+    graph.add_stage('default', thread_name, blocking=True)
+
+    try:
+        results = await graph.run()
+    finally:
+        shared.shutdown()
+        dedicated.shutdown()
+
+    assert results['own'].startswith('dedicated')
+    assert results['default'].startswith('shared')
+
+
+def test_unknown_dependency_and_duplicate_are_rejected():
+    graph = StageGraph()
+    graph.add_stage('a', lambda inputs, deps: None)
+
+    with pytest.raises(ValueError):
+        graph.add_stage('a', lambda inputs, deps: None)
+    with pytest.raises(ValueError):
+        graph.add_stage('b', lambda inputs, deps: None, depends_on=['missing'])